@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+# vectorized backtests over grids of rebalance rules, transaction costs and trading lags
+# for every rule the views of all portfolios are resampled in one call and aligned with the shared asset
+# returns once. lags only shift the portfolio x time x asset view tensor and tcosts only scale the turnover,
+# so every (rule, tcost, lag) cell costs a few array operations. each cell is the {'net', 'gross by pair'}
+# dict that get_factor_return_stats consumes, with the same values compute_portfolio_returns used to give
+
+
+# views of every portfolio resampled to rule as a portfolio x time x asset tensor
+def resample_views(views_dict, rule):
+    names = list(views_dict.keys())
+    columns = pd.Index([])
+    for name in names:
+        columns = columns.union(views_dict[name].columns)
+    wide = pd.concat([views_dict[name].reindex(columns=columns) for name in names], axis=1,
+                     keys=range(len(names)))
+    resampled = wide.resample(rule).last()
+    values = resampled.values.reshape(len(resampled), len(names), len(columns)).transpose(1, 0, 2)
+    return names, resampled.index, columns, values
+
+
+# turnover of portfolio x view date x asset views on a grid of n_rows periods, rows = the view dates' positions;
+# periods without views have no turnover (NaN) and hence no net return
+def view_turnover(views, rows, n_rows):
+    turnover = np.full((views.shape[0], n_rows), np.nan)
+    turnover[:, rows[1:]] = np.nansum(np.abs(np.diff(views, axis=1)), axis=2) / 2
+    turnover[:, rows[:1]] = 0.0
+    return turnover
+
+
+# views lagged along their own dates, then laid on the grid
+def lag_views(views, rows, n_rows, lag):
+    lagged = np.full((views.shape[0], n_rows, views.shape[2]), np.nan)
+    lagged[:, rows[lag:]] = views[:, :len(rows) - lag]
+    return lagged
+
+
+# {(rule, tcost, lag): {'net': time x portfolio returns, 'gross by pair': {portfolio: time x asset returns}}}
+# asset_returns_by_rule: {rule: asset returns over each rebalance period}
+def run_backtest_grid(asset_returns_by_rule, views_dict, rules, tcosts, lags):
+    results = {}
+    for rule in rules:
+        asset_returns = asset_returns_by_rule[rule]
+        names, view_index, view_columns, views = resample_views(views_dict, rule)
+
+        # common time x asset grid of the returns and the views
+        index = asset_returns.index.union(view_index)
+        columns = asset_returns.columns.union(view_columns)
+        returns = asset_returns.reindex(index=index, columns=columns).values
+        rows = index.get_indexer(view_index)
+        aligned = np.full((len(names), len(view_index), len(columns)), np.nan)
+        aligned[:, :, columns.get_indexer(view_columns)] = views
+        views = aligned
+
+        turnover = view_turnover(views, rows, len(index))
+        for lag in lags:
+            gross_by_pair = returns[None, :, :] * lag_views(views, rows, len(index), lag)
+            gross = np.nansum(gross_by_pair, axis=2)
+            gross_by_pair_dict = {name: pd.DataFrame(gross_by_pair[p], index=index, columns=columns)
+                                  for p, name in enumerate(names)}
+            for tcost in tcosts:
+                results[(rule, tcost, lag)] = {
+                    'net': pd.DataFrame((gross - turnover * tcost).T, index=index, columns=names),
+                    'gross by pair': gross_by_pair_dict
+                }
+    return results
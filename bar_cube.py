@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+# dense time x asset x field container for bars, replacing pd.Panel
+# values are stored field-major (field, asset, time) so every field is one contiguous block and
+# field(...) / loc[:, :, field] hand out zero-copy dataframes of time x asset
+
+
+class barCube():
+    def __init__(self, data, index, assets, fields):
+        # data: ndarray of shape (len(fields), len(assets), len(index))
+        self._data = data
+        self.index = pd.DatetimeIndex(index)
+        self.assets = pd.Index(assets)
+        self.fields = pd.Index(fields)
+        if data.shape != (len(self.fields), len(self.assets), len(self.index)):
+            raise ValueError('data shape does not match index, assets and fields!')
+
+    # align a dict of {asset: bars dataframe} on the union of their timestamps
+    @classmethod
+    def from_frames(cls, frames, dtype=np.float64):
+        assets = list(frames.keys())
+        index = None
+        fields = []
+        for frame in frames.values():
+            index = frame.index if index is None else index.union(frame.index)
+            fields += [field for field in frame.columns if field not in fields]
+
+        data = np.full((len(fields), len(assets), len(index)), np.nan, dtype=dtype)
+        for a, asset in enumerate(assets):
+            frame = frames[asset]
+            positions = index.get_indexer(frame.index)
+            for f, field in enumerate(fields):
+                if field in frame.columns:
+                    data[f, a, positions] = frame[field].values
+        return cls(data, index, assets, fields)
+
+    @property
+    def shape(self):
+        return len(self.index), len(self.assets), len(self.fields)
+
+    # time x asset x field view of the underlying array
+    @property
+    def values(self):
+        return self._data.transpose(2, 1, 0)
+
+    @property
+    def loc(self):
+        return _barCubeIndexer(self)
+
+    # pd.Panel compatible aliases: items = assets, major_axis = time, minor_axis = fields
+    @property
+    def items(self):
+        return self.assets
+
+    @property
+    def major_axis(self):
+        return self.index
+
+    @property
+    def minor_axis(self):
+        return self.fields
+
+    def keys(self):
+        return self.assets
+
+    def __getitem__(self, asset):
+        return self.asset(asset)
+
+    def __contains__(self, asset):
+        return asset in self.assets
+
+    def __len__(self):
+        return len(self.assets)
+
+    # zero-copy time x asset dataframe of one field
+    def field(self, field):
+        f = self.fields.get_loc(field)
+        return pd.DataFrame(self._data[f].T, index=self.index, columns=self.assets, copy=False)
+
+    # time x field dataframe of one asset
+    def asset(self, asset):
+        a = self.assets.get_loc(asset)
+        return pd.DataFrame(self._data[:, a, :].T, index=self.index, columns=self.fields, copy=False)
+
+    def _to_timestamp(self, key):
+        key = pd.Timestamp(key)
+        if self.index.tz is not None:
+            key = key.tz_localize(self.index.tz) if key.tz is None else key.tz_convert(self.index.tz)
+        return key
+
+    # label-inclusive date range slice by binary search; returns a view sharing memory with this cube
+    def slice_dates(self, start=None, end=None):
+        lo = 0 if start is None else int(self.index.searchsorted(self._to_timestamp(start), side='left'))
+        hi = len(self.index) if end is None else int(self.index.searchsorted(self._to_timestamp(end), side='right'))
+        return barCube(self._data[:, :, lo:hi], self.index[lo:hi], self.assets, self.fields)
+
+    def select(self, assets=None, fields=None):
+        a = slice(None) if assets is None else self.assets.get_indexer(assets)
+        f = slice(None) if fields is None else self.fields.get_indexer(fields)
+        if not isinstance(a, slice) and (a < 0).any():
+            raise KeyError('asset(s) not found!')
+        if not isinstance(f, slice) and (f < 0).any():
+            raise KeyError('field(s) not found!')
+        data = self._data[f][:, a]
+        return barCube(data, self.index,
+                       self.assets if assets is None else assets,
+                       self.fields if fields is None else fields)
+
+    # same axes and the same values, NaNs included
+    def equals(self, other):
+        return isinstance(other, barCube) and self.index.equals(other.index) and \
+            self.assets.equals(other.assets) and self.fields.equals(other.fields) and \
+            np.array_equal(self._data, other._data, equal_nan=True)
+
+    def copy(self):
+        return barCube(self._data.copy(), self.index, self.assets, self.fields)
+
+    # this cube with the bars of other, a cube on the same assets and fields, merged in; other's non-NaN values
+    # win. rows before other's first timestamp are shared with this cube, only the rows from there on are new
+    def append(self, other):
+        if not (self.assets.equals(other.assets) and self.fields.equals(other.fields)):
+            raise ValueError('appended cube has different assets or fields!')
+        if len(other.index) == 0:
+            return self
+        lo = int(self.index.searchsorted(other.index[0], side='left'))
+        index = self.index[lo:].union(other.index)
+        data = np.full((len(self.fields), len(self.assets), len(index)), np.nan, dtype=self._data.dtype)
+        data[:, :, index.get_indexer(self.index[lo:])] = self._data[:, :, lo:]
+        positions = index.get_indexer(other.index)
+        data[:, :, positions] = np.where(np.isnan(other._data), data[:, :, positions], other._data)
+        return barCube(np.concatenate([self._data[:, :, :lo], data], axis=2), self.index[:lo].append(index),
+                       self.assets, self.fields)
+
+
+# supports the pd.Panel style lookups used across the repo, e.g. loc[:, :, 'close'] and loc[start:end]
+class _barCubeIndexer():
+    def __init__(self, cube):
+        self.cube = cube
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        key = key + (slice(None),) * (3 - len(key))
+        time_key, asset_key, field_key = key
+
+        if not isinstance(time_key, slice):
+            raise KeyError('only date range slices are supported on the time axis!')
+        if time_key.step is not None:
+            raise KeyError('stepped date slices are not supported!')
+        cube = self.cube.slice_dates(time_key.start, time_key.stop)
+
+        scalar_asset = not isinstance(asset_key, (slice, list, tuple, np.ndarray, pd.Index))
+        scalar_field = not isinstance(field_key, (slice, list, tuple, np.ndarray, pd.Index))
+        for axis_key in (asset_key, field_key):
+            if isinstance(axis_key, slice) and axis_key != slice(None):
+                raise KeyError('only full slices are supported on the asset and field axes!')
+
+        if scalar_asset and scalar_field:
+            return cube.asset(asset_key)[field_key]
+        if scalar_field:
+            frame = cube.field(field_key)
+            return frame if isinstance(asset_key, slice) else frame[list(asset_key)]
+        if scalar_asset:
+            frame = cube.asset(asset_key)
+            return frame if isinstance(field_key, slice) else frame[list(field_key)]
+        return cube.select(assets=None if isinstance(asset_key, slice) else list(asset_key),
+                           fields=None if isinstance(field_key, slice) else list(field_key))
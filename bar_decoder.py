@@ -0,0 +1,153 @@
+import codecs
+import itertools
+import json
+import operator
+
+import numpy as np
+import pandas as pd
+
+# fast decoding of returnChartData payloads straight into typed column arrays
+# accepts a list of bar dicts, a whole JSON document, or a stream of raw JSON chunks. bars are decoded a
+# batch at a time: the complete objects of each chunk go through one json.loads and one array conversion,
+# so the history never sits in memory as a list of dicts and no Python code runs per bar and column
+
+DEFAULT_TIME_KEY = 'date'
+INITIAL_CAPACITY = 1024
+
+_json_decoder = json.JSONDecoder()
+
+
+# vectorized unix seconds -> tz-aware DatetimeIndex
+def epoch_to_index(seconds, tz='UTC'):
+    index = pd.to_datetime(np.asarray(seconds, dtype=np.int64), unit='s', utc=True)
+    return index if tz == 'UTC' else index.tz_convert(tz)
+
+
+class chartDataDecoder():
+    def __init__(self, dtype=np.float64, time_key=DEFAULT_TIME_KEY, columns=None):
+        self.dtype = np.dtype(dtype)
+        self.time_key = time_key
+        self.columns = list(columns) if columns is not None else None
+        self.length = 0
+        self._times = None
+        self._values = None
+        self._text = ''
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def _reserve(self, length):
+        if self._times is not None and length <= len(self._times):
+            return
+        capacity = INITIAL_CAPACITY if self._times is None else len(self._times)
+        while capacity < length:
+            capacity *= 2
+        times = np.empty(capacity, dtype=np.int64)
+        values = np.full((len(self.columns), capacity), np.nan, dtype=self.dtype)
+        if self._times is not None:
+            times[:self.length] = self._times[:self.length]
+            values[:, :self.length] = self._values[:, :self.length]
+        self._times = times
+        self._values = values
+
+    def _check(self, bar):
+        if self.time_key not in bar:
+            if 'error' in bar:
+                raise IOError(bar['error'])
+            raise ValueError('time key not found!')
+        if self.columns is None:
+            self.columns = [key for key in bar.keys() if key != self.time_key]
+
+    def _append(self, bar):
+        self._check(bar)
+        self._reserve(self.length + 1)
+        self._times[self.length] = bar[self.time_key]
+        for i, column in enumerate(self.columns):
+            self._values[i, self.length] = bar.get(column, np.nan)
+        self.length += 1
+
+    # a list of bars in one conversion; bars missing a column (or an error object) take the per-bar path
+    def _append_batch(self, bars):
+        if len(bars) == 0:
+            return
+        self._check(bars[0])
+        n, width = len(bars), len(self.columns) + 1
+        try:
+            rows = np.fromiter(itertools.chain.from_iterable(
+                map(operator.itemgetter(self.time_key, *self.columns), bars)), dtype=np.float64, count=n * width)
+        except (KeyError, TypeError, ValueError):
+            for bar in bars:
+                self._append(bar)
+            return
+        rows = rows.reshape(n, width)
+        self._reserve(self.length + n)
+        self._times[self.length:self.length + n] = rows[:, 0]
+        self._values[:, self.length:self.length + n] = rows[:, 1:].T
+        self.length += n
+
+    # feed a list of bar dicts, a single bar dict, or a str/bytes chunk of the raw JSON response
+    def feed(self, chunk):
+        if isinstance(chunk, dict):
+            self._append(chunk)
+        elif isinstance(chunk, (str, bytes, bytearray)):
+            if not isinstance(chunk, str):
+                chunk = self._utf8.decode(bytes(chunk))
+            self._feed_text(chunk)
+        else:
+            self._append_batch(list(chunk))
+        return self
+
+    # the chunk's complete objects are parsed as one array; the partial object at its end waits for the next
+    def _feed_text(self, text):
+        text = self._text + text
+        start = text.find('{')
+        end = text.rfind('}') + 1
+        if start < 0 or end <= start:
+            self._text = text[start:] if start >= 0 else ''
+            return
+        try:
+            bars = json.loads('[' + text[start:end] + ']')
+        except ValueError:
+            # a brace inside a string value; fall back to scanning object by object
+            bars, end = self._scan(text, start)
+        self._append_batch(bars)
+        self._text = text[end:]
+
+    @staticmethod
+    def _scan(text, position):
+        bars = []
+        while True:
+            start = text.find('{', position)
+            if start < 0:
+                return bars, len(text)
+            try:
+                bar, position = _json_decoder.raw_decode(text, start)
+            except ValueError:
+                return bars, start
+            bars.append(bar)
+
+    def finish(self):
+        if self._text.strip(' \t\r\n,]'):
+            raise ValueError('truncated chart data payload!')
+        self._text = ''
+        return self
+
+    # decoded unix times and a {column: array} dict, trimmed to the decoded length
+    def arrays(self):
+        if self._times is None:
+            return np.empty(0, dtype=np.int64), {column: np.empty(0, dtype=self.dtype)
+                                                 for column in (self.columns or [])}
+        return self._times[:self.length], {column: self._values[i, :self.length]
+                                           for i, column in enumerate(self.columns)}
+
+    def to_frame(self, tz='UTC'):
+        times, values = self.arrays()
+        return pd.DataFrame(values, index=epoch_to_index(times, tz=tz), columns=self.columns or [])
+
+
+def decode_chart_data(payload, dtype=np.float64, time_key=DEFAULT_TIME_KEY, tz='UTC'):
+    decoder = chartDataDecoder(dtype=dtype, time_key=time_key)
+    if isinstance(payload, (str, bytes, bytearray, list, dict)):
+        decoder.feed(payload)
+    else:
+        for chunk in payload:
+            decoder.feed(chunk)
+    return decoder.finish().to_frame(tz=tz)
@@ -0,0 +1,186 @@
+import os
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cryptotrading.bar_decoder import chartDataDecoder, epoch_to_index
+
+# on-disk columnar store for OHLCV bars
+# layout: <root>/<period>/<currencyPair>/<column>.bin, one raw little-endian array per column,
+# read back through np.memmap so a warm start never re-downloads or re-parses the history.
+# meta.json holds the committed length: a write first commits only the rows it leaves untouched, rewrites the
+# column tails, then commits the new length, and readers never look past it. a write cut short therefore
+# loses at most its own new bars, which the next refresh downloads again
+
+TIME_COLUMN = 'date'
+BAR_COLUMNS = ['high', 'low', 'open', 'close', 'volume', 'quoteVolume', 'weightedAverage']
+TIME_DTYPE = np.dtype('<i8')
+BAR_DTYPE = np.dtype('<f8')
+
+
+class barStore():
+    def __init__(self, root):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    # one lock per (pair, period) so concurrent downloads of different pairs never block each other
+    def _lock(self, currencyPair, period):
+        key = (currencyPair, int(period))
+        with self._locks_guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def _path(self, currencyPair, period):
+        return os.path.join(self.root, str(int(period)), currencyPair)
+
+    def _column_file(self, currencyPair, period, column):
+        return os.path.join(self._path(currencyPair, period), column + '.bin')
+
+    def _dtype(self, column):
+        return TIME_DTYPE if column == TIME_COLUMN else BAR_DTYPE
+
+    def _file_length(self, currencyPair, period, column):
+        file = self._column_file(currencyPair, period, column)
+        if not os.path.exists(file):
+            return 0
+        return os.path.getsize(file) // self._dtype(column).itemsize
+
+    # the committed rows of a column (the first length rows, when given)
+    def _memmap(self, currencyPair, period, column, length=None):
+        file = self._column_file(currencyPair, period, column)
+        length = self.length(currencyPair, period) if length is None else length
+        if length == 0 or not os.path.exists(file):
+            return np.empty(0, dtype=self._dtype(column))
+        return np.memmap(file, dtype=self._dtype(column), mode='r')[:length]
+
+    def keys(self):
+        if not os.path.isdir(self.root):
+            return
+        for period in sorted(os.listdir(self.root)):
+            for currencyPair in sorted(os.listdir(os.path.join(self.root, period))):
+                yield currencyPair, int(period)
+
+    # committed number of bars; a store without a committed length has as many as its shortest column
+    def length(self, currencyPair, period):
+        length = self._meta(currencyPair, period).get('length')
+        lengths = [self._file_length(currencyPair, period, column) for column in [TIME_COLUMN] + BAR_COLUMNS]
+        return min(lengths) if length is None else min([int(length)] + lengths)
+
+    def _meta_file(self, currencyPair, period):
+        return os.path.join(self._path(currencyPair, period), 'meta.json')
+
+    def _meta(self, currencyPair, period):
+        try:
+            with open(self._meta_file(currencyPair, period)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # written to a temporary file first and renamed over the old one, so meta.json is always whole
+    def _write_meta(self, currencyPair, period, meta):
+        temporary_file = self._meta_file(currencyPair, period) + '.tmp'
+        with open(temporary_file, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temporary_file, self._meta_file(currencyPair, period))
+
+    # unix time of the last stored bar, None if nothing is stored yet
+    def last_timestamp(self, currencyPair, period):
+        times = self._memmap(currencyPair, period, TIME_COLUMN)
+        if len(times) == 0:
+            return None
+        return int(times[-1])
+
+    # unix time the stored history is complete from: the start of the earliest download written with one,
+    # otherwise the first stored bar. None if nothing is stored yet
+    def first_timestamp(self, currencyPair, period):
+        times = self._memmap(currencyPair, period, TIME_COLUMN)
+        first = int(times[0]) if len(times) else None
+        start = self._meta(currencyPair, period).get('start')
+        if start is None:
+            return first
+        return int(start) if first is None else min(int(start), first)
+
+    # write bars, replacing any stored bars between the first and last new timestamp
+    # the last stored bar is usually still forming, so the refresh overlaps it and overwrites it; bars from
+    # before the first stored one are merged in front. start is the unix time the download began at, so a
+    # range with no bars yet still counts as covered
+    def append(self, currencyPair, period, bars, start=None):
+        decoder = chartDataDecoder(dtype=BAR_DTYPE, time_key=TIME_COLUMN, columns=BAR_COLUMNS)
+        times, columns = decoder.feed(bars).finish().arrays()
+        return self.append_arrays(currencyPair, period, times, columns, start=start)
+
+    # same as append, from decoded unix times and a {column: array} dict
+    def append_arrays(self, currencyPair, period, times, columns, start=None):
+        times = np.asarray(times, dtype=TIME_DTYPE)
+        valid = times > 0  # poloniex returns date=0 for empty ranges
+        order = np.argsort(times[valid], kind='mergesort')
+        times = times[valid][order]
+        if len(times) == 0 and start is None:
+            return 0
+
+        with self._lock(currencyPair, period):
+            os.makedirs(self._path(currencyPair, period), exist_ok=True)
+            meta = self._meta(currencyPair, period)
+            stored_times = self._memmap(currencyPair, period, TIME_COLUMN)
+            n_stored = len(stored_times)
+            if len(times):
+                keep = int(np.searchsorted(stored_times, times[0], side='left'))
+                tail = int(np.searchsorted(stored_times, times[-1], side='right'))
+            else:
+                keep = tail = n_stored
+            del stored_times
+            # stored bars after the new ones are only kept when bars are merged in front
+            tails = {}
+            if len(times) and tail < n_stored:
+                tails = {column: np.array(self._memmap(currencyPair, period, column, n_stored)[tail:])
+                         for column in [TIME_COLUMN] + BAR_COLUMNS}
+
+            if len(times):
+                # only the rows before keep survive a write cut short
+                self._write_meta(currencyPair, period, dict(meta, length=keep))
+                for column in [TIME_COLUMN] + BAR_COLUMNS:
+                    dtype = self._dtype(column)
+                    if column == TIME_COLUMN:
+                        values = times
+                    elif column in columns:
+                        values = np.asarray(columns[column], dtype=dtype)[valid][order]
+                    else:
+                        values = np.full(len(times), np.nan, dtype=dtype)
+                    if column in tails:
+                        values = np.concatenate([values, tails[column]])
+                    file = self._column_file(currencyPair, period, column)
+                    with open(file, 'ab') as f:
+                        f.truncate(keep * dtype.itemsize)
+                        f.write(values.tobytes())
+
+            meta['columns'] = [TIME_COLUMN] + BAR_COLUMNS
+            meta['length'] = keep + len(times) + n_stored - tail
+            if start is not None:
+                meta['start'] = int(start) if meta.get('start') is None else min(int(start), int(meta['start']))
+            self._write_meta(currencyPair, period, meta)
+
+        return len(times)
+
+    # stored bars as a dataframe indexed by UTC timestamps, optionally restricted to [start, end] in unix time
+    def read(self, currencyPair, period, start=None, end=None, dtype=BAR_DTYPE):
+        with self._lock(currencyPair, period):
+            length = self.length(currencyPair, period)
+            times = self._memmap(currencyPair, period, TIME_COLUMN, length)
+            lo = 0 if start is None else int(np.searchsorted(times, start, side='left'))
+            hi = len(times) if end is None else int(np.searchsorted(times, end, side='right'))
+            data = {column: np.array(self._memmap(currencyPair, period, column, length)[lo:hi], dtype=dtype)
+                    for column in BAR_COLUMNS}
+            index = epoch_to_index(np.array(times[lo:hi]))
+        return pd.DataFrame(data, index=index, columns=BAR_COLUMNS)
+
+    def drop(self, currencyPair, period):
+        with self._lock(currencyPair, period):
+            path = self._path(currencyPair, period)
+            if os.path.isdir(path):
+                for file in os.listdir(path):
+                    os.remove(os.path.join(path, file))
+                os.rmdir(path)
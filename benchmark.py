@@ -0,0 +1,159 @@
+import argparse
+import datetime
+import json
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from cryptotrading.synthetic_market import syntheticMarket
+from cryptotrading.dataBot import dataBot
+from cryptotrading.traderBot import traderBot
+
+# pipeline benchmarks on synthetic market data
+# every scenario (universe size, history length, bar period) runs the pipeline stage by stage against a
+# syntheticMarket, recording wall time per stage untraced and peak traced memory per stage in a second run.
+# results are written as json and compared with a stored baseline; a stage slower or hungrier than
+# baseline * (1 + tolerance) is a regression
+#   python -m cryptotrading.benchmark --assets 10 50 --days 365 --periods 7200 --baseline baseline.json
+# benchmark_baseline.json holds the default scenario (20 assets, 365 days, 7200s bars, best of 3 runs):
+#   python -m cryptotrading.benchmark --repeat 3 --baseline benchmark_baseline.json
+
+STAGES = ['get_intraday_data', 'load_factors', 'covgen', 'viewgen', 'compute_portfolio_returns']
+METRICS = ['seconds', 'peak bytes']
+DEFAULT_TOLERANCE = 0.25
+
+
+def scenario_name(n_assets, history_days, period):
+    return 'assets={n} days={d} period={p}'.format(n=n_assets, d=history_days, p=period)
+
+
+# wall time of function, with nothing traced
+def measure_seconds(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+# peak memory allocated while function runs
+def measure_peak_bytes(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# the pipeline stages, in order, on fresh bots over a fresh synthetic market
+def scenario_stages(n_assets, history_days, period, seed=0):
+    market = syntheticMarket(n_assets=n_assets, history_days=history_days, seed=seed)
+    region = [market.home] + market.currencies
+    data = dataBot(region=region, home=market.home, freq=period, client=market, requests_per_second=10 ** 9)
+    start_date = (datetime.datetime.fromtimestamp(market.start) + datetime.timedelta(days=1)).date()
+    tb = traderBot(region=region, home=market.home, price_data_frequency_in_seconds=period, start_date=start_date,
+                   data=data, lazy=True)
+    return {
+        'get_intraday_data': data.get_intraday_data,
+        'load_factors': tb.load_factors,
+        'covgen': tb.covgen,
+        'viewgen': tb.viewgen,
+        'compute_portfolio_returns': tb.compute_portfolio_returns
+    }
+
+
+# wall time and peak memory per stage; tracing slows allocation-heavy code several times over, so the times
+# come from an untraced run and the peaks from a second run on fresh bots (a rerun on the same bots would
+# find their caches warm)
+def run_scenario(n_assets, history_days, period, seed=0, trace_memory=True):
+    stages = scenario_stages(n_assets, history_days, period, seed=seed)
+    results = {stage: {'seconds': measure_seconds(stages[stage]), 'peak bytes': 0} for stage in STAGES}
+    if trace_memory:
+        stages = scenario_stages(n_assets, history_days, period, seed=seed)
+        for stage in STAGES:
+            results[stage]['peak bytes'] = measure_peak_bytes(stages[stage])
+    return results
+
+
+# best of repeat runs: the fastest time and the largest peak
+def run_benchmarks(asset_counts, history_days, periods, repeat=1, seed=0, trace_memory=True):
+    results = {}
+    for n_assets in asset_counts:
+        for days in history_days:
+            for period in periods:
+                runs = [run_scenario(n_assets, days, period, seed=seed, trace_memory=trace_memory)
+                        for _ in range(repeat)]
+                results[scenario_name(n_assets, days, period)] = {
+                    stage: {
+                        'seconds': min(run[stage]['seconds'] for run in runs),
+                        'peak bytes': max(run[stage]['peak bytes'] for run in runs)
+                    }
+                    for stage in STAGES
+                }
+    return results
+
+
+# one row per (scenario, stage, metric) found in both results and baseline
+def compare_with_baseline(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    rows = []
+    for scenario, stages in results.items():
+        for stage, metrics in stages.items():
+            base_metrics = baseline.get(scenario, {}).get(stage)
+            if base_metrics is None:
+                continue
+            for metric in METRICS:
+                value, base = metrics[metric], base_metrics[metric]
+                ratio = value / base if base > 0 else float('nan')
+                rows.append({
+                    'scenario': scenario,
+                    'stage': stage,
+                    'metric': metric,
+                    'baseline': base,
+                    'current': value,
+                    'ratio': ratio,
+                    'regression': base > 0 and value > base * (1 + tolerance)
+                })
+    return pd.DataFrame(rows, columns=['scenario', 'stage', 'metric', 'baseline', 'current', 'ratio', 'regression'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the trading pipeline on synthetic market data')
+    parser.add_argument('--assets', help='Universe sizes', type=int, nargs='+', default=[20])
+    parser.add_argument('--days', help='History lengths in days', type=int, nargs='+', default=[365])
+    parser.add_argument('--periods', help='Bar periods in seconds', type=int, nargs='+', default=[7200])
+    parser.add_argument('--repeat', help='Runs per scenario', type=int, default=1)
+    parser.add_argument('--seed', help='Synthetic market seed', type=int, default=0)
+    parser.add_argument('--no-memory', help='Skip memory tracing (faster, no peak bytes)', action='store_true')
+    parser.add_argument('--output', help='Write results to this json file', default=None)
+    parser.add_argument('--baseline', help='Compare against this json file', default=None)
+    parser.add_argument('--save-baseline', help='Write results to the baseline file', action='store_true')
+    parser.add_argument('--tolerance', help='Allowed slowdown / memory growth', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.assets, args.days, args.periods, repeat=args.repeat, seed=args.seed,
+                             trace_memory=not args.no_memory)
+    print(pd.DataFrame({(scenario, stage): metrics for scenario, stages in results.items()
+                        for stage, metrics in stages.items()}).T.to_string())
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    regressions = 0
+    if args.baseline is not None and args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+    elif args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison = compare_with_baseline(results, baseline, tolerance=args.tolerance)
+        print(comparison.to_string())
+        regressions = int(comparison['regression'].sum())
+        if regressions > 0:
+            print(str(regressions) + ' regression(s) against ' + args.baseline)
+    return 1 if regressions > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,18 +1,31 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
 
+import numpy as np
 import pandas as pd
 
 import cryptotrading.poloneix_api as polo_api
+from cryptotrading.instrumentation import timed
+from cryptotrading.logger_builder import logger
+from cryptotrading.bar_store import barStore
+from cryptotrading.bar_cube import barCube
+from cryptotrading.bar_decoder import chartDataDecoder, epoch_to_index
+from cryptotrading.market_snapshot import shared_snapshot
+from cryptotrading.exchange_session import default_client, default_snapshot, pair_universe
 
-# load polo account
-from polo_account_info import POLO_KEY, POLO_SECRET
-polo = polo_api.poloniex(APIKey=POLO_KEY, Secret=POLO_SECRET)
 
-
-# all traded pairs
-ALL_PAIRS = list(polo.returnTicker().keys())
-ALL_CURRENCIES = list({x.split('_')[0] for x in ALL_PAIRS} | \
-                      {x.split('_')[1] for x in ALL_PAIRS})
+# polo (the account client), market (its ticker snapshot) and ALL_PAIRS / ALL_CURRENCIES (the traded
+# universe, cached on disk) are built on first access, so importing needs neither credentials nor a network
+def __getattr__(name):
+    if name == 'polo':
+        return default_client()
+    if name == 'market':
+        return default_snapshot()
+    if name == 'ALL_PAIRS':
+        return list(pair_universe().pairs)
+    if name == 'ALL_CURRENCIES':
+        return list(pair_universe().currencies)
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
 
 # default start, end dates in UNIX time, default sampling frequency
 START = 0
@@ -24,44 +37,170 @@ def convert_to_df(input, time_key='date'):
     df = pd.DataFrame(input)
 
     if time_key in df.columns:
-        df.index = [pd.Timestamp(datetime.utcfromtimestamp(x), tz='UTC') for x in df[time_key]]
-        df = df.drop(time_key, 1)
+        df.index = epoch_to_index(df[time_key].values)
+        df = df.drop(time_key, axis=1)
     else:
         raise ValueError('time key not found!')
 
     return df
 
 class dataBot():
-    def __init__(self, region, home, freq, tz=DEFAULT_TZ):
+    def __init__(self, region, home, freq, tz=DEFAULT_TZ, store=None, max_workers=1,
+                 requests_per_second=polo_api.DEFAULT_REQUESTS_PER_SECOND, max_retries=3, dtype=np.float64,
+                 start=START, client=None, feed=None):
         # freq = 300, 900, 1800, 7200, 14400, or 86400
         self.home = home
         self.freq = freq
         self.region = region
         self.tz = tz
+        self.dtype = np.dtype(dtype)  # bar column dtype, float32 halves memory for large universes
+        self.start = start  # first bar to load in unix time; later starts load only the recent history
+        self.logger = logger
+
+        # exchange client; anything with the poloniex client's public methods (e.g. a synthetic market)
+        # tickers come from the client's shared snapshot, so prices and pairs cost one fetch per ttl
+        self.client = default_client() if client is None else client
+        self.market = shared_snapshot(self.client)
+
+        # optional market_feed.marketFeed of freq bars; its live bars extend the downloaded history and its
+        # quotes price the region, so neither needs a request once the history is loaded
+        if feed is not None and feed.period != freq:
+            raise ValueError('feed period does not match freq!')
+        self.feed = feed
+        self._feed_version = None  # the feed's bar version the cube has caught up with
+        self._live_after = {}  # currency -> timestamp of the last feed bar in the cube
+
+        # download settings; max_workers > 1 fetches pairs concurrently under a shared rate limit
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.rate_limiter = polo_api.rateLimiter(requests_per_second)
+
+        # optional local bar store (barStore or directory path); only new bars are downloaded when set
+        if isinstance(store, str):
+            store = barStore(store)
+        self.store = store
 
         self.intraday_ti = None
+        self.data_version = 0  # bumped whenever the loaded bars change; keys derived-data caches
 
         # caching intraday and daily returns
         #self.get_intraday_data()
 
+    # traded pairs; a pairIndex, so lookups are O(1). the client's pair universe, so no ticker fetch is needed
+    @property
+    def pairs(self):
+        return pair_universe(self.client)
+
+    @timed()
     def get_intraday_data(self):
         if self.intraday_ti is None:
-            data_panel = {}
-            for currency in self.region:
-                print(currency)
-                data_panel[currency] = self._get_bars(currency)
-            data_panel = pd.Panel(data_panel)
-            self.intraday_ti = data_panel
+            self.intraday_ti = self._build_cube(self._download_bars(self.region))
+            self.data_version += 1
+        elif self.feed is not None and self.feed.bar_version != self._feed_version:
+            # bars closed since the last look are appended; ticks inside the forming bar change nothing
+            self._feed_version = self.feed.bar_version
+            live = self._live_cube()
+            if live is not None:
+                self.intraday_ti = self.intraday_ti.append(live)
+                self.data_version += 1
         return self.intraday_ti
 
+    # reload bars (incrementally when a store is set); the data version moves unless every bar came back
+    # identical, so revised history invalidates derived data as much as new bars do
+    def refresh_intraday_data(self):
+        previous = self.intraday_ti
+        self.intraday_ti = self._build_cube(self._download_bars(self.region))
+        if previous is None or not previous.equals(self.intraday_ti):
+            self.data_version += 1
+        return self.intraday_ti
+
+    # bar cube of the downloaded history, extended by the feed's closed bars when there is a feed
+    def _build_cube(self, history):
+        if self.feed is not None:
+            # read before the bars, so a bar closing in between is picked up by the next look
+            self._feed_version = self.feed.bar_version
+            self._live_after = {}
+            history = {currency: self._with_live_bars(currency, bars) for currency, bars in history.items()}
+        return barCube.from_frames(history)
+
+    # a currency's bars followed by its pair's closed feed bars after them
+    def _with_live_bars(self, currency, bars):
+        after = bars.index[-1] if len(bars) > 0 else None
+        live = self._live_bars(currency, after)
+        if len(bars.columns) > 0:
+            live = live[bars.columns]
+        return pd.concat([bars, live]) if len(live) > 0 else bars
+
+    # the feed's closed bars of a currency's pair after the timestamp after (all of them for None); the home
+    # currency's are 1 on BTC_LTC's dates, as in _get_bars. the last bar taken is remembered per currency
+    def _live_bars(self, currency, after):
+        currencyPair = 'BTC_LTC' if currency == self.home else self.home + '_' + currency
+        after = self._live_after.get(currency, after)
+        start = 0 if after is None else int(after.timestamp()) + 1
+        live = self.feed.bars(currencyPair, start=start, tz=self.tz, dtype=self.dtype, closed=True)
+        if currency == self.home:
+            live = pd.DataFrame(1, columns=live.columns, index=live.index)
+        if len(live) > 0:
+            self._live_after[currency] = live.index[-1]
+        elif after is not None:
+            self._live_after[currency] = after
+        return live
+
+    # the feed's bars closed since the cube was last extended, on the cube's assets and fields; a pair's
+    # bars may fall before the cube's last bar when its ticks lag. None when there are none
+    def _live_cube(self):
+        fields = self.intraday_ti.fields
+        frames = {currency: self._live_bars(currency, None).reindex(columns=fields)
+                  for currency in self.intraday_ti.assets}
+        if all(len(frame) == 0 for frame in frames.values()):
+            return None
+        return barCube.from_frames(frames)
+
+    # fetch bars for all currencies; failed pairs are retried with backoff while finished pairs are kept
+    def _download_bars(self, currencies):
+        data_panel = {}
+        pending = list(currencies)
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(2 ** (attempt - 1))
+            errors = {}
+            if self.max_workers > 1:
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = {executor.submit(self._get_bars, currency): currency for currency in pending}
+                    for future in as_completed(futures):
+                        currency = futures[future]
+                        try:
+                            data_panel[currency] = future.result()
+                            self.logger.info('Downloaded ' + currency + ' bars')
+                        except Exception as e:
+                            errors[currency] = e
+            else:
+                for currency in pending:
+                    try:
+                        data_panel[currency] = self._get_bars(currency)
+                        self.logger.info('Downloaded ' + currency + ' bars')
+                    except Exception as e:
+                        errors[currency] = e
+            pending = [currency for currency in pending if currency in errors]
+            if len(pending) == 0:
+                break
+            self.logger.info('Retrying ' + str(pending) + ': ' +
+                             str({currency: str(errors[currency]) for currency in pending}))
+        if len(pending) > 0:
+            raise IOError('Failed to download bars for ' + str(pending) + ': ' +
+                          str({currency: str(errors[currency]) for currency in pending}))
+        return {currency: data_panel[currency] for currency in currencies}
+
 
     def get_current_prices(self):
         prices = pd.Series()
-        pair_info = polo.returnTicker()
+        pair_info = self.market.ticker() if self.feed is None else self.feed.returnTicker()
         for currency in self.region:
             currencyPair = self.home + '_' + currency
-            if currencyPair in ALL_PAIRS:
-                currencyPair = self.home + '_' + currency
+            if currencyPair in self.pairs:
+                if currencyPair not in pair_info:
+                    # not streamed yet
+                    pair_info = dict(self.market.ticker(), **pair_info)
                 price = float(pair_info[currencyPair]['last'])
             elif currency == self.home:
                 price = 1
@@ -73,10 +212,10 @@ class dataBot():
 
     def _get_bars(self, currency):
         currencyPair = self.home + '_' + currency
-        if currencyPair in ALL_PAIRS:
-            bars = self.get_pair_bars(currencyPair)
+        if currencyPair in self.pairs:
+            bars = self.get_pair_bars(currencyPair, start=self.start)
         elif currency == self.home:
-            default_df = self.get_pair_bars('BTC_LTC')
+            default_df = self.get_pair_bars('BTC_LTC', start=self.start)
             bars = pd.DataFrame(1, columns=default_df.columns, index=default_df.index)
         else:
             raise ValueError(currencyPair + ' does not exist!')
@@ -85,15 +224,47 @@ class dataBot():
 
     # volume = volume in BTC; close = close price
     def get_pair_bars(self, currencyPair, start=START, end=END):
-        bars = convert_to_df(polo.returnChartData(currencyPair, start, end, self.freq),
-                             time_key='date')
+        if self.store is not None:
+            return self._get_stored_pair_bars(currencyPair, start, end)
+
+        bars = self._decode_chart_data(currencyPair, start, end, dtype=self.dtype).to_frame(tz=self.tz)
+
+        return bars
+
+    # stream returnChartData straight into typed arrays as the response arrives
+    def _decode_chart_data(self, currencyPair, start, end, dtype):
+        self.rate_limiter.acquire()
+        decoder = chartDataDecoder(dtype=dtype, time_key='date')
+        try:
+            for chunk in self.client.returnChartDataStream(currencyPair, start, end, self.freq):
+                decoder.feed(chunk)
+        except IOError as e:
+            raise IOError(currencyPair + ': ' + str(e))
+        return decoder.finish()
+
+    # fill the local store in front of its first stored bar and from its last stored bar onwards, then serve
+    # the requested range from disk. a store seeded by a short live run gains its early history this way
+    def _get_stored_pair_bars(self, currencyPair, start=START, end=END):
+        first_timestamp = self.store.first_timestamp(currencyPair, self.freq)
+        if first_timestamp is not None and start < first_timestamp:
+            times, columns = self._decode_chart_data(currencyPair, start, min(end, first_timestamp - 1),
+                                                     dtype=np.float64).arrays()
+            self.store.append_arrays(currencyPair, self.freq, times, columns, start=start)
+
+        last_timestamp = self.store.last_timestamp(currencyPair, self.freq)
+        fetch_start = start if last_timestamp is None else max(start, last_timestamp)
+        if fetch_start <= end:
+            times, columns = self._decode_chart_data(currencyPair, fetch_start, end, dtype=np.float64).arrays()
+            self.store.append_arrays(currencyPair, self.freq, times, columns, start=fetch_start)
+
+        bars = self.store.read(currencyPair, self.freq, start=start, end=end, dtype=self.dtype)
         bars = bars.tz_convert(self.tz)
 
         return bars
 
 
     def get_current_positions(self):
-        balances_dict = polo.returnBalances()
+        balances_dict = self.client.returnBalances()
         balances_in_local_currency_units = pd.Series({label: float(balances_dict[label])
                                                       for label in balances_dict.keys()})
         prices = self.get_current_prices()
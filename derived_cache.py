@@ -0,0 +1,72 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# memoized derived data (daily returns, volumes, resampled bars, ...)
+# every entry is tagged with the data version it was built from; the first lookup under a new
+# version drops everything built from older data
+
+
+def _nbytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    return 0
+
+
+class derivedCache():
+    def __init__(self):
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    # cached value for key under version, built with builder() on a miss
+    def get(self, key, version, builder):
+        with self._lock:
+            if version != self.version:
+                self.invalidate()
+                self.version = version
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            value = builder()
+            self._entries[key] = value
+            return value
+
+    def invalidate(self):
+        with self._lock:
+            if len(self._entries) > 0:
+                self.invalidations += 1
+            self._entries = {}
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def nbytes(self):
+        with self._lock:
+            return sum(_nbytes(value) for value in self._entries.values())
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return pd.Series({
+            'version': self.version,
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit rate': self.hits / lookups if lookups > 0 else np.nan,
+            'invalidations': self.invalidations,
+            'bytes': self.nbytes()
+        })
@@ -4,10 +4,11 @@ import os
 from email import encoders
 from email.mime.base import MIMEBase
 from email.mime.multipart import MIMEMultipart
-from cryptotrading.emailer_account_info import gmail_user, gmail_pwd, toaddres
-from cryptotrading.logger_builder import logger
+from cryptotrading.logger_builder import logger, get_log_path, flush_logging
 
 def send_email():
+    # credentials are loaded here rather than at import, so importing needs no account files
+    from cryptotrading.emailer_account_info import gmail_user, gmail_pwd, toaddres
     fromaddr = gmail_user + '@gmail.com'
     server = smtplib.SMTP('smtp.gmail.com:587')
     server.ehlo()
@@ -23,7 +24,9 @@ def send_email():
 
     # Add the attachments to the message
     msg = None
-    file = 'h:\\traderBot_log\\' + datetime.date.today().strftime('%Y-%m-%d.log')
+    # the log is written by a background thread; let it catch up before attaching
+    flush_logging()
+    file = get_log_path()
     try:
         with open(file, 'rb') as fp:
             msg = MIMEBase('application', "octet-stream")
@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import time
+import weakref
+
+import cryptotrading.poloneix_api as polo_api
+from cryptotrading.market_snapshot import pairIndex, shared_snapshot
+
+# lazy exchange session
+# the account client is only built (and polo_account_info only imported) when something first trades or
+# downloads through it, and is then shared by dataBot, executionBot and their snapshots. the traded pair
+# universe is kept in a json file and refreshed in the background once it is refresh_interval old; until then,
+# or for good when offline, the stale list is used, so importing and starting up needs neither credentials
+# nor a network
+#   pair_universe().pairs, default_client().returnBalances()
+
+CACHE_DIR_ENV = 'CRYPTOTRADING_CACHE_DIR'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cryptotrading')
+PAIRS_FILE = 'pairs.json'
+DEFAULT_REFRESH_INTERVAL = 24 * 3600.0  # seconds
+
+_lock = threading.Lock()
+_client = None
+# pair universes: the default client's by pairs file path, any other client's by client and path (None for
+# memory only). _universe_lock only guards these dicts; a universe is loaded under its own lock, so a slow
+# fetch holds up the callers waiting for that universe and no one else
+_universe_lock = threading.Lock()
+_universes = {}
+_universe_locks = {}
+_client_universes = weakref.WeakKeyDictionary()
+_client_universe_locks = weakref.WeakKeyDictionary()
+
+
+# the account's poloniex client, built on first use
+def default_client():
+    global _client
+    with _lock:
+        if _client is None:
+            from polo_account_info import POLO_KEY, POLO_SECRET
+            _client = polo_api.poloniex(APIKey=POLO_KEY, Secret=POLO_SECRET)
+        return _client
+
+
+# the default client's ticker snapshot
+def default_snapshot():
+    return shared_snapshot(default_client())
+
+
+def pairs_path():
+    return os.path.join(os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR), PAIRS_FILE)
+
+
+# (unix time fetched, pairs) from a pairs file, (None, None) if there is no readable one
+def read_pairs(path):
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        return float(cached['fetched']), list(cached['pairs'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+
+# written to a temporary file first, so readers never see half a list
+def write_pairs(path, pairs, fetched=None):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump({'fetched': time.time() if fetched is None else fetched, 'pairs': list(pairs)}, f)
+    os.replace(temporary_path, path)
+
+
+# pairIndex of the traded pairs; the client defaults to default_client()
+# the default client's universe is read from a pairs file (path, default pairs_path()); without one it is
+# fetched from the client's snapshot and written. a file older than refresh_interval is still used, and
+# refreshed on a background thread, so a slow or missing network never holds up startup. any other client
+# (a stand-in, a synthetic market) keeps its universe in memory unless given a path, so it never overwrites
+# the exchange's file. concurrent first calls for a universe fetch once
+def pair_universe(client=None, path=None, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+    if client is not None and client is _client:
+        client = None
+    if client is None:
+        path = pairs_path() if path is None else path
+    with _universe_lock:
+        universes = _universes if client is None else _client_universes.setdefault(client, {})
+        locks = _universe_locks if client is None else _client_universe_locks.setdefault(client, {})
+        if path in universes:
+            return universes[path]
+        loading = locks.setdefault(path, threading.Lock())
+
+    with loading:
+        with _universe_lock:
+            if path in universes:
+                return universes[path]
+        fetched, pairs = (None, None) if path is None else read_pairs(path)
+        if pairs is None:
+            index = pairIndex(_fetch_pairs(client, path))
+        else:
+            index = pairIndex(pairs)
+            if time.time() - fetched >= refresh_interval:
+                threading.Thread(target=_refresh_pairs, args=(client, path, universes), daemon=True).start()
+        with _universe_lock:
+            universes[path] = index
+        return index
+
+
+def _fetch_pairs(client, path):
+    snapshot = default_snapshot() if client is None else shared_snapshot(client)
+    pairs = list(snapshot.pair_index().pairs)
+    if path is not None:
+        write_pairs(path, pairs)
+    return pairs
+
+
+# offline: keep the stale list, the next startup tries again
+def _refresh_pairs(client, path, universes):
+    try:
+        index = pairIndex(_fetch_pairs(client, path))
+    except Exception:
+        return
+    with _universe_lock:
+        universes[path] = index
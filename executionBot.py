@@ -5,21 +5,45 @@ import time
 # execution bot
 # takes trades and execute them
 
-import cryptotrading.poloneix_api as polo_api
+import cryptotrading.instrumentation as instrumentation
+from cryptotrading.execution_engine import executionEngine, resolve_order, limit_price
+from cryptotrading.execution_scheduler import executionScheduler, DEFAULT_HORIZON
 from cryptotrading.logger_builder import logger
+from cryptotrading.exchange_session import default_client, default_snapshot, pair_universe
+from cryptotrading.market_snapshot import shared_snapshot
 
-# load polo account
-from polo_account_info import POLO_KEY, POLO_SECRET
 
-polo = polo_api.poloniex(APIKey=POLO_KEY, Secret=POLO_SECRET)
+# polo account and its ticker snapshot, shared with dataBot and built on first access
+def __getattr__(name):
+    if name == 'polo':
+        return default_client()
+    if name == 'market':
+        return default_snapshot()
+    raise AttributeError('module ' + repr(__name__) + ' has no attribute ' + repr(name))
 
 
 class executionBot():
-    def __init__(self, orders, debug=False):
+    def __init__(self, orders, debug=False, asynchronous=False, engine=None, schedule=None, horizon=DEFAULT_HORIZON,
+                 feed=None, client=None):
         # trades: list of tuples in the following format
         # (currency to buy, currency to sell, amount in buy currency, amount in sell currency)
         self.orders = orders
         self.logger = logger
+        # exchange client, the account's by default
+        self.client = default_client() if client is None else client
+
+        # quotes from a market_feed.marketFeed when given (seed it with the ticker so it knows every pair),
+        # otherwise from the shared ticker snapshot
+        self.market = shared_snapshot(self.client) if feed is None else feed.snapshot
+
+        # asynchronous: run orders concurrently through an executionEngine instead of fixed-wait attempts
+        # schedule ('twap' or 'vwap'): slice them by order book depth over at most horizon seconds
+        if engine is None and schedule is not None:
+            engine = executionScheduler(self.client, style=schedule, horizon=horizon, logger=logger, snapshot=self.market)
+        elif engine is None and asynchronous:
+            engine = executionEngine(self.client, logger=logger, snapshot=self.market)
+        self.engine = engine
+        self.results = []
 
         self.buy_orders = [order for order in orders if order[3] is None]
         self.sell_orders = [order for order in orders if order[2] is None]
@@ -29,9 +53,9 @@ class executionBot():
         # execute all sell orders
         if not debug:
             self.logger.info('===Executing all sell orders===')
-            self.execute_orders_on_polo(order_list=self.sell_orders)
+            self.execute_orders(order_list=self.sell_orders)
             self.logger.info('===Executing all buy orders===')
-            self.execute_orders_on_polo(order_list=self.buy_orders)
+            self.execute_orders(order_list=self.buy_orders)
 
     def check_order_validity(self):
         for order in self.orders:
@@ -45,6 +69,11 @@ class executionBot():
 
         assert len(self.buy_orders) + len(self.sell_orders) == len(self.orders)
 
+    def execute_orders(self, order_list):
+        if self.engine is None:
+            return self.execute_orders_on_polo(order_list=order_list)
+        self.results += self.engine.execute(order_list)
+
     def execute_orders_on_polo(self, order_list, max_attempts=9, wait_time_in_minutes=20):
         self.logger.info(str(len(order_list)) + ' orders received!')
 
@@ -66,17 +95,23 @@ class executionBot():
             time.sleep(60 * wait_time_in_minutes)
 
             # check order status
-            status = polo.returnOpenOrders(currencyPair='all')
+            status = self.client.returnOpenOrders(currencyPair='all')
             number_of_open_orders = sum([len(status[cp]) for cp in status.keys()])
             self.logger.info(str(number_of_open_orders) + ' order(s) remain unfilled.')
 
-            # cancel unfilled orders
-            order_numbers_unfilled = [(cp, status[cp][i]['orderNumber']) for cp in status.keys() for i in range(len(status[cp]))]
+            # cancel unfilled orders; only ours, other open orders on the account are left alone
+            order_numbers_unfilled = [(cp, status[cp][i]['orderNumber']) for cp in status.keys() for i in range(len(status[cp]))
+                                      if status[cp][i]['orderNumber'] in order_numbers_dict]
             for cp, order_number in order_numbers_unfilled:
-                polo.cancel(currencyPair=cp, orderNumber=order_number)
-                self.logger.info('...#' + order_number + ' cancelled')
+                self.client.cancel(currencyPair=cp, orderNumber=order_number)
+                self.logger.info('...#' + order_number + ' cancelled', extra={'order_number': order_number, 'pair': cp})
 
             unfilled_order_list = [order_numbers_dict[order_number] for cp, order_number in order_numbers_unfilled]
+            # fills are only seen at this check, which stands in for their time on the rebalance timeline
+            unfilled_order_numbers = {order_number for cp, order_number in order_numbers_unfilled}
+            for order_number in order_numbers_dict.keys():
+                if order_number not in unfilled_order_numbers:
+                    instrumentation.event(instrumentation.FILL_EVENT, order_number=order_number)
             if len(unfilled_order_list) == 0:
                 break
 
@@ -86,59 +121,34 @@ class executionBot():
         return
 
     def send_single_order_on_polo(self, order, limit_x_spread=0.03):
-        ticker_info = polo.returnTicker()
-        domestic = None
-        foreign = None
-        if order[0] + '_' + order[1] in ticker_info.keys():
-            domestic = order[0]
-            foreign = order[1]
-        elif order[1] + '_' + order[0] in ticker_info.keys():
-            domestic = order[1]
-            foreign = order[0]
-        ticker = domestic + '_' + foreign
-
-        if ticker_info[ticker]['isFrozen'] != '0':
-            self.logger.info('Cannot trade ' + ticker + ' due to exchange restriction!')
-            return
+        # amount in foreign currency; the pair universe resolves it without a ticker fetch
+        ticker, order_type, amount = resolve_order(order, pair_universe(self.client))
 
-        order_type = None
-        amount = None  # in foreign currency
-        if order[2] is not None:
-            amount = order[2]
-            if order[0] == foreign:
-                order_type = 'BUY'
-            else:
-                order_type = 'SELL'
-        else:
-            amount = order[3]
-            if order[1] == foreign:
-                order_type = 'SELL'
-            else:
-                order_type = 'BUY'
-
-        # refresh quotes
-        ticker_info = polo.returnTicker()
-        bid = float(ticker_info[ticker]['highestBid'])
-        ask = float(ticker_info[ticker]['lowestAsk'])
-        if order_type == 'BUY':
-            limit = bid - (ask - bid) * limit_x_spread
-        else:
-            limit = ask + (ask - bid) * limit_x_spread
+        # quotes no older than the snapshot ttl
+        if self.market.ticker()[ticker]['isFrozen'] != '0':
+            self.logger.info('Cannot trade ' + ticker + ' due to exchange restriction!', extra={'pair': ticker})
+            return
+        bid, ask = self.market.quote(ticker)
+        limit = limit_price(order_type, bid, ask, limit_x_spread)
 
         # place order
         output = None
+        placed = time.perf_counter()
         if order_type == 'BUY':
-            output = polo.buy(currencyPair=ticker, rate=limit, amount=amount)
+            output = self.client.buy(currencyPair=ticker, rate=limit, amount=amount)
         else:
-            output = polo.sell(currencyPair=ticker, rate=limit, amount=amount)
+            output = self.client.sell(currencyPair=ticker, rate=limit, amount=amount)
+        latency = time.perf_counter() - placed
 
         order_description = order_type + ' ' + ticker + ' at ' + str(limit) + ', amount = ' + str(amount)
 
         if 'error' in output.keys():
-            self.logger.info('Order error: ' + output['error'])
-            self.logger.info('...failed to place order: ' + order_description)
+            self.logger.info('Order error: ' + output['error'], extra={'pair': ticker, 'latency': latency})
+            self.logger.info('...failed to place order: ' + order_description, extra={'pair': ticker})
             return None
 
-        self.logger.info('Order placed #' + str(output['orderNumber']) + ': ' + order_description)
+        self.logger.info('Order placed #' + str(output['orderNumber']) + ': ' + order_description,
+                         extra={'order_number': str(output['orderNumber']), 'pair': ticker, 'side': order_type,
+                                'rate': limit, 'amount': amount, 'latency': latency})
 
         return output['orderNumber']
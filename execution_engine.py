@@ -0,0 +1,229 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cryptotrading.instrumentation as instrumentation
+import cryptotrading.poloneix_api as polo_api
+from cryptotrading.exchange_session import pair_universe
+from cryptotrading.market_snapshot import shared_snapshot
+
+# asynchronous order execution
+# every order runs as its own task: it is priced off fresh quotes, placed, and then watched through its own
+# order number only, by polling the pair's open orders or the order's trades. the poll interval starts at
+# min_poll, grows by poll_backoff while nothing happens and drops back to min_poll on any fill. an order still
+# resting at its own deadline (order_timeout after it was placed) is cancelled and its remainder repriced,
+# passively for the first passive_attempts and at the touch afterwards. the blocking client calls run in a
+# thread pool under a shared rate limit, so many orders are in flight at once. quotes come from a shared
+# market snapshot, so orders priced together cost one ticker fetch
+
+DEFAULT_MAX_ATTEMPTS = 9
+DEFAULT_PASSIVE_ATTEMPTS = 3
+DEFAULT_LIMIT_X_SPREAD = 0.03  # passive limits sit this many spreads behind the touch
+DEFAULT_ORDER_TIMEOUT = 20 * 60.0  # seconds an attempt may rest before it is repriced
+DEFAULT_MIN_POLL = 1.0
+DEFAULT_MAX_POLL = 60.0
+DEFAULT_POLL_BACKOFF = 2.0
+DEFAULT_MAX_WORKERS = 8
+FILL_TOLERANCE = 10 ** -8  # share of an order's amount left unfilled that still counts as filled
+TRACKING_MODES = ['open orders', 'trades']
+
+
+# (pair, 'BUY' or 'SELL', amount) of an executionBot order
+# (currency to buy, currency to sell, amount in buy currency, amount in sell currency)
+# pair_index: market_snapshot.pairIndex of the traded pairs
+def resolve_order(order, pair_index):
+    pair, domestic, foreign = pair_index.resolve(order[0], order[1])
+
+    if order[2] is not None:
+        amount = order[2]
+        order_type = 'BUY' if order[0] == foreign else 'SELL'
+    else:
+        amount = order[3]
+        order_type = 'SELL' if order[1] == foreign else 'BUY'
+    return pair, order_type, amount
+
+
+# amount traded by a list of trades, as returnOrderTrades and resultingTrades report them
+def trades_amount(trades):
+    return sum(float(trade['amount']) for trade in trades)
+
+
+# limit limit_x_spread spreads behind the touch: below the bid for buys, above the ask for sells
+def limit_price(order_type, bid, ask, limit_x_spread):
+    if order_type == 'BUY':
+        return bid - (ask - bid) * limit_x_spread
+    return ask + (ask - bid) * limit_x_spread
+
+
+class executionEngine():
+    def __init__(self, client, logger=None, max_attempts=DEFAULT_MAX_ATTEMPTS,
+                 passive_attempts=DEFAULT_PASSIVE_ATTEMPTS, limit_x_spread=DEFAULT_LIMIT_X_SPREAD,
+                 order_timeout=DEFAULT_ORDER_TIMEOUT, min_poll=DEFAULT_MIN_POLL, max_poll=DEFAULT_MAX_POLL,
+                 poll_backoff=DEFAULT_POLL_BACKOFF, tracking='open orders', max_workers=DEFAULT_MAX_WORKERS,
+                 requests_per_second=polo_api.DEFAULT_REQUESTS_PER_SECOND, snapshot=None):
+        if tracking not in TRACKING_MODES:
+            raise ValueError('tracking mode not valid!')
+        self.client = client
+        self.logger = logger
+        self.max_attempts = max_attempts
+        self.passive_attempts = passive_attempts
+        self.limit_x_spread = limit_x_spread
+        self.order_timeout = order_timeout
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.poll_backoff = poll_backoff
+        self.tracking = tracking  # 'open orders': poll the pair's open orders, 'trades': poll the order's trades
+        self.max_workers = max_workers
+        self.rate_limiter = polo_api.rateLimiter(requests_per_second)
+        self.snapshot = shared_snapshot(client) if snapshot is None else snapshot
+        self.executor = None
+        self.pair_index = None
+
+    # fields go to the record as extra, so json lines logs carry them as fields
+    def _log(self, message, **fields):
+        if self.logger is not None:
+            self.logger.info(message, extra=fields)
+
+    # executes the orders concurrently; one result dict per order, in order
+    def execute(self, orders):
+        return asyncio.run(self.execute_async(orders))
+
+    async def execute_async(self, orders):
+        self._log(str(len(orders)) + ' orders received!')
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            self.executor = executor
+            try:
+                # the first look at a client's universe may fetch it, so not on the event loop
+                self.pair_index = await asyncio.get_running_loop().run_in_executor(executor, pair_universe,
+                                                                                    self.client)
+                results = await asyncio.gather(*[self._execute_order(order) for order in orders])
+            finally:
+                self.executor = None
+        self._log(str(sum(result['status'] == 'filled' for result in results)) + ' order(s) filled!')
+        return list(results)
+
+    # blocking client call on the thread pool
+    async def _call(self, method, **kwargs):
+        def call():
+            self.rate_limiter.acquire()
+            return getattr(self.client, method)(**kwargs)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    # the snapshot's ticker; only a stale snapshot costs a (rate limited) fetch
+    async def _ticker(self):
+        if self.snapshot.is_fresh():
+            return self.snapshot.ticker()
+
+        def fetch():
+            if not self.snapshot.is_fresh():
+                self.rate_limiter.acquire()
+            return self.snapshot.ticker()
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fetch)
+
+    # result dict of an order resolved against the pair universe; status 'frozen' if the snapshot says its pair
+    # cannot be traded
+    async def _new_result(self, order):
+        ticker_info = await self._ticker()
+        pair, order_type, amount = resolve_order(order, self.pair_index)
+        result = {'order': order, 'pair': pair, 'type': order_type, 'amount': amount, 'filled': 0.0,
+                  'order numbers': [], 'attempts': 0, 'status': 'unfilled'}
+        if ticker_info[pair]['isFrozen'] != '0':
+            self._log('Cannot trade ' + pair + ' due to exchange restriction!', pair=pair)
+            result['status'] = 'frozen'
+        return result, ticker_info
+
+    async def _execute_order(self, order):
+        result, ticker_info = await self._new_result(order)
+        if result['status'] == 'frozen':
+            return result
+        pair, order_type, amount = result['pair'], result['type'], result['amount']
+
+        remaining = amount
+        for attempt in range(1, self.max_attempts + 1):
+            result['attempts'] = attempt
+
+            # price off quotes no older than the snapshot ttl
+            if attempt > 1:
+                ticker_info = await self._ticker()
+            bid = float(ticker_info[pair]['highestBid'])
+            ask = float(ticker_info[pair]['lowestAsk'])
+            limit_x_spread = self.limit_x_spread if attempt <= self.passive_attempts else 0.0
+            limit = limit_price(order_type, bid, ask, limit_x_spread)
+
+            placed = time.perf_counter()
+            output = await self._call(order_type.lower(), currencyPair=pair, rate=limit, amount=remaining)
+            latency = time.perf_counter() - placed
+            order_description = order_type + ' ' + pair + ' at ' + str(limit) + ', amount = ' + str(remaining)
+            if 'error' in output.keys():
+                self._log('Order error: ' + output['error'], pair=pair, latency=latency)
+                self._log('...failed to place order: ' + order_description, pair=pair)
+                result['status'] = 'rejected'
+                return result
+            order_number = str(output['orderNumber'])
+            result['order numbers'].append(order_number)
+            self._log('Attempt #' + str(attempt) + ', order placed #' + order_number + ': ' + order_description,
+                      order_number=order_number, pair=pair, side=order_type, rate=limit, amount=remaining,
+                      attempt=attempt, latency=latency)
+
+            # what the order took on arrival comes back with the placement, before the exchange lists its trades
+            filled = await self._watch_order(pair, order_number, remaining, time.monotonic() + self.order_timeout,
+                                             filled=trades_amount(output.get('resultingTrades', [])))
+            if filled > 0:
+                instrumentation.event(instrumentation.FILL_EVENT, pair=pair, order_number=order_number, amount=filled)
+            result['filled'] += filled
+            remaining -= filled
+            if remaining <= amount * FILL_TOLERANCE:
+                result['status'] = 'filled'
+                self._log('...#' + order_number + ' filled', order_number=order_number, pair=pair)
+                return result
+        return result
+
+    # amount filled once the order is done: filled, or cancelled at its deadline; filled: known fill so far
+    async def _watch_order(self, pair, order_number, amount, deadline, filled=0.0):
+        interval = self.min_poll
+        last_filled = filled
+        missing = False
+        while last_filled < amount * (1 - FILL_TOLERANCE):
+            filled, done, missing = await self._order_status(pair, order_number, amount, last_filled, missing)
+            if done:
+                return filled
+            now = time.monotonic()
+            if now >= deadline:
+                cancelled = time.perf_counter()
+                await self._call('cancel', currencyPair=pair, orderNumber=order_number)
+                self._log('...#' + order_number + ' cancelled', order_number=order_number, pair=pair,
+                          latency=time.perf_counter() - cancelled)
+                # trades are the final word, the order may have filled before the cancel arrived
+                return max(await self._filled_amount(order_number), filled)
+            interval = self.min_poll if filled > last_filled else min(interval * self.poll_backoff, self.max_poll)
+            last_filled = filled
+            await asyncio.sleep(min(interval, deadline - now))
+        return last_filled
+
+    # (amount filled so far, whether the order is done, whether it is missing from the open orders)
+    # the exchange may list a new order, and report an order's trades, some time after the fact: an order
+    # missing from the open orders is done once its trades cover its amount, or when it was missing at the
+    # previous poll too
+    async def _order_status(self, pair, order_number, amount, last_filled, missing):
+        if self.tracking == 'trades':
+            filled = max(await self._filled_amount(order_number), last_filled)
+            return filled, filled >= amount * (1 - FILL_TOLERANCE), missing
+
+        open_orders = await self._call('returnOpenOrders', currencyPair=pair)
+        if not isinstance(open_orders, list):
+            # error response; nothing learnt, look again later
+            return last_filled, False, missing
+        for open_order in open_orders:
+            if str(open_order['orderNumber']) == order_number:
+                return max(amount - float(open_order['amount']), last_filled), False, False
+        filled = max(await self._filled_amount(order_number), last_filled)
+        return filled, missing or filled >= amount * (1 - FILL_TOLERANCE), True
+
+    async def _filled_amount(self, order_number):
+        trades = await self._call('returnOrderTrades', orderNumber=order_number)
+        if not isinstance(trades, list):
+            # the exchange answers with an error for orders without trades
+            return 0.0
+        return trades_amount(trades)
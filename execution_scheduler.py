@@ -0,0 +1,164 @@
+import asyncio
+import math
+import time
+
+import numpy as np
+
+import cryptotrading.instrumentation as instrumentation
+from cryptotrading.execution_engine import executionEngine, trades_amount, FILL_TOLERANCE
+
+# order-book-aware execution scheduling
+# each parent order is sliced into child orders, one per slice_interval. the number of slices follows the
+# pair's liquidity: enough for the parent to trade at participation_cap of the pair's recent traded volume,
+# but never past horizon, so liquid pairs finish in one slice and thin ones are spread over the horizon.
+# the parent is split across the slices evenly ('twap') or by the pair's time-of-day volume profile ('vwap');
+# a slice trades what the schedule is behind by, capped at participation_cap of the visible depth within
+# depth_band of the touch, and is priced at the book level that covers it. whatever a child leaves is
+# cancelled at the end of its slice and rolls into the next one; with complete_at_horizon the last slice
+# trades the whole remainder at the edge of the band
+
+SCHEDULE_STYLES = ['twap', 'vwap']
+DEFAULT_HORIZON = 3600.0  # seconds a parent order may take
+DEFAULT_SLICE_INTERVAL = 60.0
+DEFAULT_PARTICIPATION_CAP = 0.1
+DEFAULT_DEPTH_BAND = 0.01  # depth is counted within this distance of the touch
+DEFAULT_PROFILE_DAYS = 7  # history of 5 minute bars behind the volume rate and profile
+PROFILE_PERIOD = 300
+MIN_CHILD_TOTAL = 0.0001  # smallest order total the exchange accepts, in home currency
+
+
+# [(rate, amount)] of the book side an order takes from, best first
+def book_levels(book, order_type):
+    levels = [(float(rate), float(amount)) for rate, amount in book['asks' if order_type == 'BUY' else 'bids']]
+    return sorted(levels, reverse=(order_type == 'SELL'))
+
+
+# levels within band of the touch
+def levels_within(levels, band):
+    if len(levels) == 0:
+        return levels
+    touch = levels[0][0]
+    return [(rate, amount) for rate, amount in levels if abs(rate - touch) <= touch * band]
+
+
+# rate of the level that covers amount, or the last level's if none does
+def covering_rate(levels, amount):
+    depth = 0.0
+    for rate, level_amount in levels:
+        depth += level_amount
+        if depth >= amount:
+            return rate
+    return levels[-1][0]
+
+
+# share of the parent order to trade in each slice
+# style 'twap': equal, 'vwap': the mean volume of the slice's time of day over the profile bars
+def slice_weights(style, n_slices, start, slice_interval, bar_dates=None, bar_volumes=None):
+    weights = np.ones(n_slices)
+    if style == 'vwap' and bar_dates is not None and len(bar_dates) > 0:
+        times_of_day = (np.asarray(bar_dates) % 86400) // PROFILE_PERIOD
+        profile = np.bincount(times_of_day, weights=bar_volumes, minlength=86400 // PROFILE_PERIOD) / \
+            np.maximum(np.bincount(times_of_day, minlength=86400 // PROFILE_PERIOD), 1)
+        slice_times = ((start + slice_interval * np.arange(n_slices)) % 86400 // PROFILE_PERIOD).astype(int)
+        if profile[slice_times].sum() > 0:
+            weights = profile[slice_times]
+    return weights / weights.sum()
+
+
+class executionScheduler(executionEngine):
+    def __init__(self, client, style='twap', horizon=DEFAULT_HORIZON, slice_interval=DEFAULT_SLICE_INTERVAL,
+                 participation_cap=DEFAULT_PARTICIPATION_CAP, depth_band=DEFAULT_DEPTH_BAND,
+                 profile_days=DEFAULT_PROFILE_DAYS, complete_at_horizon=True, **engine_settings):
+        if style not in SCHEDULE_STYLES:
+            raise ValueError('schedule style not valid!')
+        executionEngine.__init__(self, client, **engine_settings)
+        self.style = style
+        self.horizon = horizon
+        self.slice_interval = slice_interval
+        self.participation_cap = participation_cap
+        self.depth_band = depth_band
+        self.profile_days = profile_days
+        self.complete_at_horizon = complete_at_horizon
+
+    # (5 minute bar dates, traded amounts in the pair's foreign currency) over the profile days
+    async def _volume_history(self, pair):
+        end = int(time.time())
+        bars = await self._call('returnChartData', currencyPair=pair, start=end - int(self.profile_days * 86400),
+                                end=end, period=PROFILE_PERIOD)
+        bars = [bar for bar in bars if bar['date'] > 0] if isinstance(bars, list) else []
+        return (np.array([bar['date'] for bar in bars], dtype=np.int64),
+                np.array([float(bar['quoteVolume']) for bar in bars]))
+
+    # slices needed to trade amount at the participation cap of the traded volume rate, within the horizon
+    def _number_of_slices(self, amount, bar_volumes):
+        max_slices = max(int(self.horizon // self.slice_interval), 1)
+        rate = bar_volumes.mean() / PROFILE_PERIOD if len(bar_volumes) > 0 else 0.0
+        if rate <= 0:
+            return max_slices
+        return min(max(int(math.ceil(amount / (self.participation_cap * rate * self.slice_interval))), 1),
+                   max_slices)
+
+    async def _execute_order(self, order):
+        result, _ = await self._new_result(order)
+        if result['status'] == 'frozen':
+            return result
+        pair, order_type, amount = result['pair'], result['type'], result['amount']
+
+        start = time.time()
+        bar_dates, bar_volumes = await self._volume_history(pair)
+        n_slices = self._number_of_slices(amount, bar_volumes)
+        targets = amount * np.cumsum(slice_weights(self.style, n_slices, start, self.slice_interval,
+                                                   bar_dates, bar_volumes))
+        self._log(pair + ' ' + order_type + ' ' + str(amount) + ' in ' + str(n_slices) + ' ' + self.style +
+                  ' slice(s)', pair=pair, slices=n_slices)
+
+        slice_start = time.monotonic()
+        for k in range(n_slices):
+            remaining = amount - result['filled']
+            if remaining <= amount * FILL_TOLERANCE:
+                break
+            last = k == n_slices - 1
+            deadline = slice_start + self.slice_interval
+
+            # what the schedule is behind by, capped at a share of the depth near the touch
+            book = await self._call('returnOrderBook', currencyPair=pair)
+            levels = levels_within(book_levels(book, order_type), self.depth_band) if 'error' not in book else []
+            child = min(targets[k] - result['filled'], remaining)
+            if last and self.complete_at_horizon:
+                child = remaining
+            elif len(levels) > 0:
+                child = min(child, self.participation_cap * sum(level_amount for _, level_amount in levels))
+
+            if len(levels) > 0 and child > 0:
+                rate = covering_rate(levels, child)
+                if rate * child >= MIN_CHILD_TOTAL or last:
+                    placed = time.perf_counter()
+                    output = await self._call(order_type.lower(), currencyPair=pair, rate=rate, amount=child)
+                    latency = time.perf_counter() - placed
+                    result['attempts'] += 1
+                    description = order_type + ' ' + pair + ' at ' + str(rate) + ', amount = ' + str(child)
+                    if 'error' in output.keys():
+                        self._log('Order error: ' + output['error'], pair=pair, latency=latency)
+                        self._log('...failed to place order: ' + description, pair=pair)
+                    else:
+                        order_number = str(output['orderNumber'])
+                        result['order numbers'].append(order_number)
+                        self._log('Slice #' + str(k + 1) + ', order placed #' + order_number + ': ' + description,
+                                  order_number=order_number, pair=pair, side=order_type, rate=rate, amount=child,
+                                  slice=k + 1, latency=latency)
+                        filled = await self._watch_order(pair, order_number, child, deadline,
+                                                         filled=trades_amount(output.get('resultingTrades', [])))
+                        if filled > 0:
+                            instrumentation.event(instrumentation.FILL_EVENT, pair=pair, order_number=order_number,
+                                                  amount=filled)
+                        result['filled'] += filled
+
+            # next slice starts on schedule, however early this one finished
+            if not last:
+                await asyncio.sleep(max(deadline - time.monotonic(), 0.0))
+            slice_start = deadline
+
+        if amount - result['filled'] <= amount * FILL_TOLERANCE:
+            result['status'] = 'filled'
+            self._log('...' + pair + ' ' + order_type + ' filled', pair=pair)
+        return result
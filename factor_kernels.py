@@ -0,0 +1,125 @@
+import numpy as np
+
+# batched numerical kernels for factor construction
+# each kernel sweeps the data once for any number of series and horizons stacked side by side
+
+
+# ewm(com=com, min_periods=minp, adjust=True, ignore_na=False).mean() for every column of a T x K array,
+# each column with its own com and min_periods, in one pass over time. the update is the same recurrence
+# pandas uses, so results match pandas exactly. state carries the recursion between calls, so a series
+# can be extended without revisiting old rows.
+def ewma_means(values, coms, min_periods, state=None):
+    values = np.asarray(values, dtype=np.float64)
+    n_rows, n_cols = values.shape
+    decay = 1.0 - 1.0 / (1.0 + np.broadcast_to(np.asarray(coms, dtype=np.float64), (n_cols,)))
+    min_periods = np.maximum(np.broadcast_to(np.asarray(min_periods), (n_cols,)), 1)
+
+    if state is None:
+        weighted = np.full(n_cols, np.nan)
+        old_wt = np.ones(n_cols)
+        nobs = np.zeros(n_cols, dtype=np.int64)
+    else:
+        weighted = state['weighted'].copy()
+        old_wt = state['old_wt'].copy()
+        nobs = state['nobs'].copy()
+
+    out = np.empty((n_rows, n_cols))
+    with np.errstate(invalid='ignore'):
+        for t in range(n_rows):
+            cur = values[t]
+            is_observation = cur == cur
+            nobs += is_observation
+            started = weighted == weighted
+            old_wt = np.where(started, old_wt * decay, old_wt)
+            update = started & is_observation
+            blended = (old_wt * weighted + cur) / (old_wt + 1.0)
+            weighted = np.where(update & (weighted != cur), blended, weighted)
+            old_wt = np.where(update, old_wt + 1.0, old_wt)
+            weighted = np.where(~started & is_observation, cur, weighted)
+            out[t] = np.where(nobs >= min_periods, weighted, np.nan)
+
+    return out, {'weighted': weighted, 'old_wt': old_wt, 'nobs': nobs}
+
+
+# sum of the last window rows ending at every row (fewer at the start), for every column of a T x K array.
+# rows are cut into blocks of window rows; a window covers the tail of one block and the head of the next,
+# so its sum is a within-block suffix sum plus a within-block prefix sum. only terms inside the window are
+# ever added and nothing is subtracted, so a large value cannot leave round-off behind once it has left
+# the window, as differences of running sums over the whole history do
+def window_sums(terms, window):
+    n_rows = terms.shape[0]
+    n_blocks = -(-n_rows // window)
+    blocks = np.zeros((n_blocks * window,) + terms.shape[1:])
+    blocks[:n_rows] = terms
+    blocks = blocks.reshape((n_blocks, window) + terms.shape[1:])
+    prefix = np.cumsum(blocks, axis=1).reshape((-1,) + terms.shape[1:])[:n_rows]
+    suffix = np.cumsum(blocks[:, ::-1], axis=1)[:, ::-1].reshape((-1,) + terms.shape[1:])[:n_rows]
+
+    sums = prefix.copy()
+    starts = np.arange(max(n_rows - window + 1, 0))
+    straddles = starts % window != 0  # windows that are not exactly one block
+    sums[starts[straddles] + window - 1] += suffix[starts[straddles]]
+    return sums
+
+
+# rolling nobs, raw power sums and central moment sums for several windows from one sweep over the data.
+# every window sum only adds the terms inside the window (see window_sums). central moments come from sums
+# of values shifted by their column mean, so they never difference large raw sums
+def rolling_moments(values, windows):
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    with np.errstate(invalid='ignore'):
+        shift = np.where(valid.any(0), np.nanmean(np.where(valid, values, np.nan), axis=0), 0.0)
+    x = np.where(valid, values, 0.0)
+    y = np.where(valid, values - shift, 0.0)
+    # nobs, shifted power sums 1-3 and raw power sums 1-4, stacked so each window is one window_sums call
+    terms = np.stack([valid.astype(np.float64), y, y ** 2, y ** 3, x, x ** 2, x ** 3, x ** 4], axis=1)
+
+    moments = {}
+    for window in windows:
+        nobs, s1, s2, s3, sum1, sum2, sum3, sum4 = np.moveaxis(window_sums(terms, window), 1, 0)
+        nobs = np.rint(nobs)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = s1 / nobs
+        mean = np.where(nobs > 0, mean, np.nan)
+        centered_mean = np.where(nobs > 0, mean, 0.0)
+        moments[window] = {
+            'nobs': nobs,
+            'mean': mean + shift,
+            # central moment sums
+            'm2': np.maximum(s2 - nobs * centered_mean ** 2, 0.0),
+            'm3': s3 - 3 * centered_mean * s2 + 2 * nobs * centered_mean ** 3,
+            # raw power sums of the original values
+            'sum1': sum1,
+            'sum2': sum2,
+            'sum3': sum3,
+            'sum4': sum4
+        }
+    return moments
+
+
+# rolling(window, min_periods).std(), ddof = 1
+def moments_std(moments, min_periods):
+    nobs = moments['nobs']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(moments['m2'] / (nobs - 1))
+    return np.where((nobs >= max(min_periods, 1)) & (nobs > 1), std, np.nan)
+
+
+# rolling(window, min_periods).skew(), the bias-adjusted sample skewness
+def moments_skew(moments, min_periods):
+    nobs = moments['nobs']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = moments['m2'] / nobs
+        c = moments['m3'] / nobs
+        skew = np.sqrt(nobs * (nobs - 1)) * c / ((nobs - 2) * b ** 1.5)
+    return np.where((nobs >= max(min_periods, 3)) & (b > 1e-14), skew, np.nan)
+
+
+# (m3 - m4 / m2 * m1) / m2 ** 1.5 on rolling raw power sums
+def moments_adjusted_skew(moments, min_periods):
+    nobs = moments['nobs']
+    sums = [np.where(nobs >= max(min_periods, 0), moments['sum' + str(k)], np.nan) for k in range(1, 5)]
+    m1, m2, m3, m4 = sums
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (m3 - m4 / m2 * m1) / m2 ** 1.5
@@ -0,0 +1,210 @@
+import bisect
+import contextlib
+import functools
+import json
+import threading
+import time
+
+# stage timings, exchange api latencies and the rebalance timeline
+# disabled by default: span() hands back a shared no-op context and the record functions return at once, so
+# the hooks in the pipeline and the api client cost one global lookup. enable() starts collecting into an
+# instrumentation object, which writes everything as json or in the prometheus text format
+#   enable(); tb.rebalance(); current().write_json('metrics.json'); current().write_prometheus('metrics.prom')
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = 'cryptotrading_'
+SNAP_EVENT = 'snap'
+FILL_EVENT = 'fill'
+
+_null_span = contextlib.nullcontext()
+_current = None
+
+
+class instrumentation():
+    def __init__(self, latency_buckets=DEFAULT_LATENCY_BUCKETS):
+        self.latency_buckets = tuple(latency_buckets)
+        self.lock = threading.Lock()
+        self.spans = []  # finished spans in the order they ended
+        self.api = {}  # endpoint -> latency histogram, retries and errors
+        self.timeline = []  # rebalance events in the order they happened
+        self._local = threading.local()  # open spans of the current thread
+
+    @contextlib.contextmanager
+    def span(self, name, **labels):
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if len(stack) > 0 else None
+        stack.append(name)
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            with self.lock:
+                self.spans.append({'name': name, 'parent': parent, 'depth': len(stack), 'start': started,
+                                   'seconds': seconds, 'labels': labels})
+
+    # one api call: its total latency across attempts, the retries it needed and whether it failed
+    def record_api_call(self, endpoint, seconds, retries=0, error=False):
+        with self.lock:
+            stats = self.api.get(endpoint)
+            if stats is None:
+                stats = {'buckets': [0] * len(self.latency_buckets), 'count': 0, 'sum': 0.0, 'max': 0.0,
+                         'retries': 0, 'errors': 0}
+                self.api[endpoint] = stats
+            k = bisect.bisect_left(self.latency_buckets, seconds)
+            if k < len(self.latency_buckets):
+                stats['buckets'][k] += 1
+            stats['count'] += 1
+            stats['sum'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['retries'] += retries
+            stats['errors'] += int(error)
+
+    def event(self, name, timestamp=None, **fields):
+        with self.lock:
+            self.timeline.append(dict(fields, event=name, timestamp=time.time() if timestamp is None else timestamp))
+
+    # {stage: count, total and max seconds} over the finished spans
+    def stage_summary(self):
+        summary = {}
+        with self.lock:
+            for span in self.spans:
+                stats = summary.setdefault(span['name'], {'count': 0, 'total seconds': 0.0, 'max seconds': 0.0})
+                stats['count'] += 1
+                stats['total seconds'] += span['seconds']
+                stats['max seconds'] = max(stats['max seconds'], span['seconds'])
+        return summary
+
+    # seconds from the last snap event to the last fill after it, None without both
+    def rebalance_seconds(self):
+        with self.lock:
+            snaps = [event['timestamp'] for event in self.timeline if event['event'] == SNAP_EVENT]
+            if len(snaps) == 0:
+                return None
+            fills = [event['timestamp'] for event in self.timeline
+                     if event['event'] == FILL_EVENT and event['timestamp'] >= snaps[-1]]
+        return max(fills) - snaps[-1] if len(fills) > 0 else None
+
+    def to_dict(self):
+        summary = self.stage_summary()
+        rebalance_seconds = self.rebalance_seconds()
+        with self.lock:
+            return {
+                'stages': summary,
+                'spans': [dict(span) for span in self.spans],
+                'api': {endpoint: dict(stats, buckets=dict(zip([str(b) for b in self.latency_buckets],
+                                                               stats['buckets'])))
+                        for endpoint, stats in self.api.items()},
+                'timeline': [dict(event) for event in self.timeline],
+                'rebalance seconds': rebalance_seconds
+            }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+
+    def to_prometheus(self):
+        summary = self.stage_summary()
+        rebalance_seconds = self.rebalance_seconds()
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append('# HELP ' + METRIC_PREFIX + name + ' ' + help_text)
+            lines.append('# TYPE ' + METRIC_PREFIX + name + ' ' + kind)
+
+        def sample(name, labels, value):
+            label_text = ','.join(key + '="' + str(label).replace('\\', '\\\\').replace('"', '\\"') + '"'
+                                  for key, label in labels)
+            lines.append(METRIC_PREFIX + name + ('{' + label_text + '}' if label_text else '') + ' ' + repr(value))
+
+        metric('stage_seconds', 'summary', 'Wall time of pipeline stages')
+        for stage, stats in sorted(summary.items()):
+            sample('stage_seconds_sum', [('stage', stage)], stats['total seconds'])
+            sample('stage_seconds_count', [('stage', stage)], stats['count'])
+
+        with self.lock:
+            api = {endpoint: dict(stats) for endpoint, stats in self.api.items()}
+            timeline = [dict(event) for event in self.timeline]
+
+        metric('api_latency_seconds', 'histogram', 'Exchange api call latency, retries included')
+        for endpoint, stats in sorted(api.items()):
+            cumulative = 0
+            for bound, count in zip(self.latency_buckets, stats['buckets']):
+                cumulative += count
+                sample('api_latency_seconds_bucket', [('endpoint', endpoint), ('le', repr(float(bound)))],
+                       cumulative)
+            sample('api_latency_seconds_bucket', [('endpoint', endpoint), ('le', '+Inf')], stats['count'])
+            sample('api_latency_seconds_sum', [('endpoint', endpoint)], stats['sum'])
+            sample('api_latency_seconds_count', [('endpoint', endpoint)], stats['count'])
+        metric('api_retries_total', 'counter', 'Exchange api retries')
+        for endpoint, stats in sorted(api.items()):
+            sample('api_retries_total', [('endpoint', endpoint)], stats['retries'])
+        metric('api_errors_total', 'counter', 'Exchange api calls that failed')
+        for endpoint, stats in sorted(api.items()):
+            sample('api_errors_total', [('endpoint', endpoint)], stats['errors'])
+
+        metric('rebalance_event_timestamp_seconds', 'gauge', 'Unix time of the last rebalance event of each kind')
+        last_events = {}
+        for event in timeline:
+            last_events[event['event']] = event['timestamp']
+        for name, timestamp in sorted(last_events.items()):
+            sample('rebalance_event_timestamp_seconds', [('event', name)], float(timestamp))
+        if rebalance_seconds is not None:
+            metric('rebalance_seconds', 'gauge', 'Seconds from the snap to the last fill of the last rebalance')
+            sample('rebalance_seconds', [], rebalance_seconds)
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        with open(path, 'w') as f:
+            f.write(self.to_prometheus())
+
+
+def enable(latency_buckets=DEFAULT_LATENCY_BUCKETS):
+    global _current
+    _current = instrumentation(latency_buckets=latency_buckets)
+    return _current
+
+
+def disable():
+    global _current
+    _current = None
+
+
+# the collecting instrumentation, None while disabled
+def current():
+    return _current
+
+
+def span(name, **labels):
+    if _current is None:
+        return _null_span
+    return _current.span(name, **labels)
+
+
+# times every call of the decorated function as a span (named after the function by default)
+def timed(name=None):
+    def decorator(function):
+        span_name = function.__name__ if name is None else name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _current is None:
+                return function(*args, **kwargs)
+            with _current.span(span_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_api_call(endpoint, seconds, retries=0, error=False):
+    if _current is not None:
+        _current.record_api_call(endpoint, seconds, retries=retries, error=error)
+
+
+def event(name, timestamp=None, **fields):
+    if _current is not None:
+        _current.event(name, timestamp=timestamp, **fields)
@@ -1,17 +1,146 @@
-import logging
+import atexit
+import copy
 import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+# non-blocking logging
+# nothing is opened at import. the first record logged (or an explicit configure_logging call) sets up a
+# QueueHandler on the logger and a QueueListener thread that does the formatting and the writing, so a slow
+# disk never holds up the thread that logs. records go to a size-rotated file (or time-rotated, see when)
+# and the console, as text or as json lines; extra={...} fields such as order numbers, pairs and latencies
+# become json fields:
+#   logger.info('Order placed', extra={'order_number': '123', 'pair': 'BTC_LTC', 'latency': 0.12})
+
+LOGGER_NAME = 'cryptotrading logger'
+LOG_DIR_ENV = 'CRYPTOTRADING_LOG_DIR'
+DEFAULT_LOG_DIR = os.path.join(os.path.expanduser('~'), 'traderBot_log')
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 10
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 
-logger = logging.getLogger('cryptotrading logger')
+# attributes every LogRecord has; anything else on a record came in through extra
+_RECORD_ATTRIBUTES = set(logging.LogRecord('', 0, '', 0, '', None, None).__dict__.keys()) | {'message', 'asctime'}
+
+logger = logging.getLogger(LOGGER_NAME)
 logger.setLevel(logging.DEBUG)
-file_path = 'h:\\traderBot_log\\' + datetime.date.today().strftime('%Y-%m-%d.log')
-fh = logging.FileHandler(file_path)
-fh.setLevel(logging.DEBUG)
-ch = logging.StreamHandler()
-ch.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-fh.setFormatter(formatter)
-ch.setFormatter(formatter)
-logger.addHandler(fh)
-logger.addHandler(ch)
-
-logger.info('logger initiated')
\ No newline at end of file
+logger.propagate = False
+
+_lock = threading.RLock()
+_queue = None
+_listener = None
+_log_path = None
+
+
+# one json object per record: time, level, logger, message, the extra fields and any exception
+class jsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update({key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# QueueHandler formats a record into its message before queueing it, folding the traceback into the text;
+# within one process the record can go as it is, so the listener's formatters still see exc_info
+class _queueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+
+# routes records to configure_logging's defaults the first time anything is logged
+class _lazyConfigHandler(logging.Handler):
+    def emit(self, record):
+        configure_logging()
+        logger.handle(record)
+
+
+_lazy_handler = _lazyConfigHandler()
+logger.addHandler(_lazy_handler)
+
+
+# starts the queue listener; later calls return the current log file without reconfiguring unless force
+# log_dir: defaults to $CRYPTOTRADING_LOG_DIR, then ~/traderBot_log. the file is named after today's date
+# json_lines: json records in the file (.jsonl) instead of text. when: rotate on time ('midnight', 'H', ...)
+# instead of on max_bytes
+def configure_logging(log_dir=None, json_lines=False, level=logging.DEBUG, max_bytes=DEFAULT_MAX_BYTES,
+                      backup_count=DEFAULT_BACKUP_COUNT, when=None, console=True, force=False):
+    global _queue, _listener, _log_path
+    with _lock:
+        if _listener is not None and not force:
+            return _log_path
+        shutdown_logging()
+
+        log_dir = log_dir or os.environ.get(LOG_DIR_ENV, DEFAULT_LOG_DIR)
+        os.makedirs(log_dir, exist_ok=True)
+        log_path = os.path.join(log_dir, datetime.date.today().strftime('%Y-%m-%d') +
+                                ('.jsonl' if json_lines else '.log'))
+        if when is None:
+            file_handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=max_bytes,
+                                                                backupCount=backup_count)
+        else:
+            file_handler = logging.handlers.TimedRotatingFileHandler(log_path, when=when, backupCount=backup_count)
+        file_handler.setFormatter(jsonFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+        handlers = [file_handler]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+            handlers.append(console_handler)
+        for handler in handlers:
+            handler.setLevel(level)
+
+        _queue = queue.Queue()
+        _listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        logger.removeHandler(_lazy_handler)
+        logger.addHandler(_queueHandler(_queue))
+        _log_path = log_path
+        logger.info('logger initiated')
+        return log_path
+
+
+# the file being logged to, None before logging is configured
+def get_log_path():
+    return _log_path
+
+
+# blocks until every record logged so far has been written
+def flush_logging():
+    if _queue is not None:
+        _queue.join()
+    if _listener is not None:
+        for handler in _listener.handlers:
+            handler.flush()
+
+
+# writes what is queued, stops the listener and closes the files; the next record configures logging again
+def shutdown_logging():
+    global _queue, _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        for handler in list(logger.handlers):
+            if isinstance(handler, logging.handlers.QueueHandler):
+                logger.removeHandler(handler)
+        if _lazy_handler not in logger.handlers:
+            logger.addHandler(_lazy_handler)
+        _queue = None
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,208 @@
+import collections
+import json
+import queue
+import random
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from cryptotrading.bar_decoder import epoch_to_index
+from cryptotrading.market_snapshot import marketSnapshot
+
+# push-based market data
+# a marketFeed consumes ticker and trade messages from a transport on a background thread and keeps the
+# latest quotes and a rolling window of bars per pair in memory, so current prices and the newest bars are
+# read without a request. messages are dicts:
+#   {'type': 'ticker', 'pair', 'date', 'last', 'lowestAsk', 'highestBid', 'isFrozen'}
+#   {'type': 'trade', 'pair', 'date', 'rate', 'amount'}
+# a transport is anything with messages() (a blocking iterator of messages) and close(): queueTransport for
+# in-process producers and tests, httpStreamTransport for a json lines stream such as the stand-in's /stream
+
+DEFAULT_MAX_BARS = 2000
+DEFAULT_RECONNECT_BACKOFF = 1.0
+DEFAULT_MAX_RECONNECT_BACKOFF = 30.0
+BAR_COLUMNS = ['high', 'low', 'open', 'close', 'volume', 'quoteVolume', 'weightedAverage']
+TICKER_FIELDS = ['last', 'lowestAsk', 'highestBid', 'isFrozen']
+
+
+# rolling OHLCV bars per pair built from price ticks and trades, in returnChartData's columns:
+# volume in the home currency, quoteVolume in the foreign one
+class barBuilder:
+    def __init__(self, period, max_bars=DEFAULT_MAX_BARS):
+        self.period = period
+        self.max_bars = max_bars
+        self._bars = {}  # pair -> deque of [date, high, low, open, close, volume, quoteVolume]
+        self.version = 0  # bumped whenever a bar closes, i.e. a pair rolls into a new bar; ticks leave it
+
+    def __contains__(self, pair):
+        return pair in self._bars
+
+    # a quote tick moves high/low/close; a trade (amount > 0) also adds volume
+    def update(self, pair, timestamp, price, amount=0.0):
+        date = int(timestamp) // self.period * self.period
+        bars = self._bars.setdefault(pair, collections.deque(maxlen=self.max_bars))
+        if len(bars) > 0 and date < bars[-1][0]:
+            return  # late message for a bar already rolled past
+        if len(bars) == 0 or date > bars[-1][0]:
+            # flat bars at the last close for periods without ticks, as the exchange's chart data has
+            if len(bars) > 0:
+                close = bars[-1][4]
+                for gap in range(bars[-1][0] + self.period, date, self.period)[-self.max_bars:]:
+                    bars.append([gap, close, close, close, close, 0.0, 0.0])
+                self.version += 1
+            bars.append([date, price, price, price, price, 0.0, 0.0])
+        bar = bars[-1]
+        bar[1] = max(bar[1], price)
+        bar[2] = min(bar[2], price)
+        bar[4] = price
+        bar[5] += price * amount
+        bar[6] += amount
+
+    # (unix times, {column: array}) of a pair's bars since start; closed=True leaves out the forming bar
+    def arrays(self, pair, start=0, dtype=np.float64, closed=False):
+        bars = list(self._bars.get(pair, []))
+        bars = np.array([bar for bar in (bars[:-1] if closed else bars) if bar[0] >= start], dtype=np.float64)
+        if len(bars) == 0:
+            return np.empty(0, dtype=np.int64), {column: np.empty(0, dtype=dtype) for column in BAR_COLUMNS}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weighted_average = np.where(bars[:, 6] > 0, bars[:, 5] / bars[:, 6], bars[:, 4])
+        columns = dict(zip(BAR_COLUMNS[:-1], bars[:, 1:].T.astype(dtype)))
+        columns['weightedAverage'] = weighted_average.astype(dtype)
+        return bars[:, 0].astype(np.int64), columns
+
+    def frame(self, pair, start=0, tz='UTC', dtype=np.float64, closed=False):
+        times, columns = self.arrays(pair, start=start, dtype=dtype, closed=closed)
+        return pd.DataFrame(columns, index=epoch_to_index(times, tz=tz), columns=BAR_COLUMNS)
+
+
+# in-process transport; producers publish() messages, close() ends the stream
+class queueTransport:
+    _closed = object()
+
+    def __init__(self):
+        self.queue = queue.Queue()
+
+    def publish(self, message):
+        self.queue.put(message)
+
+    def messages(self):
+        while True:
+            message = self.queue.get()
+            if message is self._closed:
+                return
+            yield message
+
+    def close(self):
+        self.queue.put(self._closed)
+
+
+# json lines over a long-lived HTTP response, reconnecting with jittered exponential backoff
+class httpStreamTransport:
+    def __init__(self, url, timeout=(3.05, 60.0), backoff=DEFAULT_RECONNECT_BACKOFF,
+                 max_backoff=DEFAULT_MAX_RECONNECT_BACKOFF):
+        self.url = url
+        self.timeout = timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        self.response = None
+        self.closed = False
+
+    def messages(self):
+        attempt = 0
+        while not self.closed:
+            try:
+                self.response = self.session.get(self.url, stream=True, timeout=self.timeout)
+                attempt = 0
+                for line in self.response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+            except (requests.RequestException, AttributeError, OSError):
+                # AttributeError / OSError: the response was closed under iter_lines by close()
+                if self.closed:
+                    return
+            if not self.closed:
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                attempt += 1
+
+    def close(self):
+        self.closed = True
+        if self.response is not None:
+            self.response.close()
+        self.session.close()
+
+
+class marketFeed:
+    def __init__(self, transport, period=300, max_bars=DEFAULT_MAX_BARS, initial_ticker=None):
+        # period: bar length in seconds; initial_ticker: a returnTicker payload seeding the quotes, so every
+        # listed pair is known before its first message
+        self.transport = transport
+        self.period = period
+        self.builder = barBuilder(period, max_bars=max_bars)
+        self.lock = threading.Lock()
+        self.updated = threading.Condition(self.lock)
+        self.quotes = {pair: dict(info) for pair, info in (initial_ticker or {}).items()}
+        self.version = 0  # bumped on every message; bar_version only moves when a bar closes
+        self.last_message_time = None
+        self.thread = None
+        # ticker view with the market_snapshot interface, for dataBot and the execution path
+        self.snapshot = marketSnapshot(self, ttl=0.0)
+
+    def handle(self, message):
+        pair = message['pair']
+        with self.lock:
+            if message['type'] == 'ticker':
+                quote = self.quotes.setdefault(pair, {'isFrozen': '0'})
+                quote.update({field: message[field] for field in TICKER_FIELDS if field in message})
+                self.builder.update(pair, message['date'], float(message['last']))
+            elif message['type'] == 'trade':
+                quote = self.quotes.setdefault(pair, {'isFrozen': '0'})
+                quote['last'] = str(message['rate'])
+                self.builder.update(pair, message['date'], float(message['rate']), float(message['amount']))
+            self.version += 1
+            self.last_message_time = time.time()
+            self.updated.notify_all()
+
+    def run(self):
+        for message in self.transport.messages():
+            self.handle(message)
+
+    # consumes the transport on a background thread
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.transport.close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # blocks until the feed has moved past version (or timeout); returns the current version
+    def wait(self, version=None, timeout=None):
+        with self.lock:
+            version = self.version if version is None else version
+            self.updated.wait_for(lambda: self.version > version, timeout=timeout)
+            return self.version
+
+    # current quotes in returnTicker's format
+    def returnTicker(self):
+        with self.lock:
+            return {pair: dict(quote) for pair, quote in self.quotes.items()}
+
+    def has_bars(self, pair):
+        return pair in self.builder
+
+    @property
+    def bar_version(self):
+        with self.lock:
+            return self.builder.version
+
+    # a pair's live bars since start, as a dataBot bars frame; closed=True leaves out the forming bar
+    def bars(self, pair, start=0, tz='UTC', dtype=np.float64, closed=False):
+        with self.lock:
+            return self.builder.frame(pair, start=start, tz=tz, dtype=dtype, closed=closed)
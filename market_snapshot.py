@@ -0,0 +1,101 @@
+import threading
+import time
+
+# shared market snapshot
+# one ticker fetch serves every caller until it is ttl seconds old: pair resolution and quotes in execution,
+# current prices in dataBot and the traded pair universe. concurrent callers of a stale snapshot wait for a
+# single refetch instead of each fetching. the pair index (currency pair -> ticker and direction) is built
+# from the ticker keys and only rebuilt when the listed pairs change
+
+DEFAULT_TTL = 5.0  # seconds
+
+
+# ticker pairs indexed by their two currencies, in either order
+class pairIndex:
+    def __init__(self, pairs):
+        self.pairs = list(pairs)
+        self.pair_set = set(self.pairs)
+        self.currencies = sorted({pair.split('_')[0] for pair in self.pairs} |
+                                 {pair.split('_')[1] for pair in self.pairs})
+        # (currency, currency) -> (ticker, domestic, foreign); a ticker is domestic_foreign
+        self.index = {}
+        for pair in self.pairs:
+            domestic, foreign = pair.split('_')
+            self.index[(domestic, foreign)] = (pair, domestic, foreign)
+            self.index.setdefault((foreign, domestic), (pair, domestic, foreign))
+
+    def __contains__(self, pair):
+        return pair in self.pair_set
+
+    def __len__(self):
+        return len(self.pairs)
+
+    # (ticker, domestic, foreign) of the pair trading currency_a against currency_b
+    def resolve(self, currency_a, currency_b):
+        if (currency_a, currency_b) not in self.index:
+            raise ValueError(currency_a + '/' + currency_b + ' is not traded!')
+        return self.index[(currency_a, currency_b)]
+
+
+class marketSnapshot:
+    def __init__(self, client, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.client = client
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.fetched_at = None
+        self.fetches = 0
+        self._ticker = None
+        self._pair_index = None
+
+    def is_fresh(self, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        return self.fetched_at is not None and self.clock() - self.fetched_at < max_age
+
+    # the ticker, refetched if older than max_age (default ttl)
+    def ticker(self, max_age=None):
+        if self.is_fresh(max_age):
+            return self._ticker
+        with self.lock:
+            # another caller may have refetched while we waited
+            if not self.is_fresh(max_age):
+                ticker = self.client.returnTicker()
+                if self._pair_index is None or set(ticker.keys()) != self._pair_index.pair_set:
+                    self._pair_index = pairIndex(ticker.keys())
+                self._ticker = ticker
+                self.fetched_at = self.clock()
+                self.fetches += 1
+            return self._ticker
+
+    # the listed pairs change rarely; any fetched snapshot will do
+    def pair_index(self):
+        if self._pair_index is None:
+            self.ticker()
+        return self._pair_index
+
+    # (bid, ask) of a ticker
+    def quote(self, pair, max_age=None):
+        info = self.ticker(max_age)[pair]
+        return float(info['highestBid']), float(info['lowestAsk'])
+
+    def invalidate(self):
+        with self.lock:
+            self.fetched_at = None
+
+
+SNAPSHOT_ATTRIBUTE = '_market_snapshot'
+_shared_snapshots_lock = threading.Lock()
+
+
+# the one snapshot of a client, shared by everything that trades or prices through it; it is kept on the
+# client, so it goes when the client does. ttl: that of a new snapshot (DEFAULT_TTL by default); asking for
+# another ttl than the shared snapshot has is an error
+def shared_snapshot(client, ttl=None):
+    with _shared_snapshots_lock:
+        snapshot = vars(client).get(SNAPSHOT_ATTRIBUTE)
+        if snapshot is None:
+            snapshot = marketSnapshot(client, ttl=DEFAULT_TTL if ttl is None else ttl)
+            setattr(client, SNAPSHOT_ATTRIBUTE, snapshot)
+        elif ttl is not None and ttl != snapshot.ttl:
+            raise ValueError('client already shares a snapshot with ttl ' + str(snapshot.ttl) + '!')
+        return snapshot
@@ -0,0 +1,145 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cryptotrading.backtest import view_turnover, lag_views
+from cryptotrading.portfolio import build_port_views
+from cryptotrading.rolling_cov import create_shared_array, attach_shared_array, release_shared_arrays
+
+# factor-weight search
+# the per-factor views, the risk model and the rebalance-period returns are computed once and placed in
+# shared memory; worker processes attach to them and evaluate chunks of candidate weight vectors:
+# PORT construction, vol targeting and the backtest are all batched over the candidates of a chunk.
+# every candidate is scored on walk-forward splits of the rebalance periods
+
+DEFAULT_CANDIDATE_CHUNK = 32
+METRICS = ['train net sharpe', 'test net sharpe', 'turnover', 'cost']
+
+
+# every weight vector on a simplex grid: non-negative multiples of step summing to one
+def simplex_weights(n_factors, step=0.1):
+    n_steps = int(round(1.0 / step))
+    grid = [combination for combination in itertools.product(range(n_steps + 1), repeat=n_factors - 1)
+            if sum(combination) <= n_steps]
+    return np.array([list(combination) + [n_steps - sum(combination)] for combination in grid]) / float(n_steps)
+
+
+def random_weights(n_factors, n_candidates, seed=None):
+    return np.random.RandomState(seed).dirichlet(np.ones(n_factors), size=n_candidates)
+
+
+# (train, test) period slices; the n_periods are cut into n_splits + 1 blocks and every block after the first
+# is tested on, after training on all earlier blocks (expanding) or only the block before it
+def walk_forward_splits(n_periods, n_splits, expanding=True):
+    edges = np.linspace(0, n_periods, n_splits + 2).astype(int)
+    return [(slice(0 if expanding else edges[k], edges[k + 1]), slice(edges[k + 1], edges[k + 2]))
+            for k in range(n_splits)]
+
+
+def _sharpe_ratios(returns, periods_per_year):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.nanmean(returns, axis=1) / np.nanstd(returns, axis=1, ddof=1) * periods_per_year ** 0.5
+
+
+# candidate x split x METRICS for a chunk of weight vectors
+def evaluate_weights(weights, inputs):
+    risk_model = inputs['risk model']
+    views = build_port_views(inputs['factor views'], weights,
+                             lambda views: risk_model.portfolio_variances(views, risk_model.dates),
+                             **inputs['port settings'])
+
+    # rebalance-period views, then net returns on the period grid
+    views = views[:, inputs['last rows']]
+    rows = inputs['rows']
+    returns = inputs['returns']
+    turnover = view_turnover(views, rows, len(returns))
+    gross = np.nansum(returns[None, :, :] * lag_views(views, rows, len(returns), inputs['lag']), axis=2)
+    net = (gross - turnover * inputs['tcost'])[:, rows]
+    turnover = turnover[:, rows]
+
+    metrics = np.empty((len(weights), len(inputs['splits']), len(METRICS)))
+    with np.errstate(invalid='ignore'):
+        for k, (train, test) in enumerate(inputs['splits']):
+            metrics[:, k, 0] = _sharpe_ratios(net[:, train], inputs['periods per year'])
+            metrics[:, k, 1] = _sharpe_ratios(net[:, test], inputs['periods per year'])
+            metrics[:, k, 2] = np.nanmean(turnover[:, test], axis=1)
+            metrics[:, k, 3] = metrics[:, k, 2] * inputs['tcost']
+    return metrics
+
+
+_worker_state = {}
+
+
+def _init_optimizer_worker(array_specs, risk_model_template, settings):
+    shms, arrays = [], {}
+    for key, spec in array_specs.items():
+        shm, array = attach_shared_array(*spec)
+        shms.append(shm)
+        arrays[key] = array
+    risk_model = risk_model_template._from_arrays(
+        settings['dates'], [arrays['risk model ' + str(k)] for k in range(len(risk_model_template.arrays()))])
+    _worker_state.update(settings)
+    _worker_state.update({
+        'factor views': arrays['factor views'],
+        'returns': arrays['returns'],
+        'risk model': risk_model,
+        'shms': shms
+    })
+
+
+def _run_weights_chunk(weights):
+    return evaluate_weights(weights, _worker_state)
+
+
+# scores every candidate weight vector; returns one row per (candidate, split) with the candidate's weights
+# factor_views: factor x date x asset, risk_model: a risk_models model on the same dates and assets,
+# returns: rebalance period x asset returns, rows: the periods with views, last_rows: the date each of those
+# periods rebalances on. settings: port settings (home, risk_target, ...), lag, tcost, periods per year
+def search_factor_weights(factor_names, candidates, factor_views, risk_model, returns, rows, last_rows, splits,
+                          port_settings, lag=1, tcost=0.0025, periods_per_year=365, n_workers=None,
+                          chunk_size=DEFAULT_CANDIDATE_CHUNK):
+    n_workers = n_workers or os.cpu_count()
+    candidates = np.atleast_2d(np.asarray(candidates, dtype=np.float64))
+    # C order, like the shared copies the workers see, so serial and parallel runs agree bit for bit
+    factor_views = np.ascontiguousarray(factor_views, dtype=np.float64)
+    returns = np.ascontiguousarray(returns, dtype=np.float64)
+    chunks = [candidates[k:k + chunk_size] for k in range(0, len(candidates), chunk_size)]
+    settings = {
+        'dates': risk_model.dates,
+        'rows': np.asarray(rows),
+        'last rows': np.asarray(last_rows),
+        'splits': splits,
+        'port settings': port_settings,
+        'lag': lag,
+        'tcost': tcost,
+        'periods per year': periods_per_year
+    }
+
+    if n_workers <= 1 or len(chunks) <= 1:
+        inputs = dict(settings, **{'factor views': factor_views, 'returns': returns, 'risk model': risk_model})
+        metrics = [evaluate_weights(chunk, inputs) for chunk in chunks]
+    else:
+        arrays = {'factor views': factor_views, 'returns': returns}
+        arrays.update({'risk model ' + str(k): array for k, array in enumerate(risk_model.arrays())})
+        shms, array_specs = [], {}
+        try:
+            for key, array in arrays.items():
+                shm, shared = create_shared_array(array.shape)
+                shared[:] = array
+                shms.append(shm)
+                array_specs[key] = (shm.name, array.shape)
+                del shared
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(chunks)), initializer=_init_optimizer_worker,
+                                     initargs=(array_specs, risk_model.head(0), settings)) as executor:
+                metrics = list(executor.map(_run_weights_chunk, chunks))
+        finally:
+            release_shared_arrays(*shms)
+    metrics = np.concatenate(metrics)
+
+    index = pd.MultiIndex.from_product([range(len(candidates)), range(len(splits))], names=['candidate', 'split'])
+    results = pd.DataFrame(metrics.reshape(-1, len(METRICS)), index=index, columns=METRICS)
+    weights = pd.DataFrame(np.repeat(candidates, len(splits), axis=0), index=index, columns=factor_names)
+    return pd.concat([weights, results], axis=1)
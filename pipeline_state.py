@@ -0,0 +1,73 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# checkpointed pipeline state
+# a checkpoint holds the ewma states, the rolling-moment window buffer, the covariance engine sums and the
+# factor, covariance and view histories of the settled dates, i.e. all but the newest ones whose bars may
+# still be arriving. the next run resumes from there and only computes the dates after it.
+# a checkpoint is only reused by a pipeline with the same settings (fingerprint)
+
+PIPELINE_STATE_VERSION = 2
+
+
+# marks the first n rows of an index, so a later run can tell whether its index still starts the same way
+def index_marker(index, n):
+    return {
+        'length': n,
+        'first': index[0] if n > 0 else None,
+        'last': index[n - 1] if n > 0 else None
+    }
+
+
+# number of leading rows of index covered by a marker, None when the index no longer matches
+def resume_position(index, marker):
+    n = marker['length']
+    if n > len(index):
+        return None
+    if n > 0 and (index[0] != marker['first'] or index[n - 1] != marker['last']):
+        return None
+    return n
+
+
+def save_pipeline_state(path, fingerprint, state):
+    payload = {
+        'version': PIPELINE_STATE_VERSION,
+        'fingerprint': fingerprint,
+        'state': state
+    }
+    # write then rename, so an interrupted run never leaves a half-written checkpoint behind
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+# checkpointed state, or None when there is no checkpoint or it was written with different settings
+def load_pipeline_state(path, fingerprint):
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        payload = pickle.load(f)
+    if payload.get('version') != PIPELINE_STATE_VERSION or payload.get('fingerprint') != fingerprint:
+        return None
+    return payload['state']
+
+
+# largest |a - b| / max(1, |b|) over two arrays or identically labelled frames;
+# inf when shapes, labels or NaN patterns differ
+def max_scaled_difference(a, b):
+    if isinstance(a, pd.DataFrame) or isinstance(b, pd.DataFrame):
+        if not (a.index.equals(b.index) and a.columns.equals(b.columns)):
+            return np.inf
+        a, b = a.values, b.values
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    if a.shape != b.shape or not np.array_equal(np.isnan(a), np.isnan(b)):
+        return np.inf
+    valid = ~np.isnan(b)
+    if not valid.any():
+        return 0.0
+    return float(np.max(np.abs(a[valid] - b[valid]) / np.maximum(1.0, np.abs(b[valid]))))
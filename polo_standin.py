@@ -0,0 +1,591 @@
+import argparse
+import datetime
+import hashlib
+import hmac
+import json
+import queue
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import cryptotrading.poloneix_api as polo_api
+from cryptotrading.synthetic_market import syntheticMarket, SECONDS_IN_A_YEAR
+
+# local poloniex stand-in for load testing and profiling without touching the live exchange
+# serves the public and trading api endpoints dataBot and executionBot use over HTTP, so an unmodified
+# poloniex client works against it once POLONIEX_URL (or base_url) points here:
+#   python -m cryptotrading.polo_standin --port 8080 --assets 20 --latency 0.05 --requests-per-second 6
+#   POLONIEX_URL=http://127.0.0.1:8080 python -m cryptotrading.runner --test
+# prices follow a syntheticMarket: chart data is its bars and every pair's mid price random walks from its
+# last close. a synthetic order book around the mid is rebuilt every book_refresh seconds; limit orders
+# take liquidity from it when they cross and rest otherwise, filling at their rate once the book crosses them.
+# responses can be recorded to a json lines file and replayed, either from the stand-in itself or from the
+# live exchange through recordingTransport. GET /stream pushes ticker and trade messages (market_feed's
+# format) as json lines while the connection stays open
+
+DEFAULT_FEES = (0.0015, 0.0025)  # maker, taker
+DEFAULT_SPREAD = 0.002  # relative bid/ask spread of the synthetic book
+DEFAULT_DEPTH = 10  # synthetic book levels per side
+DEFAULT_LEVEL_SIZE = 0.5  # synthetic liquidity per level, in home currency
+DEFAULT_BOOK_REFRESH = 1.0  # seconds between mid moves and book rebuilds
+STREAM_PATH = '/stream'
+MIN_ORDER_TOTAL = 0.0001
+TICK = 1e-8  # price precision of the exchange
+
+
+def format_amount(x):
+    return '%.8f' % x
+
+
+def format_date(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# (method, path, sorted params without the nonce): identifies a request across record and replay
+def request_key(method, path, params):
+    return method, path, tuple(sorted((k, str(v)) for k, v in params.items() if k != 'nonce'))
+
+
+# thread-safe json lines log of {'method', 'path', 'params', 'status', 'body'} entries
+class responseRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, method, path, params, status, body):
+        entry = {'method': method, 'path': path, 'status': status, 'body': body,
+                 'params': {k: str(v) for k, v in params.items() if k != 'nonce'}}
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+
+# recorded responses served back in the order they were recorded; the last one repeats once a request's
+# responses are used up
+class replayLog:
+    def __init__(self, path):
+        self.responses = {}
+        self.served = {}
+        self.lock = threading.Lock()
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    key = request_key(entry['method'], entry['path'], entry['params'])
+                    self.responses.setdefault(key, []).append((entry['status'], entry['body']))
+
+    # (status, body), or None if the request was never recorded
+    def lookup(self, method, path, params):
+        key = request_key(method, path, params)
+        if key not in self.responses:
+            return None
+        with self.lock:
+            k = self.served.get(key, 0)
+            self.served[key] = k + 1
+        responses = self.responses[key]
+        return responses[min(k, len(responses) - 1)]
+
+
+# poloniex client transport that records every response of the wrapped transport, e.g. from the live exchange
+class recordingTransport:
+    def __init__(self, transport, recorder):
+        self.transport = transport
+        self.recorder = recorder
+
+    def get(self, path, params):
+        ret = self.transport.get(path, params)
+        self.recorder.record('GET', path, params, 200, ret)
+        return ret
+
+    def stream(self, path, params, chunk_size=polo_api.DEFAULT_CHUNK_SIZE):
+        chunks = []
+        for chunk in self.transport.stream(path, params, chunk_size=chunk_size):
+            chunks.append(chunk)
+            yield chunk
+        self.recorder.record('GET', path, params, 200, json.loads(b''.join(chunks)))
+
+    def post(self, path, prepare, endpoint=None):
+        sent = {}
+
+        def prepare_and_keep():
+            data, headers = prepare()
+            sent['data'] = data
+            return data, headers
+
+        ret = self.transport.post(path, prepare_and_keep, endpoint=endpoint)
+        params = {k: v[0] for k, v in urllib.parse.parse_qs(sent['data'].decode('utf8')).items()}
+        self.recorder.record('POST', path, params, 200, ret)
+        return ret
+
+    def close(self):
+        self.transport.close()
+
+
+# exchange state and matching engine; all methods are called under the exchange lock
+class standinExchange:
+    def __init__(self, market=None, balances=None, api_key=None, secret=None, fees=DEFAULT_FEES,
+                 spread=DEFAULT_SPREAD, depth=DEFAULT_DEPTH, level_size=DEFAULT_LEVEL_SIZE,
+                 book_refresh=DEFAULT_BOOK_REFRESH, time_scale=1.0, seed=0):
+        self.market = market or syntheticMarket()
+        self.home = self.market.home
+        self.pairs = list(self.market.pairs)
+        self.api_key = api_key
+        self.secret = None if secret is None else secret.encode('utf8')  # signatures are only checked when set
+        self.maker_fee, self.taker_fee = fees
+        self.spread = spread
+        self.depth = depth
+        self.level_size = level_size
+        self.book_refresh = book_refresh
+        self.time_scale = time_scale  # market seconds per wall second, speeds up fills in load tests
+        self.rng = np.random.RandomState(seed)
+        self.lock = threading.Lock()
+
+        self.balances = {currency: float(amount) for currency, amount in self.market.returnBalances().items()}
+        if balances is not None:
+            self.balances.update({currency: float(amount) for currency, amount in balances.items()})
+        self.mids = {pair: float(self.market.bars(pair, 86400)['close'][-1]) for pair in self.pairs}
+        self.last_prices = dict(self.mids)
+        self.volumes = {pair: 0.0 for pair in self.pairs}
+        self.orders = {}  # open orders by order number
+        self.trades = {}  # trades by order number, kept after the order is done
+        self.next_order_number = 1
+        self.next_trade_id = 1
+        self.last_nonce = 0
+        self.seq = 0
+        self.updated = time.monotonic()
+        self.books = {pair: self._synthetic_book(pair) for pair in self.pairs}
+        self.subscribers = []  # queues of /stream connections
+
+    def subscribe(self):
+        subscriber = queue.Queue()
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.remove(subscriber)
+
+    def _publish(self, message):
+        for subscriber in self.subscribers:
+            subscriber.put(message)
+
+    def _synthetic_book(self, pair):
+        mid = self.mids[pair]
+        step = max(mid * self.spread / 2, TICK)  # levels at least one tick apart
+        size = self.level_size / mid
+        return {
+            'asks': [[round(mid + step * (k + 1), 8), size] for k in range(self.depth)],
+            'bids': [[max(round(mid - step * (k + 1), 8), TICK), size] for k in range(self.depth)]
+        }
+
+    # moves every mid for the time elapsed, rebuilds the books and fills the resting orders they cross
+    def step(self, now=None):
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.updated
+        if elapsed < self.book_refresh:
+            return
+        self.updated = now
+        vol = self.market.annual_vol * (elapsed * self.time_scale / SECONDS_IN_A_YEAR) ** 0.5
+        for pair, move in zip(self.pairs, self.rng.normal(0, vol, len(self.pairs))):
+            self.mids[pair] *= np.exp(move)
+            self.books[pair] = self._synthetic_book(pair)
+        if len(self.subscribers) > 0:
+            date = time.time()
+            for pair, info in self.returnTicker().items():
+                self._publish(dict({'type': 'ticker', 'pair': pair, 'date': date},
+                                   **{field: info[field] for field in ['last', 'lowestAsk', 'highestBid', 'isFrozen']}))
+        for order_number in sorted(self.orders, key=int):
+            order = self.orders[order_number]
+            fills, _ = self._take(order['pair'], order['type'], order['rate'], order['amount'], at_own_rate=True)
+            self._settle(order, fills, self.maker_fee)
+        self.seq += 1
+
+    # consumes synthetic liquidity up to rate; [(rate, amount)] fills and the amount left
+    def _take(self, pair, order_type, rate, amount, at_own_rate=False):
+        levels = self.books[pair]['asks' if order_type == 'buy' else 'bids']
+        fills = []
+        for level in levels:
+            if amount <= 0:
+                break
+            if (order_type == 'buy' and level[0] > rate) or (order_type == 'sell' and level[0] < rate):
+                break
+            size = min(amount, level[1])
+            if size > 0:
+                level[1] -= size
+                amount -= size
+                fills.append((rate if at_own_rate else level[0], size))
+        return fills, amount
+
+    # books fills of an order: balances, trades, remaining amount
+    def _settle(self, order, fills, fee):
+        currency = order['pair'].split('_')[1]
+        for rate, amount in fills:
+            total = rate * amount
+            if order['type'] == 'buy':
+                # the reserve was taken at the order's rate; a better fill price releases the difference
+                self.balances[self.home] += (order['rate'] - rate) * amount
+                self.balances[currency] = self.balances.get(currency, 0.0) + amount * (1 - fee)
+            else:
+                self.balances[self.home] += total * (1 - fee)
+            order['amount'] -= amount
+            self.last_prices[order['pair']] = rate
+            self.volumes[order['pair']] += total
+            self.trades.setdefault(order['number'], []).append({
+                'globalTradeID': self.next_trade_id,
+                'tradeID': str(self.next_trade_id),
+                'currencyPair': order['pair'],
+                'type': order['type'],
+                'rate': format_amount(rate),
+                'amount': format_amount(amount),
+                'total': format_amount(total),
+                'fee': format_amount(fee),
+                'date': format_date(time.time())
+            })
+            self.next_trade_id += 1
+            self._publish({'type': 'trade', 'pair': order['pair'], 'date': time.time(), 'rate': rate,
+                           'amount': amount})
+        if order['amount'] <= 1e-12:
+            self.orders.pop(order['number'], None)
+
+    def _best(self, pair, side):
+        rates = [level[0] for level in self.books[pair][side] if level[1] > 0]
+        rates += [order['rate'] for order in self.orders.values()
+                  if order['pair'] == pair and order['type'] == ('sell' if side == 'asks' else 'buy')]
+        if len(rates) == 0:
+            return self.mids[pair]
+        return min(rates) if side == 'asks' else max(rates)
+
+    # public api
+
+    def returnTicker(self):
+        return {pair: {
+            'last': format_amount(self.last_prices[pair]),
+            'lowestAsk': format_amount(self._best(pair, 'asks')),
+            'highestBid': format_amount(self._best(pair, 'bids')),
+            'percentChange': '0.00000000',
+            'baseVolume': format_amount(self.volumes[pair]),
+            'quoteVolume': format_amount(self.volumes[pair] / self.mids[pair]),
+            'isFrozen': '0'
+        } for pair in self.pairs}
+
+    def return24Volume(self):
+        volumes = {pair: {self.home: format_amount(self.volumes[pair]),
+                          pair.split('_')[1]: format_amount(self.volumes[pair] / self.mids[pair])}
+                   for pair in self.pairs}
+        volumes['total' + self.home] = format_amount(sum(self.volumes.values()))
+        return volumes
+
+    def returnOrderBook(self, currencyPair):
+        if currencyPair == 'all':
+            return {pair: self.returnOrderBook(pair) for pair in self.pairs}
+        if currencyPair not in self.books:
+            return {'error': 'Invalid currency pair.'}
+        book = {}
+        for side, order_type in [('asks', 'sell'), ('bids', 'buy')]:
+            levels = {}
+            for rate, amount in self.books[currencyPair][side]:
+                if amount > 0:
+                    levels[rate] = levels.get(rate, 0.0) + amount
+            for order in self.orders.values():
+                if order['pair'] == currencyPair and order['type'] == order_type:
+                    levels[order['rate']] = levels.get(order['rate'], 0.0) + order['amount']
+            book[side] = [[format_amount(rate), amount] for rate, amount in
+                          sorted(levels.items(), reverse=(side == 'bids'))]
+        book['isFrozen'] = '0'
+        book['seq'] = self.seq
+        return book
+
+    def returnChartData(self, currencyPair, start, end, period):
+        try:
+            return self.market.chart_data(currencyPair, int(start), int(end), int(period))
+        except ValueError as e:
+            return {'error': str(e)}
+
+    # trading api
+
+    def returnBalances(self):
+        return {currency: format_amount(amount) for currency, amount in self.balances.items()}
+
+    def returnOpenOrders(self, currencyPair):
+        def open_orders(pair):
+            return [{'orderNumber': order['number'], 'type': order['type'], 'rate': format_amount(order['rate']),
+                     'startingAmount': format_amount(order['starting amount']),
+                     'amount': format_amount(order['amount']),
+                     'total': format_amount(order['rate'] * order['amount']), 'date': order['date']}
+                    for order in sorted(self.orders.values(), key=lambda order: int(order['number']))
+                    if order['pair'] == pair]
+
+        if currencyPair == 'all':
+            return {pair: open_orders(pair) for pair in self.pairs}
+        if currencyPair not in self.books:
+            return {'error': 'Invalid currency pair.'}
+        return open_orders(currencyPair)
+
+    def returnOrderTrades(self, orderNumber):
+        if str(orderNumber) not in self.trades:
+            return {'error': 'Order not found, or you are not the person who placed it.'}
+        return self.trades[str(orderNumber)]
+
+    def place_order(self, order_type, currencyPair, rate, amount):
+        if currencyPair not in self.books:
+            return {'error': 'Invalid currency pair.'}
+        rate, amount = float(rate), float(amount)
+        if rate <= 0 or amount <= 0:
+            return {'error': 'Invalid rate or amount.'}
+        if rate * amount < MIN_ORDER_TOTAL:
+            return {'error': 'Total must be at least ' + str(MIN_ORDER_TOTAL) + '.'}
+
+        # reserve what the order can spend
+        currency = self.home if order_type == 'buy' else currencyPair.split('_')[1]
+        reserve = rate * amount if order_type == 'buy' else amount
+        if self.balances.get(currency, 0.0) < reserve:
+            return {'error': 'Not enough ' + currency + '.'}
+        self.balances[currency] -= reserve
+
+        order_number = str(self.next_order_number)
+        self.next_order_number += 1
+        order = {'number': order_number, 'pair': currencyPair, 'type': order_type, 'rate': rate, 'amount': amount,
+                 'starting amount': amount, 'date': format_date(time.time())}
+        self.orders[order_number] = order
+        self.trades[order_number] = []
+        fills, _ = self._take(currencyPair, order_type, rate, amount)
+        self._settle(order, fills, self.taker_fee)
+        return {'orderNumber': order_number, 'resultingTrades': self.trades[order_number][:]}
+
+    def cancelOrder(self, currencyPair, orderNumber):
+        order = self.orders.get(str(orderNumber))
+        if order is None or order['pair'] != currencyPair:
+            return {'success': 0, 'error': 'Invalid order number, or you are not the person who placed the order.'}
+        del self.orders[order['number']]
+        if order['type'] == 'buy':
+            self.balances[self.home] += order['rate'] * order['amount']
+        else:
+            currency = order['pair'].split('_')[1]
+            self.balances[currency] += order['amount']
+        return {'success': 1, 'amount': format_amount(order['amount']),
+                'message': 'Order #' + order['number'] + ' canceled.'}
+
+    # (status, body) of a public api call
+    def public(self, params):
+        command = params.get('command')
+        with self.lock:
+            self.step()
+            if command == 'returnTicker':
+                return 200, self.returnTicker()
+            elif command == 'return24Volume':
+                return 200, self.return24Volume()
+            elif command == 'returnOrderBook':
+                return 200, self.returnOrderBook(params.get('currencyPair', 'all'))
+            elif command == 'returnChartData':
+                return 200, self.returnChartData(params.get('currencyPair'), params.get('start', 0),
+                                                 params.get('end', 9999999999), params.get('period', 300))
+        return 400, {'error': 'Invalid command.'}
+
+    # (status, body) of a signed trading api call; data is the raw request body
+    def trading(self, params, headers, data):
+        if self.secret is not None:
+            sign = hmac.new(self.secret, data, hashlib.sha512).hexdigest()
+            if headers.get('Key') != self.api_key or not hmac.compare_digest(sign, headers.get('Sign', '')):
+                return 403, {'error': 'Invalid API key/secret pair.'}
+
+        command = params.get('command')
+        with self.lock:
+            nonce = int(params.get('nonce', 0))
+            if nonce <= self.last_nonce:
+                return 422, {'error': polo_api.NONCE_ERROR + ' than ' + str(self.last_nonce) + '.'}
+            self.last_nonce = nonce
+            self.step()
+            if command == 'returnBalances':
+                return 200, self.returnBalances()
+            elif command == 'returnOpenOrders':
+                return 200, self.returnOpenOrders(params.get('currencyPair', 'all'))
+            elif command == 'returnOrderTrades':
+                return 200, self.returnOrderTrades(params.get('orderNumber'))
+            elif command in ('buy', 'sell'):
+                return 200, self.place_order(command, params.get('currencyPair'), params.get('rate', 0),
+                                             params.get('amount', 0))
+            elif command == 'cancelOrder':
+                return 200, self.cancelOrder(params.get('currencyPair'), params.get('orderNumber'))
+        return 400, {'error': 'Invalid command.'}
+
+
+class _standinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the exchange, so the client's connection pool is exercised
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path == STREAM_PATH:
+            return self._stream()
+        params = {k: v[0] for k, v in urllib.parse.parse_qs(url.query).items()}
+        self._serve('GET', url.path, params, lambda: self.server.exchange.public(params))
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        params = {k: v[0] for k, v in urllib.parse.parse_qs(data.decode('utf8')).items()}
+        self._serve('POST', path, params, lambda: self.server.exchange.trading(params, self.headers, data))
+
+    def _serve(self, method, path, params, handle):
+        server = self.server
+        if server.rate_limiters is not None:
+            with server.lock:
+                limiter = server.rate_limiters.setdefault(
+                    self.client_address[0], polo_api.rateLimiter(server.requests_per_second))
+            wait = limiter.try_acquire()
+            if wait > 0:
+                return self._respond(429, {'error': 'Please do not make more than ' +
+                                           str(server.requests_per_second) + ' API calls per second.'},
+                                     {'Retry-After': '%.3f' % wait})
+
+        if server.latency > 0 or server.latency_jitter > 0:
+            time.sleep(server.latency + random.uniform(0, server.latency_jitter))
+
+        response = None
+        if server.replay is not None:
+            response = server.replay.lookup(method, path, params)
+            if response is None and not server.replay_fallback:
+                response = (404, {'error': 'Request not recorded.'})
+        if response is None:
+            if (method, path) in [('GET', polo_api.PUBLIC_PATH), ('POST', polo_api.TRADING_PATH)]:
+                response = handle()
+            else:
+                response = (404, {'error': 'Not found.'})
+
+        if server.recorder is not None:
+            server.recorder.record(method, path, params, *response)
+        self._respond(*response)
+
+    # chunked json lines until the client goes away; the market steps while nobody sends requests
+    def _stream(self):
+        exchange = self.server.exchange
+        subscriber = exchange.subscribe()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            while not self.server.stopping:
+                try:
+                    message = subscriber.get(timeout=exchange.book_refresh)
+                except queue.Empty:
+                    with exchange.lock:
+                        exchange.step()
+                    continue
+                line = (json.dumps(message) + '\n').encode('utf8')
+                self.wfile.write(('%x\r\n' % len(line)).encode('ascii') + line + b'\r\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            exchange.unsubscribe(subscriber)
+        self.close_connection = True
+
+    def _respond(self, status, body, headers=None):
+        payload = json.dumps(body).encode('utf8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+# HTTP server around a standinExchange; port 0 picks a free port, see url
+# latency: seconds added to every response (plus up to latency_jitter), requests_per_second: per client
+# address limit answered with 429 and Retry-After, record: json lines file every response is appended to,
+# replay: recorded json lines file served first; unrecorded requests fall through to the exchange if
+# replay_fallback, else get 404
+class standinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, exchange=None, host='127.0.0.1', port=0, latency=0.0, latency_jitter=0.0,
+                 requests_per_second=None, record=None, replay=None, replay_fallback=True, verbose=False):
+        ThreadingHTTPServer.__init__(self, (host, port), _standinHandler)
+        self.exchange = exchange or standinExchange()
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.requests_per_second = requests_per_second
+        self.rate_limiters = None if requests_per_second is None else {}
+        self.recorder = None if record is None else responseRecorder(record)
+        self.replay = None if replay is None else replayLog(replay)
+        self.replay_fallback = replay_fallback
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stopping = False
+
+    @property
+    def url(self):
+        return 'http://' + self.server_address[0] + ':' + str(self.server_address[1])
+
+    # serves from a background thread
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopping = True
+        self.shutdown()
+        self.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a local poloniex stand-in exchange')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--assets', help='Number of listed pairs', type=int, default=20)
+    parser.add_argument('--days', help='Chart data history in days', type=int, default=365)
+    parser.add_argument('--seed', help='Synthetic market seed', type=int, default=0)
+    parser.add_argument('--balance', help='Starting home currency balance', type=float, default=1.0)
+    parser.add_argument('--key', help='API key; signatures are checked when key and secret are set', default=None)
+    parser.add_argument('--secret', help='API secret', default=None)
+    parser.add_argument('--latency', help='Seconds added to every response', type=float, default=0.0)
+    parser.add_argument('--latency-jitter', help='Random extra latency, up to this many seconds', type=float,
+                        default=0.0)
+    parser.add_argument('--requests-per-second', help='Per client rate limit', type=float, default=None)
+    parser.add_argument('--time-scale', help='Market seconds per wall second', type=float, default=1.0)
+    parser.add_argument('--record', help='Append every response to this json lines file', default=None)
+    parser.add_argument('--replay', help='Serve responses recorded in this json lines file', default=None)
+    parser.add_argument('--replay-only', help='Answer unrecorded requests with 404', action='store_true')
+    parser.add_argument('--verbose', help='Log every request', action='store_true')
+    args = parser.parse_args(argv)
+
+    market = syntheticMarket(n_assets=args.assets, history_days=args.days, seed=args.seed)
+    exchange = standinExchange(market=market, balances={market.home: args.balance}, api_key=args.key,
+                               secret=args.secret, time_scale=args.time_scale, seed=args.seed)
+    server = standinServer(exchange=exchange, host=args.host, port=args.port, latency=args.latency,
+                           latency_jitter=args.latency_jitter, requests_per_second=args.requests_per_second,
+                           record=args.record, replay=args.replay, replay_fallback=not args.replay_only,
+                           verbose=args.verbose)
+    print('Serving on ' + server.url + '; point the client at it with ' + polo_api.BASE_URL_ENV + '=' + server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
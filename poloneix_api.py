@@ -1,19 +1,187 @@
+import os
 import urllib
-import urllib.request as urllib2
-import json
 import time
 import hmac, hashlib
+import random
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+
+import cryptotrading.instrumentation as instrumentation
+
+# poloniex allows 6 calls per second per IP
+DEFAULT_REQUESTS_PER_SECOND = 6.0
+
+BASE_URL = 'https://poloniex.com'
+BASE_URL_ENV = 'POLONIEX_URL'  # overrides BASE_URL, e.g. to point the client at a local stand-in exchange
+PUBLIC_PATH = '/public'
+TRADING_PATH = '/tradingApi'
+
+# transport defaults: (connect, read) timeouts in seconds and jittered exponential backoff
+DEFAULT_TIMEOUT = (3.05, 30.0)
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_POOL_SIZE = 16
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+DEFAULT_CHUNK_SIZE = 1 << 16
+NONCE_RETRIES = 5  # times a signed call the exchange rejected for its nonce is signed again and resent
+NONCE_ERROR = 'Nonce must be greater'
 
 
 def createTimeStamp(datestr, format="%Y-%m-%d %H:%M:%S"):
     return time.mktime(time.strptime(datestr, format))
 
 
+# thread-safe token bucket; acquire() blocks until a request slot is free
+class rateLimiter:
+    def __init__(self, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, burst=1):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return
+            time.sleep(wait)
+
+    # takes a slot if one is free and returns 0.0, otherwise returns the seconds until the next one
+    def try_acquire(self):
+        if self.interval == 0.0:
+            return 0.0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.interval)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return 0.0
+            return (1.0 - self.tokens) * self.interval
+
+
+# the exchange's answer to a nonce not above the last one it saw
+def is_nonce_rejection(result):
+    return isinstance(result, dict) and str(result.get('error', '')).startswith(NONCE_ERROR)
+
+
+# thread-safe strictly increasing nonces in milliseconds, so concurrent private calls never collide
+class nonceGenerator:
+    def __init__(self):
+        self.last = 0
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            self.last = max(self.last + 1, int(time.time() * 1000))
+            return self.last
+
+
+# pooled keep-alive HTTP transport with timeouts and jittered exponential retry
+# public calls are retried on 429/5xx and connection errors; private calls only when the request
+# cannot have reached the exchange (429 or connect failure), so orders are never placed twice
+class httpTransport:
+    def __init__(self, base_url=None, timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF, pool_size=DEFAULT_POOL_SIZE,
+                 rate_limiter=None):
+        if base_url is None:
+            base_url = os.environ.get(BASE_URL_ENV, BASE_URL)
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.rate_limiter = rate_limiter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get(self, path, params):
+        return self._request('GET', path, lambda: {'params': params},
+                             retry_status_codes=RETRY_STATUS_CODES,
+                             retry_errors=(requests.ConnectionError, requests.Timeout),
+                             endpoint=params.get('command'))
+
+    # raw response body chunks as they arrive; retried like get() until the response starts
+    def stream(self, path, params, chunk_size=DEFAULT_CHUNK_SIZE):
+        ret = self._request('GET', path, lambda: {'params': params, 'stream': True},
+                            retry_status_codes=RETRY_STATUS_CODES,
+                            retry_errors=(requests.ConnectionError, requests.Timeout),
+                            parse=False, endpoint=params.get('command'))
+        try:
+            for chunk in ret.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            ret.close()
+
+    # prepare() returns (body, headers) and is called again before every attempt
+    def post(self, path, prepare, endpoint=None):
+        def request_kwargs():
+            data, headers = prepare()
+            return {'data': data, 'headers': headers}
+
+        return self._request('POST', path, request_kwargs,
+                             retry_status_codes=(429,),
+                             retry_errors=(requests.ConnectTimeout,),
+                             endpoint=endpoint)
+
+    # endpoint: name the call's latency and retries are recorded under when instrumentation is enabled;
+    # a call that raises (a timeout it may not retry, a broken connection, an undecodable body) counts as an error
+    def _request(self, method, path, request_kwargs, retry_status_codes, retry_errors, parse=True, endpoint=None):
+        url = self.base_url + path
+        start = time.perf_counter()
+        attempt = 0
+        try:
+            for attempt in range(self.max_retries + 1):
+                if self.rate_limiter is not None:
+                    self.rate_limiter.acquire()
+                try:
+                    ret = self.session.request(method, url, timeout=self.timeout, **request_kwargs())
+                except retry_errors:
+                    if attempt == self.max_retries:
+                        raise
+                    time.sleep(self._backoff_delay(attempt))
+                    continue
+
+                if ret.status_code in retry_status_codes and attempt < self.max_retries:
+                    ret.close()
+                    time.sleep(self._backoff_delay(attempt, ret.headers.get('Retry-After')))
+                    continue
+                result = ret.json() if parse else ret
+                break
+        except Exception:
+            instrumentation.record_api_call(endpoint or path, time.perf_counter() - start, retries=attempt,
+                                            error=True)
+            raise
+        instrumentation.record_api_call(endpoint or path, time.perf_counter() - start, retries=attempt,
+                                        error=ret.status_code >= 400 or (isinstance(result, dict) and
+                                                                         'error' in result))
+        return result
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def close(self):
+        self.session.close()
+
+
 class poloniex:
-    def __init__(self, APIKey, Secret):
+    def __init__(self, APIKey, Secret, transport=None, base_url=None):
         self.APIKey = APIKey
         self.Secret = Secret.encode('utf8')
+        self.transport = transport or httpTransport(base_url=base_url)
+        self.nonce = nonceGenerator()
 
     def post_process(self, before):
         after = before
@@ -31,37 +199,40 @@ class poloniex:
     def api_query(self, command, req={}):
 
         if (command == "returnTicker" or command == "return24Volume"):
-            ret = urllib2.urlopen(urllib2.Request('https://poloniex.com/public?command=' + command))
-            return json.loads(ret.read())
+            return self.transport.get(PUBLIC_PATH, {'command': command})
         elif (command == "returnOrderBook"):
-            ret = urllib2.urlopen(urllib2.Request(
-                'https://poloniex.com/public?command=' + command + '&currencyPair=' + str(req['currencyPair'])))
-            return json.loads(ret.read())
+            return self.transport.get(PUBLIC_PATH, {'command': command, 'currencyPair': str(req['currencyPair'])})
         elif (command == "returnMarketTradeHistory"):
-            ret = urllib2.urlopen(urllib2.Request(
-                'https://poloniex.com/public?command=' + "returnTradeHistory" + '&currencyPair=' + str(
-                    req['currencyPair'])))
-            return json.loads(ret.read())
+            return self.transport.get(PUBLIC_PATH, {'command': "returnTradeHistory",
+                                                    'currencyPair': str(req['currencyPair'])})
         elif (command == 'returnChartData'):
-            ret = urllib2.urlopen(urllib2.Request(
-                'https://poloniex.com/public?command=' + command + '&currencyPair=' + str(
-                    req['currencyPair']) + '&start=' + str(req['start']) + '&end=' + str(
-                    req['end']) + '&period=' + str(req['period'])
-                ))
-            return json.loads(ret.read())
+            return self.transport.get(PUBLIC_PATH, {'command': command,
+                                                    'currencyPair': str(req['currencyPair']),
+                                                    'start': str(req['start']),
+                                                    'end': str(req['end']),
+                                                    'period': str(req['period'])})
         else:
-            req['command'] = command
-            req['nonce'] = int(time.time() * 1000)
-            post_data = urllib.parse.urlencode(req).encode('utf8')
-
-            sign = hmac.new(self.Secret, post_data, hashlib.sha512).hexdigest()
-            headers = {
-                'Sign': sign,
-                'Key': self.APIKey
-            }
-
-            ret = requests.post('https://poloniex.com/tradingApi', data=req, headers=headers)
-            jsonRet = json.loads(ret.text)
+            # signed again on every attempt so a retried request never reuses a nonce
+            def sign_request():
+                signed_req = dict(req)
+                signed_req['command'] = command
+                signed_req['nonce'] = self.nonce.next()
+                post_data = urllib.parse.urlencode(signed_req).encode('utf8')
+
+                sign = hmac.new(self.Secret, post_data, hashlib.sha512).hexdigest()
+                headers = {
+                    'Sign': sign,
+                    'Key': self.APIKey,
+                    'Content-Type': 'application/x-www-form-urlencoded'
+                }
+                return post_data, headers
+
+            # signed calls run concurrently, so they may reach the exchange out of nonce order; it rejects a
+            # nonce not above the last one it saw without running the call, which is then signed again
+            for attempt in range(NONCE_RETRIES + 1):
+                jsonRet = self.transport.post(TRADING_PATH, sign_request, endpoint=command)
+                if not is_nonce_rejection(jsonRet):
+                    break
             return self.post_process(jsonRet)
 
     def returnTicker(self):
@@ -85,6 +256,17 @@ class poloniex:
                                   'period': period
                               })
 
+    # same as returnChartData, but yields the raw JSON response in chunks as it arrives
+    def returnChartDataStream(self, currencyPair, start, end, period, chunk_size=DEFAULT_CHUNK_SIZE):
+        return self.transport.stream(PUBLIC_PATH,
+                                     {
+                                         'command': 'returnChartData',
+                                         'currencyPair': str(currencyPair),
+                                         'start': str(start),
+                                         'end': str(end),
+                                         'period': str(period)
+                                     }, chunk_size=chunk_size)
+
     # Returns all of your balances.
     # Outputs:
     # {"BTC":"0.59098578","LTC":"3.31117268", ... }
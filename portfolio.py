@@ -0,0 +1,45 @@
+import numpy as np
+
+# pure PORT construction: factor views -> risk-targeted, leverage-capped portfolio views
+# works on plain arrays so viewgen and the weight optimizer's worker processes share one implementation
+
+
+# PORT views for many factor-weight vectors at once
+# factor_views: factor x date x asset (NaN = no view), weights: candidate x factor,
+# portfolio_variances: function of a candidate x date x asset view tensor returning candidate x date variances.
+# returns candidate x date x asset views; the home asset (column home) holds the cash left over
+def build_port_views(factor_views, weights, portfolio_variances, home, risk_target=1.0, leverage_cap=0.98,
+                     no_naked_short=True, force_max_out_cash=False):
+    factor_views = np.asarray(factor_views, dtype=np.float64)
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+
+    # weighted blend; an asset with no view in any factor used by a candidate has no view in its blend
+    active = (weights != 0).astype(np.float64)
+    views = np.einsum('wf,fda->wda', weights, np.nan_to_num(factor_views, nan=0.0))
+    views[np.einsum('wf,fda->wda', active, np.isnan(factor_views).astype(np.float64)) > 0] = np.nan
+    views /= weights.sum(1)[:, None, None]
+
+    # remove negative positions if needed
+    if no_naked_short:
+        views[views < 0] = 0
+
+    # vol targeting
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vols = portfolio_variances(views) ** 0.5
+        views = views / vols[:, :, None] * risk_target
+    views[np.isnan(views)] = 0
+
+    # cap leverage
+    leverage = views.sum(2)
+    leverage[leverage > leverage_cap] = leverage_cap
+
+    # force max out cash
+    if force_max_out_cash:
+        leverage[:] = leverage_cap
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        views = views * (leverage / views.sum(2))[:, :, None]
+    views[np.isnan(views)] = 0
+
+    views[:, :, home] = 1 - views.sum(2)
+    return views
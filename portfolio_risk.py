@@ -0,0 +1,41 @@
+import numpy as np
+
+# batched ex-ante risk for many portfolios and dates at once
+# views: portfolio x date x asset tensor, NaN = no view; cov: date x asset x asset tensor with NaN rows and
+# columns for assets outside the risk model on that date. for every (portfolio, date) an asset counts only if
+# it has a view and a non-empty covariance column, exactly as the per-date pandas version selected them
+
+
+def available_assets(views, cov):
+    cov_available = ~np.isnan(cov).all(axis=1)  # date x asset
+    return ~np.isnan(views) & cov_available[None, :, :]
+
+
+def batch_portfolio_variances(views, cov):
+    views = np.asarray(views, dtype=np.float64)
+    cov = np.asarray(cov, dtype=np.float64)
+    available = available_assets(views, cov)
+    weights = np.where(available, views, 0.0).transpose(1, 0, 2)  # date x portfolio x asset
+    variances = np.einsum('dpa,dpa->pd', weights @ np.nan_to_num(cov, nan=0.0), weights)
+
+    # a missing covariance entry between two available assets makes the variance undefined
+    cov_missing = np.isnan(cov).astype(np.float64)
+    mask = available.transpose(1, 0, 2).astype(np.float64)
+    undefined = np.einsum('dpa,dpa->pd', mask @ cov_missing, mask) > 0
+    variances[undefined] = np.nan
+    return variances
+
+
+def batch_portfolio_vols(views, cov):
+    return batch_portfolio_variances(views, cov) ** 0.5
+
+
+# same as batch_portfolio_variances for covariances given as loadings @ loadings.T + diag(specific):
+# loadings date x asset x factor, specific date x asset with NaN for assets outside the risk model.
+# O(P D N K) instead of O(P D N^2), and nothing N x N is ever formed
+def batch_low_rank_portfolio_variances(views, loadings, specific):
+    views = np.asarray(views, dtype=np.float64)
+    available = ~np.isnan(views) & ~np.isnan(specific)[None, :, :]
+    weights = np.where(available, views, 0.0)
+    exposures = np.einsum('pda,dak->pdk', weights, np.nan_to_num(loadings, nan=0.0))
+    return (exposures ** 2).sum(2) + np.einsum('pda,da->pd', weights ** 2, np.nan_to_num(specific, nan=0.0))
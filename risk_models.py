@@ -0,0 +1,228 @@
+import abc
+
+import numpy as np
+import pandas as pd
+
+from cryptotrading.portfolio_risk import batch_portfolio_variances, batch_low_rank_portfolio_variances
+
+# pluggable risk models over dates x assets
+# every model answers the same questions: model[date] (asset x asset covariance frame), variances()
+# (date x asset) and portfolio_variances(views) for a portfolio x date x asset view tensor. assets outside
+# the model on a date are NaN throughout, exactly like the NaN rows and columns of the dense panel.
+#   sample              dense date x N x N sample covariances, O(N^2) per date
+#   statistical         top-K principal components of the sample covariance plus specific variances, O(N K)
+#                       per date
+#   shrunk statistical  top-K principal components of the Ledoit-Wolf shrunk sample covariance (shrunk towards
+#                       a scaled identity) plus specific variances. a truncation of the Ledoit-Wolf estimate: the
+#                       components past K only keep their diagonal, as in statistical; well conditioned even when
+#                       N exceeds the window length
+# the compact models come straight from a thin SVD of each date's T x N window of returns, so no N x N matrix
+# is formed. missing returns count as the asset's window mean, so off-diagonal entries of a window with gaps
+# differ slightly from the pairwise sample covariance; variances are exact
+
+RISK_MODELS = ['sample', 'statistical', 'shrunk statistical']
+DEFAULT_NUM_OF_FACTORS = 10
+
+
+class riskModel(abc.ABC):
+    def __init__(self, dates, assets):
+        self.dates = pd.DatetimeIndex(dates)
+        self.assets = pd.Index(assets)
+
+    @property
+    def items(self):
+        return self.dates
+
+    def keys(self):
+        return self.dates
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, date):
+        try:
+            self._loc(date)
+        except KeyError:
+            return False
+        return True
+
+    def _loc(self, date):
+        date = pd.Timestamp(date)
+        if self.dates.tz is not None and date.tz is None:
+            date = date.tz_localize(self.dates.tz)
+        return self.dates.get_loc(date)
+
+    # positions of dates in the model, -1 where it has no date
+    def _positions(self, dates):
+        if self.dates.equals(dates):
+            return np.arange(len(dates))
+        return self.dates.get_indexer(dates)
+
+    # asset x asset covariance frame on date
+    @abc.abstractmethod
+    def __getitem__(self, date):
+        pass
+
+    # per-date arrays, first axis = date; head, append and consistency checks work on these
+    @abc.abstractmethod
+    def arrays(self):
+        pass
+
+    # a model of the same kind and assets on dates from per-date arrays
+    @abc.abstractmethod
+    def _from_arrays(self, dates, arrays):
+        pass
+
+    # date x asset variances
+    @abc.abstractmethod
+    def variances(self):
+        pass
+
+    # portfolio x date variances of a portfolio x date x asset view tensor
+    @abc.abstractmethod
+    def portfolio_variances(self, views, dates):
+        pass
+
+    def head(self, n):
+        return self._from_arrays(self.dates[:n], [array[:n] for array in self.arrays()])
+
+    # models of the same kind on consecutive dates joined into one
+    def append(self, other):
+        return self._from_arrays(self.dates.append(other.dates),
+                                 [np.concatenate([a, b]) for a, b in zip(self.arrays(), other.arrays())])
+
+    def portfolio_vols(self, views, dates):
+        return self.portfolio_variances(views, dates) ** 0.5
+
+
+# dense sample covariances; model[date] is a zero-copy asset x asset dataframe
+class sampleRiskModel(riskModel):
+    def __init__(self, dates, assets, values):
+        riskModel.__init__(self, dates, assets)
+        self.values = values
+
+    def __getitem__(self, date):
+        return pd.DataFrame(self.values[self._loc(date)], index=self.assets, columns=self.assets, copy=False)
+
+    def arrays(self):
+        return [self.values]
+
+    def _from_arrays(self, dates, arrays):
+        return sampleRiskModel(dates, self.assets, arrays[0])
+
+    def variances(self):
+        return np.diagonal(self.values, axis1=1, axis2=2)
+
+    # covariance tensor on dates, all NaN where the model has no date
+    def tensor(self, dates):
+        if self.dates.equals(dates):
+            return self.values
+        positions = self._positions(dates)
+        cov_tensor = self.values[np.maximum(positions, 0)]
+        cov_tensor[positions < 0] = np.nan
+        return cov_tensor
+
+    def portfolio_variances(self, views, dates):
+        return batch_portfolio_variances(views, self.tensor(dates))
+
+
+# cov = loadings @ loadings.T + diag(specific) per date; loadings date x N x K, specific date x N
+class lowRankRiskModel(riskModel):
+    def __init__(self, dates, assets, loadings, specific):
+        riskModel.__init__(self, dates, assets)
+        self.loadings = loadings
+        self.specific = specific
+
+    def __getitem__(self, date):
+        k = self._loc(date)
+        cov = self.loadings[k] @ self.loadings[k].T
+        cov[np.diag_indices_from(cov)] += self.specific[k]
+        return pd.DataFrame(cov, index=self.assets, columns=self.assets)
+
+    def arrays(self):
+        return [self.loadings, self.specific]
+
+    def _from_arrays(self, dates, arrays):
+        return lowRankRiskModel(dates, self.assets, arrays[0], arrays[1])
+
+    def variances(self):
+        return (self.loadings ** 2).sum(2) + self.specific
+
+    def portfolio_variances(self, views, dates):
+        positions = self._positions(dates)
+        loadings = self.loadings[np.maximum(positions, 0)]
+        specific = self.specific[np.maximum(positions, 0)]
+        specific[positions < 0] = np.nan
+        return batch_low_rank_portfolio_variances(views, loadings, specific)
+
+
+# window returns (rows = observations, NaN = missing) as Z with Z.T @ Z the window's covariance estimate:
+# each asset demeaned by its weighted mean and scaled by its own unbiased denominator, missing returns at 0.
+# weights = the rows' weights, None = equal weights
+def scaled_window(returns, weights=None):
+    valid = ~np.isnan(returns)
+    w = np.ones(len(returns)) if weights is None else weights
+    wm = valid * w[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sum_w = wm.sum(0)
+        mean = np.where(valid, returns, 0.0).T @ w / sum_w
+        denominator = sum_w - (wm * w[:, None]).sum(0) / sum_w
+        z = np.where(valid, returns - mean, 0.0) * (w[:, None] / np.where(denominator > 0, denominator, np.nan)) ** 0.5
+    return np.where(valid, z, 0.0)
+
+
+# Ledoit-Wolf (2004) intensity for shrinking Z.T @ Z towards mu * I, from Z and the eigenvalues of Z.T @ Z
+# (the squared singular values of Z); O(T N) on top of the SVD
+def ledoit_wolf_intensity(z, eigenvalues):
+    n_assets = z.shape[1]
+    n_obs = max((z != 0).any(1).sum(), 1)
+
+    mu = eigenvalues.sum() / n_assets
+    frobenius = (eigenvalues ** 2).sum()
+    d2 = frobenius - n_assets * mu ** 2
+    b2 = ((z ** 2).sum(1) ** 2).sum() - frobenius / n_obs
+    if d2 <= 0:
+        return 1.0
+    return float(np.clip(b2 / d2, 0.0, 1.0))
+
+
+# top n_factors principal components of Z.T @ Z (shrunk for 'shrunk statistical') as loadings, the rest of
+# its diagonal as specific variance; a thin SVD of the T x N window, nothing N x N is formed
+def window_factors(kind, z, n_factors):
+    n_assets = z.shape[1]
+    _, singular_values, vt = np.linalg.svd(z, full_matrices=False)
+    eigenvalues = singular_values ** 2
+    variances = (z ** 2).sum(0)
+    rank = min(n_factors, len(eigenvalues))
+
+    top = eigenvalues[:rank]
+    if kind == 'shrunk statistical':
+        intensity = ledoit_wolf_intensity(z, eigenvalues)
+        mu = eigenvalues.sum() / n_assets
+        top = (1.0 - intensity) * top + intensity * mu
+        variances = (1.0 - intensity) * variances + intensity * mu
+    elif kind != 'statistical':
+        raise ValueError('risk model not valid!')
+
+    loadings = np.zeros((n_assets, n_factors))
+    loadings[:, :rank] = vt[:rank].T * top ** 0.5
+    specific = np.maximum(variances - (loadings ** 2).sum(1), 0.0)
+    return loadings, specific
+
+
+# date x N x K loadings and date x N specific variances of a compact model, one window of returns per date:
+# rows [lo[k], hi[k]) of returns for the assets in enough[k]. halflife in rows weights each window's rows
+# 0.5 ** (age / halflife), None = equal weights; scale multiplies every covariance
+def compact_risk_arrays(kind, returns, lo, hi, enough, n_factors, halflife=None, scale=1.0):
+    n_dates, n_assets = len(lo), returns.shape[1]
+    n_factors = min(n_factors, n_assets)
+    loadings = np.full((n_dates, n_assets, n_factors), np.nan)
+    specific = np.full((n_dates, n_assets), np.nan)
+    for k in range(n_dates):
+        valid = enough[k]
+        if not valid.any() or hi[k] <= lo[k]:
+            continue
+        weights = None if halflife is None else 0.5 ** ((hi[k] - 1 - np.arange(lo[k], hi[k])) / halflife)
+        z = scaled_window(returns[lo[k]:hi[k]][:, valid], weights) * scale ** 0.5
+        loadings[k][valid], specific[k][valid] = window_factors(kind, z, n_factors)
+    return loadings, specific
@@ -0,0 +1,164 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.offsets import BDay
+
+# rolling pairwise covariance engine
+# instead of re-running DataFrame.cov() for every date, weighted sums and cross-products of the
+# return matrix are updated as the window slides: rows entering are added, rows leaving subtracted.
+# missing returns are handled pairwise exactly as DataFrame.cov() does. with a halflife the rows in
+# the window are exponentially weighted (EWMA) and the sums are decayed as the window moves.
+
+# sums are rebuilt from scratch every n dates to bound round-off drift from the add/subtract updates
+DEFAULT_REFRESH_EVERY = 64
+
+
+# row bounds [lo, hi) of the intraday rows in [date - window business days, date] for every date
+def window_bounds(index, dates, window):
+    lo = np.array([index.searchsorted(pd.Timestamp(date) - BDay(window), side='left') for date in dates],
+                  dtype=np.int64)
+    hi = np.array([index.searchsorted(pd.Timestamp(date), side='right') for date in dates], dtype=np.int64)
+    return lo, hi
+
+
+class rollingCovariance():
+    def __init__(self, returns, halflife=None, refresh_every=DEFAULT_REFRESH_EVERY):
+        # returns: T x N array with NaN for missing observations; halflife in rows, None = equal weights
+        # C order fixes the BLAS code path, so serial and parallel runs agree bit for bit
+        returns = np.ascontiguousarray(returns, dtype=np.float64)
+        self.mask = (~np.isnan(returns)).astype(np.float64)
+        self.x = np.where(self.mask > 0, returns, 0.0)
+        self.decay = 1.0 if halflife is None else 0.5 ** (1.0 / halflife)
+        self.refresh_every = refresh_every
+        self.n = returns.shape[1]
+
+    # weighted sums over rows [lo, hi), each row weighted decay ** (anchor - 1 - row)
+    def _sums(self, lo, hi, anchor):
+        x = self.x[lo:hi]
+        m = self.mask[lo:hi]
+        w = self.decay ** (anchor - 1 - np.arange(lo, hi))[:, None] if self.decay != 1.0 else 1.0
+        wm = m * w
+        return np.array([
+            wm.T @ m,            # W[i, j] = sum w m_i m_j
+            (x * w).T @ m,       # Sx[i, j] = sum w x_i m_j
+            (x * w).T @ x,       # Sxy[i, j] = sum w x_i x_j
+            (wm * w).T @ m       # V2[i, j] = sum w^2 m_i m_j
+        ])
+
+    @staticmethod
+    def _cov(sums):
+        W, Sx, Sxy, V2 = sums
+        with np.errstate(divide='ignore', invalid='ignore'):
+            denominator = W - V2 / W
+            cov = (Sxy - Sx * Sx.T / W) / denominator
+        cov[~(denominator > 0)] = np.nan
+        return cov
+
+    # move the window from [prev_lo, prev_hi) to [lo, hi), both ends non-decreasing
+    def _slide(self, sums, prev_lo, prev_hi, lo, hi):
+        if self.decay != 1.0 and hi > prev_hi:
+            step = self.decay ** (hi - prev_hi)
+            sums[:3] *= step
+            sums[3] *= step ** 2
+        if hi > prev_hi:
+            sums += self._sums(max(prev_hi, lo), hi, anchor=hi)
+        if lo > prev_lo:
+            sums -= self._sums(prev_lo, min(lo, prev_hi), anchor=hi)
+        return sums
+
+    # covariance matrices for every (lo, hi) window, as a D x N x N array
+    # the k-th window is rebuilt from scratch whenever (offset + k) % refresh_every == 0
+    # state = (sums, lo, hi) of the window just before lo[0] continues an earlier run exactly where it
+    # stopped; the state after the last window is left in self.state
+    def covariances(self, lo, hi, offset=0, out=None, state=None):
+        if out is None:
+            out = np.empty((len(lo), self.n, self.n))
+        if state is not None:
+            state = (state[0].copy(), state[1], state[2])
+        for k in range(len(lo)):
+            if state is None or (offset + k) % self.refresh_every == 0 or lo[k] >= state[2]:
+                sums = self._sums(lo[k], hi[k], anchor=hi[k])
+            else:
+                sums = self._slide(state[0], state[1], state[2], lo[k], hi[k])
+            state = (sums, lo[k], hi[k])
+            out[k] = self._cov(sums)
+        self.state = state
+        return out
+
+
+# shared memory helpers; arrays are passed to worker processes as (name, shape) and never pickled
+def create_shared_array(shape):
+    size = int(np.prod(shape)) * np.dtype(np.float64).itemsize
+    shm = SharedMemory(create=True, size=max(size, 1))
+    return shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+# workers share the parent's resource tracker, so attaching never unlinks the block on worker exit
+def attach_shared_array(name, shape):
+    shm = SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def release_shared_arrays(*shms):
+    for shm in shms:
+        shm.close()
+        shm.unlink()
+
+
+_worker_state = {}
+
+
+def _init_covariance_worker(returns_spec, out_spec, lo, hi, halflife, refresh_every):
+    returns_shm, returns = attach_shared_array(*returns_spec)
+    out_shm, out = attach_shared_array(*out_spec)
+    _worker_state.update({
+        'engine': rollingCovariance(returns, halflife=halflife, refresh_every=refresh_every),
+        'out': out,
+        'lo': lo,
+        'hi': hi,
+        'shms': (returns_shm, out_shm)
+    })
+
+
+def _run_covariance_block(block):
+    k0, k1 = block
+    state = _worker_state
+    state['engine'].covariances(state['lo'][k0:k1], state['hi'][k0:k1], offset=k0, out=state['out'][k0:k1])
+    return block
+
+
+# contiguous blocks of dates for n_workers, each starting on a refresh boundary so every block begins
+# with a from-scratch rebuild exactly where the serial path does one
+def covariance_blocks(n_dates, n_workers, refresh_every=DEFAULT_REFRESH_EVERY):
+    n_refreshes = -(-n_dates // refresh_every)
+    block_size = max(1, -(-n_refreshes // n_workers)) * refresh_every
+    return [(k0, min(k0 + block_size, n_dates)) for k0 in range(0, n_dates, block_size)]
+
+
+# same output as rollingCovariance(...).covariances(lo, hi), computed by n_workers processes that share
+# the return matrix and write straight into a preallocated date x N x N tensor in shared memory
+def parallel_covariances(returns, lo, hi, halflife=None, refresh_every=DEFAULT_REFRESH_EVERY, n_workers=None):
+    n_workers = n_workers or os.cpu_count()
+    returns = np.asarray(returns, dtype=np.float64)
+    out_shape = (len(lo), returns.shape[1], returns.shape[1])
+    if n_workers <= 1 or len(lo) <= refresh_every:
+        return rollingCovariance(returns, halflife=halflife, refresh_every=refresh_every).covariances(lo, hi)
+
+    returns_shm, shared_returns = create_shared_array(returns.shape)
+    out_shm, out = create_shared_array(out_shape)
+    try:
+        shared_returns[:] = returns
+        blocks = covariance_blocks(len(lo), n_workers, refresh_every=refresh_every)
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(blocks)), initializer=_init_covariance_worker,
+                                 initargs=((returns_shm.name, returns.shape), (out_shm.name, out_shape),
+                                           np.asarray(lo), np.asarray(hi), halflife, refresh_every)) as executor:
+            list(executor.map(_run_covariance_block, blocks))
+        cov_tensor = out.copy()
+    finally:
+        del shared_returns, out
+        release_shared_arrays(returns_shm, out_shm)
+    return cov_tensor
+
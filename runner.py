@@ -1,15 +1,17 @@
 from cryptotrading.traderBot import traderBot
 from cryptotrading.emailer import send_email
+import cryptotrading.instrumentation as instrumentation
+from cryptotrading.logger_builder import configure_logging
 import argparse
 
-def run_portfolio_rebalance():
-    tb = traderBot()
-    tb.rebalance(warn=False)
+def run_portfolio_rebalance(live=False, checkpoint=None, asynchronous=False, schedule=None):
+    tb = traderBot(live=live, checkpoint=checkpoint)
+    tb.rebalance(warn=False, asynchronous=asynchronous, schedule=schedule)
     tb.log_current_balance()
     send_email()
 
-def test_portfolio_rebalance():
-    tb = traderBot()
+def test_portfolio_rebalance(live=False, checkpoint=None):
+    tb = traderBot(live=live, checkpoint=checkpoint)
     print(tb.tradegen())
     input('Press Enter to exit...')
 
@@ -17,9 +19,37 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--rebalance', help='Run portfolio rebalancing', action='store_true')
     parser.add_argument('--test', help='Test portfolio rebalancing', action='store_true')
+    parser.add_argument('--live', help='Only build today\'s factors, risk model and views', action='store_true')
+    parser.add_argument('--checkpoint', help='Pipeline state file; runs resume from it and only compute new dates',
+                        default=None)
+    parser.add_argument('--async-execution', help='Execute orders concurrently, repricing each at its own deadline',
+                        action='store_true')
+    parser.add_argument('--schedule', help='Slice orders by order book depth, evenly or by volume profile',
+                        choices=['twap', 'vwap'], default=None)
+    parser.add_argument('--metrics-json', help='Write stage timings, api latencies and the rebalance timeline here',
+                        default=None)
+    parser.add_argument('--metrics-prometheus', help='Write the same metrics here in the prometheus text format',
+                        default=None)
+    parser.add_argument('--log-dir', help='Directory of the daily log files (default $CRYPTOTRADING_LOG_DIR or '
+                        '~/traderBot_log)', default=None)
+    parser.add_argument('--log-json', help='Write the log file as json lines, with order numbers, pairs and '
+                        'latencies as fields', action='store_true')
+    parser.add_argument('--log-rotate', help='Rotate the log file at this interval (e.g. midnight, H) instead of '
+                        'by size', default=None)
     args = parser.parse_args()
 
-    if args.rebalance:
-        run_portfolio_rebalance()
-    elif args.test:
-        test_portfolio_rebalance()
+    configure_logging(log_dir=args.log_dir, json_lines=args.log_json, when=args.log_rotate, force=True)
+
+    if args.metrics_json is not None or args.metrics_prometheus is not None:
+        instrumentation.enable()
+    try:
+        if args.rebalance:
+            run_portfolio_rebalance(live=args.live, checkpoint=args.checkpoint, asynchronous=args.async_execution,
+                                    schedule=args.schedule)
+        elif args.test:
+            test_portfolio_rebalance(live=args.live, checkpoint=args.checkpoint)
+    finally:
+        if args.metrics_json is not None:
+            instrumentation.current().write_json(args.metrics_json)
+        if args.metrics_prometheus is not None:
+            instrumentation.current().write_prometheus(args.metrics_prometheus)
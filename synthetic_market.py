@@ -0,0 +1,123 @@
+import json
+import time
+import zlib
+
+import numpy as np
+
+from cryptotrading.poloneix_api import DEFAULT_CHUNK_SIZE
+
+# synthetic exchange for benchmarks and offline runs
+# generates OHLCV bars for any universe size, history length and bar period, and answers the public calls
+# dataBot makes (returnTicker, returnChartData, returnChartDataStream, returnBalances) with payloads shaped
+# like the poloniex client's. bars are deterministic for a given seed, pair and period
+
+CHART_PERIODS = (300, 900, 1800, 7200, 14400, 86400)
+SECONDS_IN_A_DAY = 24 * 3600
+SECONDS_IN_A_YEAR = 365.0 * SECONDS_IN_A_DAY
+
+# what the exchange returns for a range without bars
+EMPTY_CHART_DATA = [{'date': 0, 'high': 0, 'low': 0, 'open': 0, 'close': 0, 'volume': 0, 'quoteVolume': 0,
+                     'weightedAverage': 0}]
+
+
+class syntheticMarket():
+    def __init__(self, n_assets=20, history_days=365, home='BTC', end=None, seed=0, annual_vol=0.8,
+                 late_listing_fraction=0.2):
+        # LTC is always listed; dataBot takes the home currency's bar dates from BTC_LTC
+        self.home = home
+        self.currencies = ['LTC'] + ['S%03d' % k for k in range(1, n_assets)]
+        self.pairs = [home + '_' + currency for currency in self.currencies]
+        self.end = int(time.time() if end is None else end)
+        self.start = self.end - int(history_days * SECONDS_IN_A_DAY)
+        self.seed = seed
+        self.annual_vol = annual_vol
+        self.late_listing_fraction = late_listing_fraction  # share of pairs listed part way through the history
+        self._bars = {}
+
+    def _rng(self, *keys):
+        return np.random.RandomState(zlib.crc32('|'.join(str(key) for key in (self.seed,) + keys).encode()))
+
+    # column arrays of every bar of a pair at a period, generated once
+    def bars(self, currencyPair, period):
+        if (currencyPair, period) in self._bars:
+            return self._bars[(currencyPair, period)]
+        if currencyPair not in self.pairs:
+            raise ValueError(currencyPair + ' does not exist!')
+        if period not in CHART_PERIODS:
+            raise ValueError('period not valid!')
+
+        # pair traits (price level, listing, beta, vol, volume scale) are shared by every period
+        traits = self._rng(currencyPair)
+        price, listing, beta, vol_scale, volume_scale = \
+            10 ** traits.uniform(-6, -2), traits.uniform(), traits.uniform(0.5, 1.5), traits.uniform(0.5, 2.0), \
+            10 ** traits.uniform(-1, 1)
+        rng = self._rng(currencyPair, period)
+        market = self._rng('market', period)
+        first = -(-self.start // period) * period
+        if currencyPair != self.pairs[0] and traits.uniform() < self.late_listing_fraction:
+            first += int((0.1 + 0.4 * listing) * (self.end - first)) // period * period
+        dates = np.arange(first, self.end + 1, period, dtype=np.int64)
+
+        # log returns = common market move + pair specific noise; every period's path ends at the pair's price
+        bar_vol = self.annual_vol * (period / SECONDS_IN_A_YEAR) ** 0.5
+        all_dates = np.arange(-(-self.start // period) * period, self.end + 1, period, dtype=np.int64)
+        market_returns = market.normal(0, bar_vol * 0.6, len(all_dates))[len(all_dates) - len(dates):]
+        returns = market_returns * beta + rng.normal(0, bar_vol * vol_scale, len(dates))
+        path = np.cumsum(returns)
+        close = price * np.exp(path - path[-1:])
+        open_ = np.concatenate([close[:1], close[:-1]])
+        spread = np.abs(rng.normal(0, bar_vol / 2, (2, len(dates))))
+        high = np.maximum(open_, close) * (1 + spread[0])
+        low = np.minimum(open_, close) * (1 - spread[1])
+        weighted_average = low + (high - low) * rng.uniform(0.25, 0.75, len(dates))
+        volume = rng.gamma(2.0, volume_scale * period / SECONDS_IN_A_DAY, len(dates))
+
+        bars = {
+            'date': dates,
+            'high': high,
+            'low': low,
+            'open': open_,
+            'close': close,
+            'volume': volume,
+            'quoteVolume': volume / weighted_average,
+            'weightedAverage': weighted_average
+        }
+        self._bars[(currencyPair, period)] = bars
+        return bars
+
+    def chart_data(self, currencyPair, start, end, period):
+        bars = self.bars(currencyPair, period)
+        lo, hi = np.searchsorted(bars['date'], [start, end + 1])
+        if hi <= lo:
+            return EMPTY_CHART_DATA
+        columns = list(bars.keys())
+        return [dict(zip(columns, row)) for row in
+                zip(*[bars[column][lo:hi].tolist() for column in columns])]
+
+    def returnChartData(self, currencyPair, start, end, period):
+        return self.chart_data(currencyPair, start, end, period)
+
+    # the chart data's json text in chunks, as the poloniex client streams it
+    def returnChartDataStream(self, currencyPair, start, end, period, chunk_size=DEFAULT_CHUNK_SIZE):
+        payload = json.dumps(self.chart_data(currencyPair, start, end, period)).encode()
+        for k in range(0, len(payload), chunk_size):
+            yield payload[k:k + chunk_size]
+
+    def returnTicker(self):
+        ticker = {}
+        for currencyPair in self.pairs:
+            bars = self.bars(currencyPair, SECONDS_IN_A_DAY)
+            last = bars['close'][-1] if len(bars['close']) > 0 else 0.0
+            ticker[currencyPair] = {
+                'last': '%.8f' % last,
+                'lowestAsk': '%.8f' % (last * 1.001),
+                'highestBid': '%.8f' % (last * 0.999),
+                'baseVolume': '%.8f' % bars['volume'][-1:].sum(),
+                'isFrozen': '0'
+            }
+        return ticker
+
+    def returnBalances(self):
+        balances = {currency: '0.00000000' for currency in self.currencies}
+        balances[self.home] = '1.00000000'
+        return balances
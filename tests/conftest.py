@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+# the modules import each other as cryptotrading.<module>, i.e. from a checkout named cryptotrading on the
+# path; a checkout under any other name is mapped onto that package here
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+try:
+    import cryptotrading.bar_store  # noqa: F401
+except ImportError:
+    package = types.ModuleType('cryptotrading')
+    package.__path__ = [ROOT]
+    sys.modules['cryptotrading'] = package
+
+# logs and the pair cache of the code under test stay out of the home directory
+os.environ.setdefault('CRYPTOTRADING_LOG_DIR', tempfile.mkdtemp(prefix='cryptotrading_logs_'))
+os.environ.setdefault('CRYPTOTRADING_CACHE_DIR', tempfile.mkdtemp(prefix='cryptotrading_cache_'))
+
+
+@pytest.fixture
+def market():
+    from cryptotrading.synthetic_market import syntheticMarket
+    return syntheticMarket(n_assets=4, history_days=30, seed=3)
+
+
+# a poloniex client on a local stand-in exchange over the market fixture; fills come quickly, as the
+# stand-in's market runs a day every 4 seconds
+@pytest.fixture
+def standin(market):
+    import cryptotrading.poloneix_api as polo_api
+    from cryptotrading.polo_standin import standinExchange, standinServer
+    exchange = standinExchange(market=market, balances={'BTC': 5.0, 'LTC': 20000.0}, book_refresh=0.05,
+                               time_scale=6 * 3600, seed=1)
+    with standinServer(exchange) as server:
+        client = polo_api.poloniex('k', 's', base_url=server.url)
+        yield exchange, client
+        client.transport.close()
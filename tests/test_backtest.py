@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from cryptotrading.backtest import run_backtest_grid
+
+
+# the per-portfolio pandas backtest the grid replaces
+def portfolio_returns(asset_returns, views, rule, tcost, lag):
+    views = views.resample(rule).last()
+    gross_by_pair = asset_returns.multiply(views.shift(lag))
+    net = gross_by_pair.sum(axis=1) - views.diff().abs().sum(axis=1) / 2 * tcost
+    return net, gross_by_pair
+
+
+def test_the_grid_matches_the_per_portfolio_backtest():
+    rng = np.random.RandomState(0)
+    dates = pd.date_range('2018-01-01', periods=60, freq='D', tz='UTC')
+    assets = ['BTC', 'LTC', 'ETH']
+    prices = pd.DataFrame(np.exp(np.cumsum(rng.normal(0, 0.02, (len(dates), 3)), axis=0)), index=dates,
+                          columns=assets)
+    views_dict = {name: pd.DataFrame(rng.dirichlet(np.ones(3), len(dates)), index=dates, columns=assets)
+                  for name in ['PORT', 'mom 1m']}
+    # a portfolio that never holds ETH
+    views_dict['mom 1m'] = views_dict['mom 1m'][['BTC', 'LTC']]
+    rules, tcosts, lags = ['D', 'W'], [0.0, 0.0025], [1, 2]
+    returns_by_rule = {rule: prices.resample(rule).last().pct_change(fill_method=None) for rule in rules}
+
+    grid = run_backtest_grid(returns_by_rule, views_dict, rules, tcosts, lags)
+    assert sorted(grid.keys()) == sorted((rule, tcost, lag) for rule in rules for tcost in tcosts for lag in lags)
+    for (rule, tcost, lag), ret_dict in grid.items():
+        for name, views in views_dict.items():
+            net, gross_by_pair = portfolio_returns(returns_by_rule[rule], views, rule, tcost, lag)
+            assert np.allclose(ret_dict['net'][name].values, net.values)
+            assert np.allclose(ret_dict['gross by pair'][name][gross_by_pair.columns].values, gross_by_pair.values,
+                               equal_nan=True)
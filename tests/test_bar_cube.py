@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cryptotrading.bar_cube import barCube
+
+
+def bars(dates, close, volume=None):
+    frame = pd.DataFrame({'close': close}, index=pd.DatetimeIndex(dates, tz='UTC'))
+    if volume is not None:
+        frame['volume'] = volume
+    return frame
+
+
+@pytest.fixture
+def cube():
+    dates = pd.date_range('2018-01-01', periods=6, freq='2h')
+    return barCube.from_frames({
+        'LTC': bars(dates, np.arange(6.0), np.ones(6)),
+        # listed late, on bars that are half an hour off the others and without a volume field
+        'ETH': bars(dates[3:] + pd.Timedelta('30min'), [10.0, 11.0, 12.0])
+    })
+
+
+def test_from_frames_aligns_misaligned_and_late_listed_assets(cube):
+    assert cube.shape == (9, 2, 2)
+    assert list(cube.assets) == ['LTC', 'ETH'] and list(cube.fields) == ['close', 'volume']
+    assert cube.index.is_monotonic_increasing and str(cube.index.tz) == 'UTC'
+
+    close = cube.field('close')
+    assert close['LTC'].dropna().tolist() == list(np.arange(6.0))
+    assert close['ETH'].dropna().tolist() == [10.0, 11.0, 12.0]
+    assert close['ETH'].first_valid_index() == pd.Timestamp('2018-01-01 06:30', tz='UTC')
+    assert close['LTC'].reindex(close['ETH'].dropna().index).isnull().all()
+    assert cube.field('volume')['ETH'].isnull().all()
+
+
+def test_loc_lookups_match_the_panel_ones(cube):
+    close = cube.loc[:, :, 'close']
+    assert close.equals(cube.field('close'))
+    assert cube.loc[:, 'LTC', 'close'].equals(cube['LTC']['close'])
+    assert list(cube.loc[:, ['ETH'], 'close'].columns) == ['ETH']
+    assert list(cube.loc[:, 'LTC', ['volume']].columns) == ['volume']
+    selected = cube.loc[:, ['ETH', 'LTC'], ['close']]
+    assert isinstance(selected, barCube) and list(selected.assets) == ['ETH', 'LTC']
+    assert np.array_equal(selected.field('close')['LTC'].values, close['LTC'].values, equal_nan=True)
+
+    with pytest.raises(KeyError):
+        cube.loc['2018-01-01 02:00']
+    with pytest.raises(KeyError):
+        cube.select(assets=['XMR'])
+
+
+def test_slice_dates_is_label_inclusive_and_shares_memory(cube):
+    window = cube.slice_dates('2018-01-01 02:00', '2018-01-01 06:30')
+    assert window.index[0] == pd.Timestamp('2018-01-01 02:00', tz='UTC')
+    assert window.index[-1] == pd.Timestamp('2018-01-01 06:30', tz='UTC')
+    assert window.equals(cube.loc['2018-01-01 02:00':'2018-01-01 06:30'])
+    # naive keys are read in the cube's timezone, and an empty range is an empty cube
+    assert len(cube.slice_dates('2018-01-02', None).index) == 0
+
+    assert np.shares_memory(window._data, cube._data)
+
+
+def test_append_merges_the_tail(cube):
+    tail_dates = pd.DatetimeIndex(['2018-01-01 08:30', '2018-01-01 10:00', '2018-01-01 12:00'], tz='UTC')
+    data = np.full((2, 2, 3), np.nan)
+    data[0, 0] = [np.nan, 50.0, 60.0]  # LTC close: a revised and a new bar, nothing at 08:30
+    data[0, 1] = [11.5, np.nan, 13.0]  # ETH close: a revised and a new bar
+    merged = cube.append(barCube(data, tail_dates, cube.assets, cube.fields))
+
+    assert list(merged.index) == list(cube.index) + [pd.Timestamp('2018-01-01 12:00', tz='UTC')]
+    close = merged.field('close')
+    assert close.loc['2018-01-01 08:30', 'ETH'] == 11.5
+    assert close.loc['2018-01-01 10:00', 'LTC'] == 50.0
+    # a NaN in the appended cube keeps the stored value
+    assert close.loc['2018-01-01 10:30', 'ETH'] == 12.0
+    assert close.loc['2018-01-01 12:00'].tolist() == [60.0, 13.0]
+    assert np.array_equal(merged.slice_dates(None, '2018-01-01 06:30')._data,
+                          cube.slice_dates(None, '2018-01-01 06:30')._data, equal_nan=True)
+    assert cube.append(barCube(np.empty((2, 2, 0)), tail_dates[:0], cube.assets, cube.fields)) is cube
+
+    with pytest.raises(ValueError):
+        cube.append(cube.select(assets=['LTC']))
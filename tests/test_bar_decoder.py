@@ -0,0 +1,50 @@
+import json
+
+import numpy as np
+import pytest
+
+from cryptotrading.bar_decoder import chartDataDecoder, decode_chart_data
+from cryptotrading.dataBot import convert_to_df
+
+
+def chunked(payload, size):
+    return [payload[k:k + size] for k in range(0, len(payload), size)]
+
+
+def test_streamed_chunks_match_convert_to_df(market):
+    rows = market.chart_data('BTC_S001', 0, 10 ** 10, 300)
+    expected = convert_to_df(rows)
+    payload = json.dumps(rows).encode()
+    # chunk sizes that split objects, numbers and multi-chunk objects alike
+    for size in [7, 100, 4096, len(payload)]:
+        frame = decode_chart_data(iter(chunked(payload, size)))
+        assert frame.index.equals(expected.index)
+        assert np.array_equal(frame.values, expected[frame.columns].values)
+
+
+def test_list_and_dict_feeds():
+    rows = [{'date': 300 * k, 'close': float(k), 'volume': 2.0 * k} for k in range(1, 2000)]
+    times, columns = chartDataDecoder().feed(rows[:1000]).feed(rows[1000]).feed(rows[1001:]).finish().arrays()
+    assert list(times) == [row['date'] for row in rows]
+    assert list(columns['volume']) == [row['volume'] for row in rows]
+
+
+def test_missing_columns_and_strings_fall_back_per_bar():
+    rows = [{'date': 300, 'close': 1.0, 'volume': 1.0}, {'date': 600, 'close': 2.0},
+            {'date': 900, 'close': '3.5', 'volume': 1.0}]
+    times, columns = chartDataDecoder(columns=['close', 'volume']).feed(json.dumps(rows)).finish().arrays()
+    assert list(times) == [300, 600, 900]
+    assert list(columns['close']) == [1.0, 2.0, 3.5]
+    assert np.isnan(columns['volume'][1])
+
+
+def test_error_and_truncated_payloads():
+    with pytest.raises(IOError, match='Invalid currency pair'):
+        decode_chart_data(iter([b'{"error": "Invalid currency ', b'pair {}."}']))
+    with pytest.raises(ValueError):
+        decode_chart_data(iter([b'[{"date": 300, "close": 1.0}, {"date": 600, "clo']))
+
+
+def test_dtype():
+    frame = decode_chart_data('[{"date": 300, "close": 1.5}]', dtype=np.float32)
+    assert frame['close'].dtype == np.float32
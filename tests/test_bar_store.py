@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from cryptotrading.bar_store import barStore, BAR_COLUMNS
+from cryptotrading.bar_decoder import epoch_to_index
+
+
+def chart_rows(dates, close):
+    return [{'date': int(date), 'high': value * 1.01, 'low': value * 0.99, 'open': value, 'close': value,
+             'volume': 1.0, 'quoteVolume': 1.0 / value if value > 0 else 0.0, 'weightedAverage': value}
+            for date, value in zip(dates, close)]
+
+
+def test_append_then_read_round_trips(tmp_path):
+    store = barStore(str(tmp_path))
+    dates = np.arange(10) * 300 + 300
+    store.append('BTC_LTC', 300, chart_rows(dates, np.linspace(1.0, 2.0, 10)))
+
+    bars = store.read('BTC_LTC', 300)
+    assert list(bars.columns) == BAR_COLUMNS
+    assert bars.index.equals(epoch_to_index(dates))
+    assert np.allclose(bars['close'].values, np.linspace(1.0, 2.0, 10))
+    assert store.length('BTC_LTC', 300) == 10
+    assert store.last_timestamp('BTC_LTC', 300) == dates[-1]
+    assert list(store.keys()) == [('BTC_LTC', 300)]
+
+
+def test_append_overwrites_from_the_first_new_bar(tmp_path):
+    store = barStore(str(tmp_path))
+    store.append('BTC_LTC', 300, chart_rows([300, 600, 900], [1.0, 2.0, 3.0]))
+    # the still forming last bar comes back revised, followed by a new one
+    store.append('BTC_LTC', 300, chart_rows([900, 1200], [3.5, 4.0]))
+
+    bars = store.read('BTC_LTC', 300)
+    assert bars.index.equals(epoch_to_index(np.array([300, 600, 900, 1200])))
+    assert list(bars['close']) == [1.0, 2.0, 3.5, 4.0]
+
+
+def test_read_range_and_empty_ranges(tmp_path):
+    store = barStore(str(tmp_path))
+    assert store.last_timestamp('BTC_LTC', 300) is None
+    assert len(store.read('BTC_LTC', 300)) == 0
+    # poloniex answers an empty range with a single date=0 row
+    assert store.append('BTC_LTC', 300, chart_rows([0], [0.0])) == 0
+
+    store.append('BTC_LTC', 300, chart_rows([300, 600, 900, 1200], [1.0, 2.0, 3.0, 4.0]))
+    bars = store.read('BTC_LTC', 300, start=600, end=900, dtype=np.float32)
+    assert list(bars['close']) == [2.0, 3.0]
+    assert bars['close'].dtype == np.float32
+
+
+def test_drop(tmp_path):
+    store = barStore(str(tmp_path))
+    store.append('BTC_LTC', 300, chart_rows([300], [1.0]))
+    store.drop('BTC_LTC', 300)
+    assert store.length('BTC_LTC', 300) == 0
+
+
+def test_earlier_bars_merge_in_front(tmp_path):
+    store = barStore(str(tmp_path))
+    store.append('BTC_LTC', 300, chart_rows([900, 1200], [3.0, 4.0]), start=900)
+    assert store.first_timestamp('BTC_LTC', 300) == 900
+
+    store.append('BTC_LTC', 300, chart_rows([300, 600], [1.0, 2.0]), start=0)
+    bars = store.read('BTC_LTC', 300)
+    assert bars.index.equals(epoch_to_index(np.array([300, 600, 900, 1200])))
+    assert list(bars['close']) == [1.0, 2.0, 3.0, 4.0]
+    assert store.length('BTC_LTC', 300) == 4
+    # the download started before the listing, so the range from 0 counts as stored
+    assert store.first_timestamp('BTC_LTC', 300) == 0
+
+
+def test_a_write_cut_short_leaves_the_untouched_bars_readable(tmp_path):
+    store = barStore(str(tmp_path))
+    store.append('BTC_LTC', 300, chart_rows([300, 600, 900], [1.0, 2.0, 3.0]))
+
+    # a volume column of the wrong length fails the write after the time and price columns were rewritten
+    times = np.array([900, 1200, 1500])
+    with pytest.raises(IndexError):
+        store.append_arrays('BTC_LTC', 300, times, {'close': np.array([3.5, 4.0, 5.0]), 'volume': np.ones(1)})
+    assert store.length('BTC_LTC', 300) == 2
+    bars = store.read('BTC_LTC', 300)
+    assert list(bars['close']) == [1.0, 2.0] and store.last_timestamp('BTC_LTC', 300) == 600
+
+    # the next refresh writes over the debris
+    store.append('BTC_LTC', 300, chart_rows([900, 1200], [3.5, 4.0]))
+    bars = store.read('BTC_LTC', 300)
+    assert bars.index.equals(epoch_to_index(np.array([300, 600, 900, 1200])))
+    assert list(bars['close']) == [1.0, 2.0, 3.5, 4.0] and list(bars['volume']) == [1.0] * 4
@@ -0,0 +1,12 @@
+from cryptotrading.benchmark import run_scenario, compare_with_baseline, STAGES
+
+
+def test_every_stage_runs_on_a_small_market():
+    results = run_scenario(n_assets=3, history_days=120, period=7200, trace_memory=False)
+    assert list(results.keys()) == STAGES
+    assert all(metrics['seconds'] > 0 for metrics in results.values())
+
+    slower = {stage: {'seconds': metrics['seconds'] * 2, 'peak bytes': 0} for stage, metrics in results.items()}
+    comparison = compare_with_baseline({'small': slower}, {'small': results})
+    assert comparison.loc[comparison['metric'] == 'seconds', 'regression'].all()
+    assert not comparison.loc[comparison['metric'] == 'peak bytes', 'regression'].any()
@@ -0,0 +1,41 @@
+from cryptotrading.dataBot import dataBot
+
+
+def make_bot(market, **settings):
+    region = [market.home] + market.currencies
+    return dataBot(region=region, home=market.home, freq=7200, client=market, requests_per_second=None, **settings)
+
+
+def test_refresh_keeps_the_version_only_for_identical_bars(market):
+    bot = make_bot(market)
+    bot.get_intraday_data()
+    version = bot.data_version
+
+    bot.refresh_intraday_data()
+    assert bot.data_version == version
+
+    # a revised bar far back in the history
+    market.bars('BTC_S001', 7200)['close'][10] *= 1.01
+    bot.refresh_intraday_data()
+    assert bot.data_version == version + 1
+
+
+def test_a_store_seeded_by_a_live_run_serves_the_full_history(market, tmp_path, monkeypatch):
+    full = make_bot(market).get_pair_bars('BTC_S001')
+    live_start = int(full.index[len(full) // 2].timestamp())
+
+    # a live run only loads the recent history into the store
+    live = make_bot(market, store=str(tmp_path), start=live_start).get_pair_bars('BTC_S001', start=live_start)
+    assert len(live) < len(full)
+
+    stored = make_bot(market, store=str(tmp_path)).get_pair_bars('BTC_S001')
+    assert stored.index.equals(full.index)
+    assert stored.equals(full)
+
+    # the early history is only fetched once
+    calls = []
+    market_stream = market.returnChartDataStream
+    monkeypatch.setattr(market, 'returnChartDataStream',
+                        lambda *args, **kwargs: calls.append(args) or market_stream(*args, **kwargs))
+    make_bot(market, store=str(tmp_path)).get_pair_bars('BTC_S001')
+    assert [call[1] for call in calls] == [int(full.index[-1].timestamp())]
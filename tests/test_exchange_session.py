@@ -0,0 +1,75 @@
+import threading
+import time
+
+from cryptotrading.dataBot import dataBot
+from cryptotrading.exchange_session import pair_universe, read_pairs, write_pairs
+
+
+# a market whose ticker is slow and counted
+class slowTicker:
+    def __init__(self, market, delay=0.1):
+        self.market = market
+        self.delay = delay
+        self.calls = 0
+
+    def returnTicker(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.market.returnTicker()
+
+
+def test_concurrent_first_calls_share_one_universe(market):
+    client = slowTicker(market)
+    universes = []
+    threads = [threading.Thread(target=lambda: universes.append(pair_universe(client))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(universes) == 8 and all(universe is universes[0] for universe in universes)
+    assert client.calls == 1
+    assert sorted(universes[0].pairs) == sorted(market.pairs)
+
+
+def test_pairs_files_are_used_and_refreshed_when_stale(market, tmp_path):
+    path = str(tmp_path / 'pairs.json')
+    write_pairs(path, ['BTC_LTC'], fetched=time.time() - 10)
+
+    client = slowTicker(market, delay=0.0)
+    assert pair_universe(client, path=path, refresh_interval=3600).pairs == ['BTC_LTC']
+    assert client.calls == 0
+
+    stale_client = slowTicker(market, delay=0.0)
+    assert pair_universe(stale_client, path=path, refresh_interval=1).pairs == ['BTC_LTC']
+    for _ in range(100):
+        if sorted(read_pairs(path)[1]) == sorted(market.pairs):
+            break
+        time.sleep(0.01)
+    assert sorted(pair_universe(stale_client, path=path).pairs) == sorted(market.pairs)
+
+
+def test_data_bot_resolves_pairs_without_ticker_fetches(market):
+    client = slowTicker(market, delay=0.0)
+    bot = dataBot(region=[market.home] + market.currencies, home=market.home, freq=7200, client=client,
+                  requests_per_second=None)
+    bot.market.ttl = 0.0  # every quote would be a fresh fetch
+    for _ in range(3):
+        assert 'BTC_S001' in bot.pairs
+    assert client.calls == 1
+
+
+def test_a_slow_fetch_holds_up_no_other_client(market):
+    warm = slowTicker(market, delay=0.0)
+    pair_universe(warm)
+    slow = slowTicker(market, delay=0.5)
+    loading = threading.Thread(target=pair_universe, args=(slow,))
+    loading.start()
+    time.sleep(0.1)
+
+    start = time.perf_counter()
+    pair_universe(warm)
+    pair_universe(slowTicker(market, delay=0.0))
+    assert time.perf_counter() - start < 0.2
+    loading.join()
+    assert slow.calls == 1
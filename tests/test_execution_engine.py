@@ -0,0 +1,89 @@
+import pytest
+
+from cryptotrading.execution_engine import executionEngine, resolve_order, limit_price
+from cryptotrading.market_snapshot import pairIndex
+
+
+def last_price(client, pair):
+    return float(client.returnTicker()[pair]['last'])
+
+
+def test_resolve_order_and_limit_price():
+    pairs = pairIndex(['BTC_LTC', 'BTC_ETH'])
+    assert resolve_order(('LTC', 'BTC', 2.0, None), pairs) == ('BTC_LTC', 'BUY', 2.0)
+    assert resolve_order(('BTC', 'LTC', None, 3.0), pairs) == ('BTC_LTC', 'SELL', 3.0)
+    assert limit_price('BUY', 99.0, 101.0, 0.5) == 98.0
+    assert limit_price('SELL', 99.0, 101.0, 0.5) == 102.0
+
+
+@pytest.mark.parametrize('tracking', ['open orders', 'trades'])
+def test_orders_fill_against_the_standin(standin, tracking):
+    exchange, client = standin
+    # someone else's resting order on the account must survive
+    other = client.buy('BTC_S003', last_price(client, 'BTC_S003') * 0.5, 0.05 / last_price(client, 'BTC_S003'))
+
+    engine = executionEngine(client, passive_attempts=1, order_timeout=0.5, min_poll=0.05, max_poll=0.2, tracking=tracking,
+                             requests_per_second=None)
+    orders = [('S001', 'BTC', 0.1 / last_price(client, 'BTC_S001'), None),
+              ('S002', 'BTC', 0.1 / last_price(client, 'BTC_S002'), None),
+              ('BTC', 'LTC', None, 50.0),
+              ('S002', 'BTC', 10 ** 9, None)]  # more than the account can pay for
+    results = engine.execute(orders)
+
+    assert [result['pair'] for result in results] == ['BTC_S001', 'BTC_S002', 'BTC_LTC', 'BTC_S002']
+    assert [result['type'] for result in results] == ['BUY', 'BUY', 'SELL', 'BUY']
+    assert [result['status'] for result in results] == ['filled', 'filled', 'filled', 'rejected']
+    for result in results[:3]:
+        assert result['filled'] == pytest.approx(result['amount'], rel=1e-8)
+        assert len(result['order numbers']) == result['attempts'] >= 1
+    assert exchange.balances['LTC'] == pytest.approx(19950.0)
+    assert other['orderNumber'] in [order['orderNumber'] for order in client.returnOpenOrders('BTC_S003')]
+
+
+# an exchange that lists an order only from the second look at the open orders on, and reports its trades
+# only from the second look at them (never, with trades_lag=None)
+class laggingClient:
+    def __init__(self, client, trades_lag=1):
+        self.client = client
+        self.trades_lag = trades_lag
+        self.listed = set()
+        self.looks = {}
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def returnOpenOrders(self, currencyPair):
+        open_orders = self.client.returnOpenOrders(currencyPair)
+        shown = [order for order in open_orders if order['orderNumber'] in self.listed]
+        self.listed.update(order['orderNumber'] for order in open_orders)
+        return shown
+
+    def returnOrderTrades(self, orderNumber):
+        self.looks[orderNumber] = self.looks.get(orderNumber, 0) + 1
+        if self.trades_lag is None or self.looks[orderNumber] <= self.trades_lag:
+            return {'error': 'Order not found, or you are not the person who placed it.'}
+        return self.client.returnOrderTrades(orderNumber)
+
+
+def test_orders_not_listed_yet_are_not_taken_for_done(standin):
+    exchange, client = standin
+    engine = executionEngine(laggingClient(client), passive_attempts=1, order_timeout=1.0, min_poll=0.05,
+                             max_poll=0.1, requests_per_second=None)
+    [result] = engine.execute([('BTC', 'LTC', None, 50.0)])
+
+    assert result['status'] == 'filled'
+    assert result['filled'] == pytest.approx(50.0, rel=1e-8)
+    # no second order was placed while the first still rested
+    assert exchange.balances['LTC'] == pytest.approx(19950.0)
+    assert client.returnOpenOrders('BTC_LTC') == []
+
+
+def test_fills_on_placement_count_without_trade_reports(standin):
+    exchange, client = standin
+    # a limit two spreads through the touch fills on arrival
+    engine = executionEngine(laggingClient(client, trades_lag=None), passive_attempts=1, limit_x_spread=-2.0,
+                             order_timeout=1.0, min_poll=0.05, max_poll=0.1, requests_per_second=None)
+    [result] = engine.execute([('BTC', 'LTC', None, 5.0)])
+
+    assert (result['status'], result['attempts']) == ('filled', 1)
+    assert exchange.balances['LTC'] == pytest.approx(19995.0)
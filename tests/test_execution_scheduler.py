@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from cryptotrading.execution_scheduler import executionScheduler, slice_weights, book_levels, levels_within, \
+    covering_rate
+
+
+def test_book_levels_and_covering_rate():
+    book = {'asks': [['1.02', '2'], ['1.01', '1'], ['1.5', '9']], 'bids': [['0.98', '1'], ['0.99', '3']]}
+    asks = book_levels(book, 'BUY')
+    assert asks == [(1.01, 1.0), (1.02, 2.0), (1.5, 9.0)]
+    assert book_levels(book, 'SELL') == [(0.99, 3.0), (0.98, 1.0)]
+    assert levels_within(asks, 0.05) == asks[:2]
+    assert covering_rate(asks, 2.5) == 1.02
+    assert covering_rate(asks, 100.0) == 1.5
+
+
+def test_slice_weights():
+    assert np.allclose(slice_weights('twap', 4, 0, 60), 0.25)
+    # volume at 00:00-00:05 is three times that at 00:05-00:10 on every profile day
+    bar_dates = np.array([day * 86400 + offset for day in range(3) for offset in [0, 300]])
+    bar_volumes = np.array([3.0, 1.0] * 3)
+    assert np.allclose(slice_weights('vwap', 2, 0, 300, bar_dates, bar_volumes), [0.75, 0.25])
+    # no profile for the slices' times of day: even split
+    assert np.allclose(slice_weights('vwap', 2, 3600, 300, bar_dates, bar_volumes), 0.5)
+
+
+@pytest.mark.parametrize('style', ['twap', 'vwap'])
+def test_parent_orders_fill_in_slices_by_the_horizon(standin, style):
+    exchange, client = standin
+    ticker = client.returnTicker()
+    scheduler = executionScheduler(client, style=style, horizon=1.0, slice_interval=0.25, min_poll=0.02,
+                                   max_poll=0.1, requests_per_second=None, profile_days=2)
+    orders = [('S001', 'BTC', 0.3 / float(ticker['BTC_S001']['last']), None), ('BTC', 'LTC', None, 30.0)]
+    results = scheduler.execute(orders)
+
+    assert [result['status'] for result in results] == ['filled', 'filled']
+    for result in results:
+        assert result['filled'] == pytest.approx(result['amount'], rel=1e-8)
+        assert 2 <= result['attempts'] <= 4
+        # children are done by the end of their slice, none is left resting
+        assert client.returnOpenOrders(result['pair']) == []
+    assert exchange.balances['LTC'] == pytest.approx(20000.0 - 30.0)
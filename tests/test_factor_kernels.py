@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from cryptotrading.factor_kernels import ewma_means, rolling_moments, window_sums, moments_std, moments_skew, \
+    moments_adjusted_skew
+
+
+def daily_returns(n_rows=400, n_assets=4, seed=0, halt=True):
+    rng = np.random.RandomState(seed)
+    returns = rng.normal(0, 0.04, (n_rows, n_assets))
+    returns[rng.uniform(size=returns.shape) < 0.1] = np.nan
+    returns[:50, 2] = np.nan  # a late listing
+    if halt:
+        returns[200:230, 3] = np.nan  # a trading halt
+    return returns
+
+
+def test_ewma_means_match_pandas_for_every_com():
+    returns = daily_returns()
+    coms = [5.0, 20.0, 60.0]
+    stacked = np.hstack([returns] * len(coms))
+    stacked_coms = np.repeat(coms, returns.shape[1])
+    means, _ = ewma_means(stacked, stacked_coms, stacked_coms)
+    for k, com in enumerate(coms):
+        expected = pd.DataFrame(returns).ewm(com=com, min_periods=com).mean().values
+        block = means[:, k * returns.shape[1]:(k + 1) * returns.shape[1]]
+        assert np.allclose(block, expected, rtol=1e-12, atol=1e-16, equal_nan=True)
+
+
+def test_ewma_state_extends_a_series():
+    returns = daily_returns(seed=1)
+    full, _ = ewma_means(returns, 20.0, 20.0)
+    head, state = ewma_means(returns[:150], 20.0, 20.0)
+    tail, _ = ewma_means(returns[150:], 20.0, 20.0, state=state)
+    assert np.array_equal(np.vstack([head, tail]), full, equal_nan=True)
+
+
+def test_window_sums_match_direct_sums():
+    terms = np.random.RandomState(2).normal(size=(103, 3))
+    for window in [1, 5, 20, 103, 200]:
+        expected = np.array([terms[max(0, t - window + 1):t + 1].sum(0) for t in range(len(terms))])
+        assert np.allclose(window_sums(terms, window), expected, rtol=1e-12, atol=1e-12)
+
+
+def test_rolling_moments_match_pandas_with_gaps_and_outliers():
+    # pandas' rolling skew turns NaN for good after a window without observations, so no halt here
+    returns = daily_returns(seed=3, halt=False)
+    returns[100, 0] = 2.5
+    returns[300, 1] = -0.9
+    moments = rolling_moments(returns, {5, 20, 60})
+    frame = pd.DataFrame(returns)
+    for window in [5, 20, 60]:
+        rolling = frame.rolling(window, min_periods=window - 5)
+        assert np.allclose(moments_std(moments[window], window - 5), rolling.std().values, rtol=1e-8,
+                           equal_nan=True)
+        assert np.allclose(moments_skew(moments[window], window - 5), rolling.skew().values, rtol=1e-6,
+                           atol=1e-8, equal_nan=True)
+        sums = [(frame ** k).rolling(window, min_periods=window - 5).sum().values for k in range(1, 5)]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            expected = (sums[2] - sums[3] / sums[1] * sums[0]) / sums[1] ** 1.5
+        assert np.allclose(moments_adjusted_skew(moments[window], window - 5), expected, rtol=1e-8,
+                           equal_nan=True)
+
+
+# skew and std of every window by direct two-pass sums
+def two_pass(column, window, min_periods):
+    skew, std = np.full(len(column), np.nan), np.full(len(column), np.nan)
+    for t in range(len(column)):
+        x = column[max(0, t - window + 1):t + 1]
+        x = x[~np.isnan(x)]
+        if len(x) >= max(min_periods, 3):
+            n, d = len(x), x - x.mean()
+            skew[t] = np.sqrt(n * (n - 1)) * (d ** 3).mean() / ((n - 2) * (d ** 2).mean() ** 1.5)
+            std[t] = np.sqrt((d ** 2).sum() / (n - 1))
+    return skew, std
+
+
+def test_an_old_outlier_leaves_no_error_behind():
+    # running sums differenced over the whole history lose every later window to the outlier's round-off
+    returns = daily_returns(n_rows=5000, seed=4)[:, 3:]
+    returns[10, 0] = 1e3
+    moments = rolling_moments(returns, {60})
+    skew, std = two_pass(returns[:, 0], 60, 55)
+    assert np.allclose(moments_skew(moments[60], 55)[:, 0], skew, rtol=1e-9, atol=1e-9, equal_nan=True)
+    assert np.allclose(moments_std(moments[60], 55)[:, 0], std, rtol=1e-10, equal_nan=True)
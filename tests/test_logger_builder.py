@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import threading
+import time
+
+import pytest
+
+import cryptotrading.logger_builder as logger_builder
+from cryptotrading.logger_builder import logger
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    yield str(tmp_path)
+    logger_builder.shutdown_logging()
+
+
+def read_json_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_json_lines_carry_extra_fields(log_dir):
+    path = logger_builder.configure_logging(log_dir=log_dir, json_lines=True, console=False, force=True)
+    logger.info('Order placed', extra={'order_number': '123', 'pair': 'BTC_LTC', 'latency': 0.12})
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        logger.exception('Order failed')
+    logger_builder.flush_logging()
+
+    entries = read_json_lines(path)
+    assert path.endswith('.jsonl') and os.path.dirname(path) == log_dir
+    assert [entry['message'] for entry in entries] == ['logger initiated', 'Order placed', 'Order failed']
+    assert entries[1]['level'] == 'INFO'
+    assert (entries[1]['order_number'], entries[1]['pair'], entries[1]['latency']) == ('123', 'BTC_LTC', 0.12)
+    assert 'ValueError: boom' in entries[2]['exception']
+
+
+def test_a_slow_handler_does_not_hold_up_the_logging_thread(log_dir):
+    logger_builder.configure_logging(log_dir=log_dir, console=False, force=True)
+    written = []
+    release = threading.Event()
+
+    class slowHandler(logging.Handler):
+        def emit(self, record):
+            release.wait(5)
+            written.append(record.getMessage())
+
+    logger_builder._listener.handlers += (slowHandler(),)
+    start = time.perf_counter()
+    for k in range(50):
+        logger.info('record ' + str(k))
+    assert time.perf_counter() - start < 0.5
+    assert len(written) == 0
+
+    release.set()
+    logger_builder.flush_logging()
+    assert written[-1] == 'record 49'
+
+
+def test_files_rotate_on_size(log_dir):
+    path = logger_builder.configure_logging(log_dir=log_dir, max_bytes=1000, backup_count=2, console=False,
+                                            force=True)
+    for k in range(100):
+        logger.info('a record long enough to fill the file quickly ' + str(k))
+    logger_builder.flush_logging()
+
+    assert sorted(os.listdir(log_dir)) == sorted(os.path.basename(path) + suffix for suffix in ['', '.1', '.2'])
+    assert all(os.path.getsize(os.path.join(log_dir, name)) <= 1000 for name in os.listdir(log_dir))
+    with open(path) as f:
+        assert f.read().rstrip().endswith('quickly 99')
+
+
+def test_shutdown_hands_back_to_lazy_configuration(log_dir):
+    logger_builder.configure_logging(log_dir=log_dir, console=False, force=True)
+    logger_builder.shutdown_logging()
+    assert not any(isinstance(handler, logging.handlers.QueueHandler) for handler in logger.handlers)
+
+    # the next record sets logging up again, in $CRYPTOTRADING_LOG_DIR
+    logger.info('after shutdown')
+    assert logger_builder.get_log_path().startswith(os.environ['CRYPTOTRADING_LOG_DIR'])
@@ -0,0 +1,65 @@
+import numpy as np
+
+from cryptotrading.dataBot import dataBot
+from cryptotrading.market_feed import marketFeed, queueTransport, barBuilder
+
+PERIOD = 7200
+
+
+def test_bar_version_moves_only_when_a_bar_closes():
+    builder = barBuilder(PERIOD)
+    builder.update('BTC_LTC', 10 * PERIOD, 1.0)
+    builder.update('BTC_LTC', 10 * PERIOD + 60, 1.5, amount=2.0)
+    assert builder.version == 0
+    assert len(builder.arrays('BTC_LTC', closed=True)[0]) == 0
+
+    # a tick two periods on closes the bar and fills the quiet one flat
+    builder.update('BTC_LTC', 12 * PERIOD + 5, 2.0)
+    assert builder.version == 1
+    times, columns = builder.arrays('BTC_LTC', closed=True)
+    assert list(times) == [10 * PERIOD, 11 * PERIOD]
+    assert list(columns['close']) == [1.5, 1.5]
+    assert list(columns['high']) == [1.5, 1.5]
+    assert list(columns['volume']) == [3.0, 0.0]
+
+
+def tick(feed, pair, date, price):
+    feed.handle({'type': 'ticker', 'pair': pair, 'date': date, 'last': str(price), 'lowestAsk': str(price),
+                 'highestBid': str(price), 'isFrozen': '0'})
+
+
+def test_closed_feed_bars_extend_the_cube_without_a_rebuild(market):
+    region = [market.home] + market.currencies
+    feed = marketFeed(queueTransport(), period=PERIOD)
+    bot = dataBot(region=region, home=market.home, freq=PERIOD, client=market, requests_per_second=None, feed=feed)
+    first = int(market.bars('BTC_S001', PERIOD)['date'][-1]) + PERIOD
+
+    tick(feed, 'BTC_S001', first, 1.0)
+    cube = bot.get_intraday_data()
+    version = bot.data_version
+
+    # ticks inside the forming bar leave the cube and the data version alone
+    tick(feed, 'BTC_S001', first + 60, 1.2)
+    tick(feed, 'BTC_LTC', first + 120, 0.5)
+    assert bot.get_intraday_data() is cube
+    assert bot.data_version == version
+
+    # rolling into the next bar closes it; a lagging pair's bar closing later lands on the same row
+    tick(feed, 'BTC_S001', first + PERIOD, 1.3)
+    extended = bot.get_intraday_data()
+    assert bot.data_version == version + 1
+    assert len(extended.index) == len(cube.index) + 1
+    assert extended.field('close')['S001'].iloc[-1] == 1.2
+    assert np.isnan(extended.field('close')['LTC'].iloc[-1])
+
+    tick(feed, 'BTC_LTC', first + PERIOD + 60, 0.6)
+    extended = bot.get_intraday_data()
+    assert bot.data_version == version + 2
+    assert len(extended.index) == len(cube.index) + 1
+    assert extended.field('close')['LTC'].iloc[-1] == 0.5
+    assert extended.field('close')[market.home].iloc[-1] == 1
+
+    # appending gives what a rebuild from the downloaded history gives
+    rebuilt = dataBot(region=region, home=market.home, freq=PERIOD, client=market, requests_per_second=None,
+                      feed=feed).get_intraday_data()
+    assert extended.equals(rebuilt)
@@ -0,0 +1,88 @@
+import gc
+import threading
+import time
+import weakref
+
+import pytest
+
+from cryptotrading.market_snapshot import marketSnapshot, pairIndex, shared_snapshot
+
+
+# a ticker that counts its fetches, on a clock the test moves by hand
+class countingClient:
+    def __init__(self, market, delay=0.0):
+        self.market = market
+        self.delay = delay
+        self.calls = 0
+
+    def returnTicker(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.market.returnTicker()
+
+
+class manualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_pair_index_resolves_either_order():
+    pairs = pairIndex(['BTC_LTC', 'BTC_ETH', 'ETH_GNT'])
+    assert len(pairs) == 3 and 'BTC_ETH' in pairs and 'ETH_BTC' not in pairs
+    assert pairs.currencies == ['BTC', 'ETH', 'GNT', 'LTC']
+    assert pairs.resolve('BTC', 'LTC') == ('BTC_LTC', 'BTC', 'LTC')
+    assert pairs.resolve('GNT', 'ETH') == ('ETH_GNT', 'ETH', 'GNT')
+    with pytest.raises(ValueError):
+        pairs.resolve('LTC', 'GNT')
+
+
+def test_the_ticker_is_refetched_once_it_is_ttl_old(market):
+    client = countingClient(market)
+    clock = manualClock()
+    snapshot = marketSnapshot(client, ttl=5.0, clock=clock)
+
+    ticker = snapshot.ticker()
+    clock.now = 4.9
+    assert snapshot.ticker() is ticker and snapshot.quote('BTC_LTC') == (
+        float(ticker['BTC_LTC']['highestBid']), float(ticker['BTC_LTC']['lowestAsk']))
+    assert client.calls == 1
+    # a tighter max_age, then the ttl, force a refetch
+    snapshot.ticker(max_age=1.0)
+    assert client.calls == 2
+    clock.now = 10.0
+    snapshot.ticker()
+    snapshot.invalidate()
+    snapshot.ticker()
+    assert client.calls == snapshot.fetches == 4
+    # unchanged listed pairs keep the pair index
+    assert snapshot.pair_index() is snapshot.pair_index() and 'BTC_S001' in snapshot.pair_index()
+
+
+def test_concurrent_callers_of_a_stale_snapshot_share_one_fetch(market):
+    client = countingClient(market, delay=0.1)
+    snapshot = marketSnapshot(client)
+    tickers = []
+    threads = [threading.Thread(target=lambda: tickers.append(snapshot.ticker())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.calls == 1
+    assert all(ticker is tickers[0] for ticker in tickers)
+
+
+def test_shared_snapshots_go_with_their_client(market):
+    client = countingClient(market)
+    snapshot = shared_snapshot(client)
+    assert shared_snapshot(client) is snapshot and shared_snapshot(client, ttl=snapshot.ttl) is snapshot
+    with pytest.raises(ValueError):
+        shared_snapshot(client, ttl=snapshot.ttl + 1.0)
+
+    released = weakref.ref(client)
+    del client, snapshot
+    gc.collect()
+    assert released() is None
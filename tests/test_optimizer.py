@@ -0,0 +1,34 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from cryptotrading.dataBot import dataBot
+from cryptotrading.optimizer import random_weights, simplex_weights, walk_forward_splits, METRICS
+from cryptotrading.synthetic_market import syntheticMarket
+from cryptotrading.traderBot import traderBot
+
+
+def test_simplex_weights_and_walk_forward_splits():
+    weights = simplex_weights(3, step=0.5)
+    assert len(weights) == 6 and np.allclose(weights.sum(axis=1), 1.0) and (weights >= 0).all()
+    assert walk_forward_splits(10, 2) == [(slice(0, 3), slice(3, 6)), (slice(0, 6), slice(6, 10))]
+    assert walk_forward_splits(10, 2, expanding=False)[1] == (slice(3, 6), slice(6, 10))
+
+
+def test_parallel_search_matches_the_serial_one():
+    market = syntheticMarket(n_assets=4, history_days=150, seed=3)
+    region = [market.home] + market.currencies
+    data = dataBot(region=region, home=market.home, freq=7200, client=market, requests_per_second=None)
+    start_date = (datetime.datetime.fromtimestamp(market.start) + datetime.timedelta(days=100)).date()
+    tb = traderBot(region=region, home=market.home, price_data_frequency_in_seconds=7200, start_date=start_date,
+                   data=data)
+
+    candidates = pd.DataFrame(random_weights(len(tb.factor_weights), 40, seed=0),
+                              columns=list(tb.factor_weights.keys()))
+    serial = tb.optimize_factor_weights(candidates, n_splits=2, n_workers=1)
+    parallel = tb.optimize_factor_weights(candidates, n_splits=2, n_workers=2)
+
+    assert len(serial) == 40 * 2 and list(serial.columns) == list(candidates.columns) + METRICS
+    assert np.isfinite(serial['test net sharpe']).all()
+    pd.testing.assert_frame_equal(serial, parallel)
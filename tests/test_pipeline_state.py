@@ -0,0 +1,62 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from cryptotrading.dataBot import dataBot
+from cryptotrading.pipeline_state import load_pipeline_state, max_scaled_difference
+from cryptotrading.synthetic_market import syntheticMarket
+from cryptotrading.traderBot import traderBot
+
+
+# the market as it looked at cutoff: no bars after it
+class marketAsOf:
+    def __init__(self, market, cutoff):
+        self.market = market
+        self.cutoff = cutoff
+
+    def __getattr__(self, name):
+        return getattr(self.market, name)
+
+    def returnChartDataStream(self, currencyPair, start, end, period, **kwargs):
+        return self.market.returnChartDataStream(currencyPair, start, min(end, self.cutoff), period, **kwargs)
+
+
+@pytest.fixture
+def market():
+    return syntheticMarket(n_assets=4, history_days=150, seed=5)
+
+
+def bot(market, client, checkpoint=None):
+    region = [market.home] + market.currencies
+    data = dataBot(region=region, home=market.home, freq=7200, client=client, requests_per_second=None)
+    start_date = (datetime.datetime.fromtimestamp(market.start) + datetime.timedelta(days=100)).date()
+    return traderBot(region=region, home=market.home, price_data_frequency_in_seconds=7200, start_date=start_date,
+                     data=data, checkpoint=checkpoint)
+
+
+def test_a_resumed_pipeline_matches_a_full_run(market, tmp_path):
+    checkpoint = str(tmp_path / 'pipeline.pkl')
+    earlier = bot(market, marketAsOf(market, market.end - 10 * 86400), checkpoint=checkpoint)
+    resumed_state = load_pipeline_state(checkpoint, earlier.get_pipeline_fingerprint())
+    assert resumed_state is not None
+
+    resumed = bot(market, market, checkpoint=checkpoint)
+    full = bot(market, market)
+
+    assert set(resumed.factors.keys()) == set(full.factors.keys())
+    for factor_name in full.factors.keys():
+        assert max_scaled_difference(resumed.factors[factor_name], full.factors[factor_name]) <= 1e-8
+    assert all(max_scaled_difference(a, b) <= 1e-8 for a, b in zip(resumed.cov.arrays(), full.cov.arrays()))
+    for view_name in full.views.keys():
+        assert max_scaled_difference(resumed.views[view_name], full.views[view_name]) <= 1e-8
+    assert (resumed.check_pipeline_consistency() <= 1e-8).all()
+
+
+def test_a_checkpoint_under_other_settings_is_ignored(market, tmp_path):
+    checkpoint = str(tmp_path / 'pipeline.pkl')
+    tb = bot(market, market, checkpoint=checkpoint)
+    fingerprint = tb.get_pipeline_fingerprint()
+    assert load_pipeline_state(checkpoint, fingerprint) is not None
+    assert load_pipeline_state(checkpoint, dict(fingerprint, **{'cov window': tb.cov_window + 1})) is None
+    assert np.isfinite(tb.check_pipeline_consistency()).all()
@@ -0,0 +1,180 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import cryptotrading.instrumentation as instrumentation
+from cryptotrading.polo_standin import standinExchange, standinServer
+from cryptotrading.poloneix_api import httpTransport, poloniex
+
+
+# GET answers a body that is not json, POST answers too late for the client's read timeout
+class _brokenHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._respond(b'<html>maintenance</html>')
+
+    def do_POST(self):
+        time.sleep(0.3)
+        self._respond(b'{}')
+
+    def _respond(self, body):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def broken_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _brokenHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:' + str(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_calls_that_raise_are_recorded_as_errors(broken_server):
+    collected = instrumentation.enable()
+    try:
+        transport = httpTransport(base_url=broken_server, timeout=(1.0, 0.1), max_retries=2)
+        with pytest.raises(ValueError):
+            transport.get('/public', {'command': 'returnTicker'})
+        # a read timeout on a private call is never retried, the order may have reached the exchange
+        with pytest.raises(requests.ReadTimeout):
+            transport.post('/tradingApi', lambda: ({'command': 'buy'}, {}), endpoint='buy')
+        transport.close()
+    finally:
+        instrumentation.disable()
+
+    for endpoint in ['returnTicker', 'buy']:
+        assert collected.api[endpoint]['count'] == 1
+        assert collected.api[endpoint]['errors'] == 1
+        assert collected.api[endpoint]['retries'] == 0
+
+
+
+def concurrent_balances(client, n):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.returnBalances())) for _ in range(n)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [float(result['BTC']) for result in results], time.perf_counter() - start
+
+
+def test_private_calls_overlap(market):
+    exchange = standinExchange(market=market, balances={'BTC': 1.0})
+    with standinServer(exchange, latency=0.3) as server:
+        client = poloniex('k', 's', base_url=server.url)
+        balances, elapsed = concurrent_balances(client, 4)
+        client.transport.close()
+
+    assert balances == [1.0] * 4
+    # one at a time would take at least 4 x 0.3 seconds
+    assert elapsed < 1.0
+
+
+def test_calls_rejected_for_their_nonce_are_signed_again(market):
+    exchange = standinExchange(market=market, balances={'BTC': 1.0})
+    # the jitter lets later nonces overtake earlier ones on the way to the exchange
+    with standinServer(exchange, latency=0.05, latency_jitter=0.1) as server:
+        client = poloniex('k', 's', base_url=server.url)
+        balances, elapsed = concurrent_balances(client, 8)
+        client.transport.close()
+
+    assert balances == [1.0] * 8
+
+
+class stubResponse:
+    def __init__(self, status_code, body, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def json(self):
+        return self.body
+
+    def close(self):
+        pass
+
+
+# a session answering from a script: responses are returned, exceptions raised
+class stubSession:
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.requests.append((method, kwargs))
+        outcome = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def stub_transport(script, max_retries=3):
+    transport = httpTransport(base_url='http://exchange', max_retries=max_retries, backoff=0.0)
+    transport.session = stubSession(script)
+    return transport
+
+
+def test_rate_limited_calls_are_retried_after_the_servers_delay():
+    collected = instrumentation.enable()
+    try:
+        transport = stub_transport([stubResponse(429, {'error': 'slow down'}, {'Retry-After': '0.2'}),
+                                    stubResponse(200, {'BTC_LTC': {}})])
+        start = time.perf_counter()
+        assert transport.get('/public', {'command': 'returnTicker'}) == {'BTC_LTC': {}}
+        assert time.perf_counter() - start >= 0.2
+        # a 429 on a private call is retried too, and signed again
+        signatures = iter(range(10))
+        transport.session = stubSession([stubResponse(429, {}, {'Retry-After': '0'}), stubResponse(200, {})])
+        transport.post('/tradingApi', lambda: ({'nonce': next(signatures)}, {}), endpoint='buy')
+    finally:
+        instrumentation.disable()
+
+    assert [kwargs['data'] for _, kwargs in transport.session.requests] == [{'nonce': 0}, {'nonce': 1}]
+    assert (collected.api['returnTicker']['retries'], collected.api['returnTicker']['errors']) == (1, 0)
+    assert collected.api['buy']['retries'] == 1
+
+
+def test_public_calls_give_up_after_max_retries():
+    transport = stub_transport([stubResponse(503, {'error': 'down'})], max_retries=3)
+    assert transport.get('/public', {'command': 'returnTicker'}) == {'error': 'down'}
+    assert len(transport.session.requests) == 4
+
+    transport = stub_transport([requests.ConnectionError('reset')], max_retries=2)
+    with pytest.raises(requests.ConnectionError):
+        transport.get('/public', {'command': 'returnTicker'})
+    assert len(transport.session.requests) == 3
+
+
+def test_calls_that_may_have_reached_the_exchange_are_not_retried():
+    # a private call is only retried when it cannot have been executed
+    for outcome in [stubResponse(500, {'error': 'internal'}), requests.ReadTimeout('late'),
+                    requests.ConnectionError('reset')]:
+        transport = stub_transport([outcome, stubResponse(200, {})])
+        if isinstance(outcome, Exception):
+            with pytest.raises(type(outcome)):
+                transport.post('/tradingApi', lambda: ({}, {}), endpoint='sell')
+        else:
+            assert transport.post('/tradingApi', lambda: ({}, {}), endpoint='sell') == {'error': 'internal'}
+        assert len(transport.session.requests) == 1
+
+    # nor are public calls on a client error
+    transport = stub_transport([stubResponse(404, {'error': 'not found'}), stubResponse(200, {})])
+    assert transport.get('/public', {'command': 'returnTicker'}) == {'error': 'not found'}
+    assert len(transport.session.requests) == 1
+
+    # a connect timeout never reached it
+    transport = stub_transport([requests.ConnectTimeout('no route'), stubResponse(200, {'orderNumber': '1'})])
+    assert transport.post('/tradingApi', lambda: ({}, {}), endpoint='sell') == {'orderNumber': '1'}
+    assert len(transport.session.requests) == 2
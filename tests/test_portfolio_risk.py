@@ -0,0 +1,54 @@
+import numpy as np
+
+from cryptotrading.portfolio_risk import batch_portfolio_variances, batch_low_rank_portfolio_variances
+
+
+# w @ cov @ w over the assets with a view and a covariance column, one portfolio and date at a time
+def loop_variances(views, cov):
+    variances = np.empty(views.shape[:2])
+    for p in range(views.shape[0]):
+        for d in range(views.shape[1]):
+            available = ~np.isnan(views[p, d]) & ~np.isnan(cov[d]).all(axis=0)
+            w = views[p, d, available]
+            variances[p, d] = w @ cov[d][np.ix_(available, available)] @ w
+    return variances
+
+
+def random_covariances(rng, n_dates, n_assets):
+    factors = rng.normal(0, 0.02, (n_dates, n_assets, n_assets + 2))
+    return factors @ factors.transpose(0, 2, 1)
+
+
+def test_batched_variances_match_the_loop():
+    rng = np.random.RandomState(0)
+    views = rng.normal(0, 0.3, (3, 5, 6))
+    cov = random_covariances(rng, 5, 6)
+    # assets without views, and assets outside the risk model on some dates
+    views[0, :, 1] = np.nan
+    views[2, 3, [0, 4]] = np.nan
+    cov[1, 2, :] = cov[1, :, 2] = np.nan
+    cov[4, 5, :] = cov[4, :, 5] = np.nan
+
+    assert np.allclose(batch_portfolio_variances(views, cov), loop_variances(views, cov))
+
+
+def test_a_missing_covariance_between_held_assets_is_undefined():
+    rng = np.random.RandomState(1)
+    views = rng.normal(0, 0.3, (2, 3, 4))
+    cov = random_covariances(rng, 3, 4)
+    cov[1, 0, 3] = cov[1, 3, 0] = np.nan
+    variances = batch_portfolio_variances(views, cov)
+
+    assert np.isnan(variances[:, 1]).all() and np.isfinite(variances[:, [0, 2]]).all()
+
+
+def test_low_rank_variances_match_the_dense_covariances():
+    rng = np.random.RandomState(2)
+    views = rng.normal(0, 0.3, (3, 4, 5))
+    loadings = rng.normal(0, 0.02, (4, 5, 2))
+    specific = rng.uniform(1e-4, 1e-3, (4, 5))
+    specific[2, 1] = np.nan
+    loadings[2, 1] = np.nan
+    cov = loadings @ loadings.transpose(0, 2, 1) + np.stack([np.diag(s) for s in specific])
+
+    assert np.allclose(batch_low_rank_portfolio_variances(views, loadings, specific), loop_variances(views, cov))
@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cryptotrading.risk_models import riskModel, sampleRiskModel, lowRankRiskModel, compact_risk_arrays
+from cryptotrading.rolling_cov import rollingCovariance
+
+
+def window_returns(n_rows=200, n_assets=6, seed=0, gaps=False):
+    rng = np.random.RandomState(seed)
+    returns = rng.normal(0, 0.01, (n_rows, 2)) @ rng.normal(1, 0.5, (2, n_assets)) + \
+        rng.normal(0, 0.005, (n_rows, n_assets))
+    if gaps:
+        returns[rng.uniform(size=returns.shape) < 0.1] = np.nan
+    return returns
+
+
+def windows(n_rows, n_dates=5, length=80):
+    hi = np.linspace(length, n_rows, n_dates).astype(np.int64)
+    return hi - length, hi, np.ones((n_dates, 1), dtype=bool)
+
+
+def dense(loadings, specific):
+    return loadings @ loadings.T + np.diag(specific)
+
+
+def test_the_base_model_is_abstract():
+    with pytest.raises(TypeError):
+        riskModel(pd.DatetimeIndex([]), [])
+
+
+def test_all_factors_reproduce_the_sample_covariance():
+    returns = window_returns()
+    lo, hi, enough = windows(len(returns))
+    enough = np.repeat(enough, returns.shape[1], axis=1)
+    loadings, specific = compact_risk_arrays('statistical', returns, lo, hi, enough, n_factors=6, scale=2.0)
+    for k in range(len(lo)):
+        expected = 2.0 * np.cov(returns[lo[k]:hi[k]], rowvar=False)
+        assert np.allclose(dense(loadings[k], specific[k]), expected, rtol=1e-10, atol=1e-16)
+
+    # ewma windows agree with the rolling engine
+    halflife = 30.0
+    loadings, specific = compact_risk_arrays('statistical', returns, lo, hi, enough, n_factors=6, halflife=halflife)
+    expected = rollingCovariance(returns, halflife=halflife, refresh_every=1).covariances(lo, hi)
+    for k in range(len(lo)):
+        assert np.allclose(dense(loadings[k], specific[k]), expected[k], rtol=1e-10, atol=1e-16)
+
+
+def test_truncated_factors_keep_exact_variances():
+    returns = window_returns(gaps=True)
+    lo, hi, enough = windows(len(returns))
+    enough = np.repeat(enough, returns.shape[1], axis=1)
+    enough[0, 2] = False
+    for kind in ['statistical', 'shrunk statistical']:
+        loadings, specific = compact_risk_arrays(kind, returns, lo, hi, enough, n_factors=2)
+        assert loadings.shape == (len(lo), 6, 2)
+        assert np.isnan(specific[0, 2]) and np.isnan(loadings[0, 2]).all()
+        assert (specific[enough] >= 0).all()
+        if kind == 'statistical':
+            variances = (loadings ** 2).sum(2) + specific
+            expected = np.array([np.nanvar(returns[a:b], axis=0, ddof=1) for a, b in zip(lo, hi)])
+            assert np.allclose(variances[enough], expected[enough], rtol=1e-10)
+
+
+def test_shrunk_model_is_the_ledoit_wolf_estimate_with_all_factors():
+    returns = window_returns(n_rows=60, n_assets=40, seed=1)
+    lo, hi = np.array([0]), np.array([60])
+    loadings, specific = compact_risk_arrays('shrunk statistical', returns, lo, hi, np.ones((1, 40), dtype=bool),
+                                             n_factors=40)
+
+    # Ledoit and Wolf (2004), shrinking towards mu * I
+    cov = np.cov(returns, rowvar=False)
+    demeaned = returns - returns.mean(0)
+    n_obs, n_assets = returns.shape
+    mu = np.trace(cov) / n_assets
+    d2 = ((cov - mu * np.eye(n_assets)) ** 2).sum()
+    b2 = ((demeaned ** 2).sum(1) ** 2).sum() / (n_obs - 1) ** 2 - (cov ** 2).sum() / n_obs
+    intensity = np.clip(b2 / d2, 0.0, 1.0)
+    assert 0.0 < intensity < 1.0
+    expected = (1.0 - intensity) * cov + intensity * mu * np.eye(n_assets)
+    assert np.allclose(dense(loadings[0], specific[0]), expected, rtol=1e-10, atol=1e-16)
+    # 60 rows, 40 assets: still well conditioned
+    assert np.linalg.eigvalsh(dense(loadings[0], specific[0])).min() > 0.1 * intensity * mu
+
+
+def test_low_rank_model_answers_like_the_dense_one():
+    dates = pd.date_range('2017-01-01', periods=4, tz='UTC')
+    assets = pd.Index(['BTC', 'ETH', 'LTC'])
+    rng = np.random.RandomState(2)
+    loadings = rng.normal(size=(4, 3, 2))
+    specific = rng.uniform(0.1, 0.2, (4, 3))
+    specific[1, 2] = np.nan
+    loadings[1, 2] = np.nan
+    compact = lowRankRiskModel(dates, assets, loadings, specific)
+    values = np.array([dense(np.nan_to_num(loadings[k]), specific[k]) for k in range(4)])
+    values[1, 2, :] = values[1, :, 2] = np.nan
+    sample = sampleRiskModel(dates, assets, values)
+
+    views = rng.normal(size=(3, 4, 3))
+    assert np.allclose(compact.portfolio_variances(views, dates), sample.portfolio_variances(views, dates))
+    assert np.allclose(compact.variances(), sample.variances(), equal_nan=True)
+    assert np.allclose(compact[dates[0]].values, sample[dates[0]].values)
+
+    joined = compact.head(2).append(lowRankRiskModel(dates[2:], assets, loadings[2:], specific[2:]))
+    assert joined.dates.equals(dates)
+    assert np.array_equal(joined.loadings, compact.loadings, equal_nan=True)
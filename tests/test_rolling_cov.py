@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from cryptotrading.rolling_cov import rollingCovariance, parallel_covariances, covariance_blocks
+
+
+def random_returns(n_rows=300, n_assets=5, seed=0):
+    rng = np.random.RandomState(seed)
+    returns = rng.normal(0, 0.01, (n_rows, n_assets))
+    returns[rng.uniform(size=returns.shape) < 0.1] = np.nan
+    returns[:120, 3] = np.nan  # a late listing
+    return returns
+
+
+def sliding_windows(n_rows, n_dates=80, length=60):
+    hi = np.linspace(length // 2, n_rows, n_dates).astype(np.int64)
+    return np.maximum(hi - length, 0), hi
+
+
+def test_equal_weights_match_pairwise_dataframe_cov():
+    returns = random_returns()
+    lo, hi = sliding_windows(len(returns))
+    cov = rollingCovariance(returns, refresh_every=16).covariances(lo, hi)
+    for k in range(len(lo)):
+        expected = pd.DataFrame(returns[lo[k]:hi[k]]).cov(min_periods=2).values
+        assert np.allclose(cov[k], expected, rtol=1e-9, atol=1e-15, equal_nan=True)
+
+
+def test_ewma_weights_match_direct_weighted_cov():
+    returns = random_returns(seed=1)
+    lo, hi = sliding_windows(len(returns))
+    halflife = 20.0
+    cov = rollingCovariance(returns, halflife=halflife, refresh_every=16).covariances(lo, hi)
+    for k in [5, 40, len(lo) - 1]:
+        window = returns[lo[k]:hi[k]]
+        weights = 0.5 ** ((len(window) - 1 - np.arange(len(window))) / halflife)
+        for i in range(returns.shape[1]):
+            for j in range(returns.shape[1]):
+                both = ~np.isnan(window[:, i]) & ~np.isnan(window[:, j])
+                w, x, y = weights[both], window[both, i], window[both, j]
+                if len(w) < 2:
+                    assert np.isnan(cov[k, i, j])
+                    continue
+                expected = (w * (x - (w * x).sum() / w.sum()) * (y - (w * y).sum() / w.sum())).sum() / \
+                    (w.sum() - (w ** 2).sum() / w.sum())
+                assert np.isclose(cov[k, i, j], expected, rtol=1e-8, atol=1e-15)
+
+
+def test_state_continues_a_run_exactly():
+    returns = random_returns(seed=2)
+    lo, hi = sliding_windows(len(returns))
+    engine = rollingCovariance(returns, refresh_every=16)
+    full = engine.covariances(lo, hi)
+    head = engine.covariances(lo[:30], hi[:30])
+    tail = engine.covariances(lo[30:], hi[30:], offset=30, state=engine.state)
+    assert np.array_equal(np.concatenate([head, tail]), full, equal_nan=True)
+
+
+def test_parallel_matches_serial():
+    returns = random_returns(seed=3)
+    lo, hi = sliding_windows(len(returns))
+    serial = rollingCovariance(returns, refresh_every=8).covariances(lo, hi)
+    parallel = parallel_covariances(returns, lo, hi, refresh_every=8, n_workers=2)
+    assert np.array_equal(parallel, serial, equal_nan=True)
+    assert covariance_blocks(80, 2, refresh_every=8) == [(0, 40), (40, 80)]
@@ -0,0 +1,33 @@
+import pytest
+
+from cryptotrading.dataBot import dataBot
+from cryptotrading.synthetic_market import syntheticMarket
+import cryptotrading.traderBot as trader_bot
+from cryptotrading.traderBot import traderBot
+
+
+# enough history for the 3m factors of a live bot
+@pytest.fixture
+def market():
+    return syntheticMarket(n_assets=4, history_days=200, seed=3)
+
+
+def live_bot(market, client):
+    region = [market.home] + market.currencies
+    data = dataBot(region=region, home=market.home, freq=7200, client=client, requests_per_second=None)
+    return traderBot(region=region, home=market.home, price_data_frequency_in_seconds=7200, data=data, live=True)
+
+
+def test_live_tradegen_defaults_to_today(market):
+    trades = live_bot(market, market).tradegen()
+    assert sorted(trades.index) == sorted([market.home] + market.currencies)
+    assert trades['desired positions'].sum() == pytest.approx(1.0)
+
+
+def test_live_rebalance_sends_orders_for_today(market, monkeypatch):
+    sent = []
+    monkeypatch.setattr(trader_bot, 'executionBot', lambda orders, **kwargs: sent.append(orders))
+    live_bot(market, market).rebalance(warn=False)
+
+    assert len(sent) == 1 and len(sent[0]) > 0
+    assert all(market.home in order[:2] for order in sent[0])
@@ -2,6 +2,20 @@ from cryptotrading.dataBot import dataBot
 from cryptotrading.executionBot import executionBot
 from cryptotrading.emailer import send_email
 from cryptotrading.logger_builder import logger
+from cryptotrading.derived_cache import derivedCache
+import cryptotrading.instrumentation as instrumentation
+from cryptotrading.instrumentation import timed
+from cryptotrading.factor_kernels import ewma_means, rolling_moments, moments_std, moments_skew, \
+    moments_adjusted_skew
+from cryptotrading.rolling_cov import parallel_covariances, rollingCovariance, window_bounds, DEFAULT_REFRESH_EVERY
+from cryptotrading.risk_models import sampleRiskModel, lowRankRiskModel, compact_risk_arrays, RISK_MODELS, \
+    DEFAULT_NUM_OF_FACTORS
+from cryptotrading.backtest import run_backtest_grid
+from cryptotrading.portfolio import build_port_views
+from cryptotrading.optimizer import search_factor_weights, walk_forward_splits
+from cryptotrading.pipeline_state import index_marker, resume_position, save_pipeline_state, load_pipeline_state, \
+    max_scaled_difference
+import copy
 import numpy as np
 import pandas as pd
 import datetime
@@ -42,6 +56,51 @@ HOME = 'BTC'
 # cov related
 MIN_NUM_OF_RETURNS_FOR_COV = 500.0
 
+# live mode: ewma history is truncated once the weight left on older returns falls below the tolerance
+LIVE_EWMA_TOLERANCE = 10 ** -6
+LIVE_LOOKBACK_BUFFER_IN_DAYS = 10
+
+# checkpoints: the newest dates are recomputed on every run since the bars they use may still be arriving
+CHECKPOINT_SETTLE_DATES = 2
+CHECKPOINT_TOLERANCE = 10 ** -8
+
+# mom factors: name -> (ewma center of mass in days, mom type); all are computed in one batched ewma pass
+MOM_FACTORS = {
+    'mom 1w': (5, 'ewma'),
+    'mom 1m': (20, 'ewma'),
+    'mom 3m': (60, 'ewma'),
+    'vmom 1w': (5, 'ewma + volume'),
+    'vmom 1m': (20, 'ewma + volume'),
+    'vmom 3m': (60, 'ewma + volume'),
+    'lvmom 1w': (5, 'ewma + log volume'),
+    'lvmom 1m': (20, 'ewma + log volume'),
+    'lvmom 3m': (60, 'ewma + log volume')
+}
+
+# rolling-moment factors: name -> (window in days, factor type); all windows share one set of accumulators
+MOMENT_FACTORS = {
+    'skew 1w': (5, 'centered'),
+    'skew 1m': (20, 'centered'),
+    'skew 3m': (60, 'centered'),
+    'adj skew 1w': (5, 'adjusted'),
+    'adj skew 1m': (20, 'adjusted'),
+    'adj skew 3m': (60, 'adjusted')
+}
+
+# factor type -> function of (rolling moments, min_periods)
+MOMENT_FACTOR_TYPES = {
+    'centered': moments_skew,
+    'adjusted': moments_adjusted_skew,
+    'inverse vol': lambda moments, min_periods: -moments_std(moments, min_periods)
+}
+
+# (numerator, denominator) ewma inputs of each mom type
+MOM_TYPE_INPUTS = {
+    'ewma': ('returns', None),
+    'ewma + volume': ('volume weighted returns', 'volume'),
+    'ewma + log volume': ('log volume weighted returns', 'log volume')
+}
+
 
 # factor research helpers
 
@@ -69,14 +128,31 @@ def get_factor_return_stats(ret_dict):
     return factor_stats
 
 
+# get_factor_return_stats of every backtest_grid cell, one row per (rule, tcost, lag, portfolio)
+def get_grid_return_stats(grid):
+    stats = []
+    for (rule, tcost, lag), ret_dict in grid.items():
+        cell_stats = get_factor_return_stats(ret_dict).T
+        cell_stats.index.name = 'portfolio'
+        cell_stats = cell_stats.reset_index()
+        cell_stats.insert(0, 'lag', lag)
+        cell_stats.insert(0, 'tcost', tcost)
+        cell_stats.insert(0, 'rule', rule)
+        stats.append(cell_stats)
+    return pd.concat(stats, ignore_index=True)
+
+
 # main tradebot class
 class traderBot():
     def __init__(self, region=POLO_CROSS_SECTION, home=HOME, risk_target=1.00,
                  price_data_frequency_in_seconds=PRICE_DATA_FREQUENCY_IN_SECONDS,
                  tz=DEFAULT_TZ,
-                 cov_window_in_days=260.0, viewgen_freq=VIEWGEN_FREQ,
+                 cov_window_in_days=260.0, cov_halflife_in_days=None, viewgen_freq=VIEWGEN_FREQ,
                  trading_lag=1, no_naked_short=True, force_max_out_cash=False,
-                 leverage_cap=0.98):
+                 leverage_cap=0.98, bar_store=None, download_workers=1, covgen_workers=1,
+                 mom_factors=MOM_FACTORS, moment_factors=MOMENT_FACTORS, live=False, checkpoint=None,
+                 risk_model='sample', risk_model_factors=DEFAULT_NUM_OF_FACTORS, start_date=GLOBAL_START_DATE,
+                 data=None, lazy=False):
 
         # initialize settings
         self.region = region
@@ -84,22 +160,24 @@ class traderBot():
         self.viewgen_freq = viewgen_freq
         self.price_data_freq = price_data_frequency_in_seconds
         self.cov_window = cov_window_in_days
+        self.cov_halflife = cov_halflife_in_days  # None = equal-weighted window, otherwise EWMA within the window
+        self.covgen_workers = covgen_workers  # > 1 runs covgen across processes sharing the return matrix
+        if risk_model not in RISK_MODELS:
+            raise ValueError('risk model not valid!')
+        self.risk_model = risk_model  # 'sample' (dense), 'statistical' or 'shrunk statistical' (low rank + diagonal)
+        self.risk_model_factors = risk_model_factors  # K of the low-rank risk models
         self.lag = trading_lag
         self.no_naked_short = no_naked_short
         self.risk_target = risk_target
         self.force_max_out_cash = force_max_out_cash  # override risk target; always max out cash usage
         self.leverage_cap = leverage_cap
         self.tz = tz
+        self.checkpoint = checkpoint  # pipeline state file; runs resume from it and only compute new dates
 
         # initialiaze logger
         self.initialize_logging()
 
         # initialize data members
-        self.data = dataBot(region=self.region, home=self.home, freq=self.price_data_freq)
-        self.start_date = GLOBAL_START_DATE
-        self.end_date = datetime.date.today()
-        self.dates = pd.date_range(start=self.start_date, end=self.end_date, freq=self.viewgen_freq,
-                                   tz=self.tz)
         self.factor_weights = pd.Series({
             'vmom 1m': 0.12,
             'vmom 3m': 0.48,
@@ -107,21 +185,161 @@ class traderBot():
             'mom 3m': 0.16,
             'adj skew 3m': 0.20
         })
+        self.mom_factors = mom_factors
+        self.moment_factors = moment_factors
+
+        # live mode only loads the lookback the weighted factors and today's covariance need, and builds
+        # factors, risk model and views for today alone, lazily on first use
+        self.live = live
+        self.end_date = datetime.date.today()
+        if self.live:
+            self.start_date = self.end_date
+            data_start_date = self.end_date - datetime.timedelta(days=self.get_live_lookback_days())
+        else:
+            self.start_date = start_date
+            data_start_date = None
+        self.dates = pd.date_range(start=self.start_date, end=self.end_date, freq=self.viewgen_freq,
+                                   tz=self.tz)
+
+        # data = a ready dataBot (e.g. on a synthetic market client) instead of one on the live exchange
+        if data is None:
+            data = dataBot(region=self.region, home=self.home, freq=self.price_data_freq, store=bar_store,
+                           max_workers=download_workers,
+                           start=0 if data_start_date is None else
+                           int(pd.Timestamp(data_start_date, tz=self.tz).timestamp()))
+        self.data = data
         self.factors = {}
         self.cov = None
-
-        # run portfolio
-        self.load_factors()
+        self.views = None
+        self.cache = derivedCache()  # derived series, invalidated when self.data loads new bars
+
+        # run portfolio; lazy bots build it on first use
+        if not (self.live or lazy):
+            self.run_pipeline()
+
+    # factors, risk model and views over self.dates
+    @timed('pipeline')
+    def run_pipeline(self):
+        if self.checkpoint is not None and not self.live:
+            self.run_incremental_pipeline()
+            return
+        self.load_factors(factor_names=list(self.factor_weights.keys()) if self.live else None)
         self.covgen()
         self.viewgen()
 
+    # same results as the full pipeline, resumed from the checkpoint: only the dates after its settled
+    # part are computed, then the checkpoint is moved forward
+    def run_incremental_pipeline(self):
+        fingerprint = self.get_pipeline_fingerprint()
+        state = load_pipeline_state(self.checkpoint, fingerprint)
+        if state is None:
+            self.logger.info('No usable pipeline checkpoint, computing full history')
+            state = {}
+
+        self.logger.info('Extending factors')
+        with instrumentation.span('load_factors', mode='incremental'):
+            mom_factors, mom_state = self._extend_ewma_mom_factors(self.mom_factors, state.get('mom'))
+            moment_factors, moment_state = self._extend_moment_factors(self.moment_factors, state.get('moments'))
+        self.factors.update(mom_factors)
+        self.factors.update(moment_factors)
+        if not set(self.factor_weights.keys()).issubset(set(self.factors.keys())):
+            raise ValueError('Undefined factor(s) found!')
+
+        self.logger.info('Extending covgen')
+        with instrumentation.span('covgen', mode='incremental'):
+            self.cov, cov_state = self._extend_covariances(state.get('cov'))
+
+        self.logger.info('Extending viewgen')
+        with instrumentation.span('viewgen', mode='incremental'):
+            self.views, views_state = self._extend_views(state.get('views'))
+
+        save_pipeline_state(self.checkpoint, fingerprint, {
+            'mom': mom_state,
+            'moments': moment_state,
+            'cov': cov_state,
+            'views': views_state
+        })
+
+    # every setting the pipeline output depends on; a checkpoint written under other settings is ignored
+    def get_pipeline_fingerprint(self):
+        return {
+            'region': list(self.region),
+            'home': self.home,
+            'price data freq': self.price_data_freq,
+            'viewgen freq': self.viewgen_freq,
+            'tz': self.tz,
+            'start date': self.start_date,
+            'data start': self.data.start,
+            'cov window': self.cov_window,
+            'cov halflife': self.cov_halflife,
+            'min returns for cov': MIN_NUM_OF_RETURNS_FOR_COV,
+            'cov refresh every': DEFAULT_REFRESH_EVERY,
+            'risk model': self.risk_model,
+            'risk model factors': self.risk_model_factors,
+            'mom factors': dict(self.mom_factors),
+            'moment factors': dict(self.moment_factors),
+            'factor weights': self.factor_weights.to_dict(),
+            'risk target': self.risk_target,
+            'no naked short': self.no_naked_short,
+            'force max out cash': self.force_max_out_cash,
+            'leverage cap': self.leverage_cap
+        }
+
+    # recompute everything from scratch and compare with the current (incremental) results;
+    # returns the largest scaled difference per output and raises if any exceeds the tolerance
+    def check_pipeline_consistency(self, tolerance=CHECKPOINT_TOLERANCE):
+        self._ensure_pipeline()
+        full = copy.copy(self)
+        full.checkpoint = None
+        full.factors = {}
+        full.cov = None
+        full.views = None
+        full.run_pipeline()
+
+        differences = {}
+        for factor_name in self.factors.keys():
+            differences['factor ' + factor_name] = max_scaled_difference(self.factors[factor_name],
+                                                                         full.factors[factor_name])
+        differences['cov'] = max([max_scaled_difference(a, b) for a, b in zip(self.cov.arrays(), full.cov.arrays())]) \
+            if self.cov.items.equals(full.cov.items) else np.inf
+        for view_name in full.views.keys():
+            differences['view ' + view_name] = max_scaled_difference(self.views[view_name], full.views[view_name])
+        differences = pd.Series(differences)
+
+        mismatched = differences[differences > tolerance]
+        if len(mismatched) > 0:
+            err_msg = 'incremental pipeline differs from full recompute - ' + str(mismatched.to_dict())
+            self.logger.critical(err_msg)
+            raise ValueError(err_msg)
+        return differences
+
+    def _ensure_pipeline(self):
+        if self.views is None:
+            self.run_pipeline()
+
+    # calendar days of history needed by the weighted factors and the covariance window
+    def get_live_lookback_days(self):
+        lookbacks = [self.cov_window * 7.0 / 5.0]
+        for factor_name in self.factor_weights.keys():
+            if factor_name in self.mom_factors:
+                com = self.mom_factors[factor_name][0]
+                lookbacks.append(com + np.log(LIVE_EWMA_TOLERANCE) / np.log(com / (1.0 + com)))
+            elif factor_name in self.moment_factors:
+                lookbacks.append(self.moment_factors[factor_name][0])
+        return int(np.ceil(max(lookbacks))) + LIVE_LOOKBACK_BUFFER_IN_DAYS
+
     # initialize logging
     def initialize_logging(self):
         self.logger = logger
 
     # master function for rebalancing
-    def rebalance(self, warn=True):
+    def rebalance(self, warn=True, asynchronous=False, schedule=None):
+        # timeline: the views' snap time, then each step up to the fills the execution layer records
+        snap = pd.Timestamp(datetime.datetime.combine(datetime.date.today(), GLOBAL_SNAP_TIME)).tz_localize(self.tz)
+        instrumentation.event(instrumentation.SNAP_EVENT, timestamp=snap.timestamp())
+        instrumentation.event('rebalance start')
         trade_df = self.tradegen()
+        instrumentation.event('trades generated')
         print('Rebalancing from ... to ...')
         print(trade_df)
 
@@ -164,69 +382,166 @@ class traderBot():
             orders.append((buy_currency, sell_currency, buy_amount, sell_amount))
 
         # execute all trades
-        eb = executionBot(orders=orders)
+        instrumentation.event('execution start', orders=len(orders))
+        eb = executionBot(orders=orders, asynchronous=asynchronous, schedule=schedule, feed=self.data.feed,
+                          client=self.data.client)
+        instrumentation.event('execution end')
 
         return
 
+    # memoize derived data on the data version of the loaded bars
+    def _cached(self, key, builder):
+        self.data.get_intraday_data()
+        return self.cache.get(key, self.data.data_version, builder)
+
+    def log_cache_stats(self):
+        self.logger.info('Derived data cache: ' + str(self.cache.stats().to_dict()))
+
     # daily asset returns series for backtest
     def get_daily_asset_returns(self):
+        return self._cached(('daily returns', self.viewgen_freq), self._compute_daily_asset_returns)
+
+    def _compute_daily_asset_returns(self):
         intraday_ti = self.get_intraday_ti()
         daily_ti = intraday_ti[intraday_ti.index.time <= GLOBAL_SNAP_TIME].resample(self.viewgen_freq).last()
-        daily_returns = daily_ti.fillna(method='pad', limit=5).pct_change()
+        daily_returns = daily_ti.ffill(limit=5).pct_change(fill_method=None)
         return daily_returns
 
     # daily trading volume in home currency
     def get_daily_volume(self):
+        return self._cached(('daily volume', self.viewgen_freq), self._compute_daily_volume)
+
+    def _compute_daily_volume(self):
         intraday_volume = self.data.get_intraday_data().loc[:, :, 'volume']
         daily_volume = intraday_volume.resample(self.viewgen_freq).sum()
         return daily_volume
 
+    # intraday close resampled to a rebalance frequency
+    def get_resampled_ti(self, rule):
+        return self._cached(('resampled close', rule), lambda: self.get_intraday_ti().resample(rule).last())
+
     # public method to get raw intraday total return index
     def get_intraday_ti(self):
         return self.data.get_intraday_data().loc[:, :, 'close']
 
     # compute variance covariance matrix for one date
     def get_risk_model_one_date(self, date, window=None):
+        risk_model = self.compute_risk_model([pd.Timestamp(date)], window=window)
+        valid_assets = risk_model.assets[~np.isnan(risk_model.variances()[0])]
+        cov_matrix = risk_model[risk_model.dates[0]].loc[valid_assets, valid_assets]
+        return cov_matrix
+
+    # risk model of the configured kind for many dates; the sample model from one pass of the rolling engine
+    def compute_risk_model(self, dates, window=None):
+        if self.risk_model == 'sample':
+            return self.compute_covariances(dates, window=window)
+        returns, lo, hi, enough, halflife = self._covariance_windows(dates, window=window)
+        return self._compact_risk_model(dates, returns, lo, hi, enough, halflife, 0, len(dates))
+
+    # dense variance covariance matrices for many dates from one pass of the rolling engine
+    def compute_covariances(self, dates, window=None):
+        cov_tensor, enough, assets = self._covariance_tensor(dates, window=window)
+        return sampleRiskModel(dates, assets, cov_tensor)
+
+    # low-rank risk model on dates[start:stop], built from each date's window of returns alone
+    def _compact_risk_model(self, dates, returns, lo, hi, enough, halflife, start, stop):
+        loadings, specific = compact_risk_arrays(self.risk_model, returns, lo[start:stop], hi[start:stop],
+                                                 enough[start:stop], self.risk_model_factors, halflife=halflife,
+                                                 scale=SECONDS_IN_A_YEAR / self.price_data_freq)
+        return lowRankRiskModel(dates[start:stop], self.get_intraday_ti().columns, loadings, specific)
+
+    def _covariance_tensor(self, dates, window=None):
+        returns, lo, hi, enough, halflife = self._covariance_windows(dates, window=window)
+        cov_tensor = parallel_covariances(returns, lo, hi, halflife=halflife, n_workers=self.covgen_workers)
+        return self._finish_covariances(cov_tensor, enough), enough, self.get_intraday_ti().columns
+
+    # intraday returns, return-row bounds of every date's window, the columns with enough return nobs and
+    # the halflife in rows
+    def _covariance_windows(self, dates, window=None):
         window = window or self.cov_window
-        start_date = pd.Timestamp(date) - BDay(window)
-        sliced_ti = self.get_intraday_ti().ix[start_date: date]
+        intraday_ti = self.get_intraday_ti()
+        lo, hi = window_bounds(intraday_ti.index, dates, window)
 
         # drop columns that don't have enough return nobs
-        sliced_ti = sliced_ti.T[sliced_ti.count(0) > MIN_NUM_OF_RETURNS_FOR_COV].T
+        price_counts = np.vstack([np.zeros((1, intraday_ti.shape[1])), intraday_ti.notnull().values.cumsum(0)])
+        enough = (price_counts[hi] - price_counts[lo]) > MIN_NUM_OF_RETURNS_FOR_COV
+
+        # the first price of each window has no return within the window
+        halflife = None if self.cov_halflife is None else self.cov_halflife * 24.0 * 3600.0 / self.price_data_freq
+        return intraday_ti.pct_change(fill_method=None).values, np.minimum(lo + 1, hi), hi, enough, halflife
+
+    # annualize, then blank the columns without enough return nobs
+    def _finish_covariances(self, cov_tensor, enough):
+        cov_tensor *= SECONDS_IN_A_YEAR / self.price_data_freq
+        cov_tensor[~(enough[:, :, None] & enough[:, None, :])] = np.nan
+        return cov_tensor
+
+    # number of self.dates up to the last loaded bar; later dates see bars that have yet to arrive, so they
+    # never settle into a checkpoint
+    def _dates_with_bars(self):
+        intraday_index = self.get_intraday_ti().index
+        if len(intraday_index) == 0:
+            return 0
+        return int(self.dates.searchsorted(intraday_index[-1], side='right'))
+
+    # risk model on self.dates continued from a checkpointed engine state; the from-scratch rebuilds
+    # fall on the same dates as in a full run, so the results are the same bit for bit
+    def _extend_covariances(self, state):
+        returns, lo, hi, enough, halflife = self._covariance_windows(self.dates)
+        intraday_index = self.get_intraday_ti().index
+        assets = self.get_intraday_ti().columns
+
+        n_prev, prev_model, engine_state = 0, None, None
+        if state is not None and state['assets'] == list(assets) and \
+                resume_position(intraday_index, state['intraday rows']) is not None:
+            n = resume_position(self.dates, state['dates'])
+            if n is not None:
+                n_prev, prev_model, engine_state = n, state['model'], state['engine']
+        n_settle = max(n_prev, self._dates_with_bars() - CHECKPOINT_SETTLE_DATES)
+
+        if self.risk_model == 'sample':
+            engine = rollingCovariance(returns, halflife=halflife)
+            # without a checkpoint, the history up to the last rebuild before the settled end runs in parallel
+            split = n_prev
+            if engine_state is None and n_settle > 0:
+                split = (n_settle - 1) // DEFAULT_REFRESH_EVERY * DEFAULT_REFRESH_EVERY
+            head = parallel_covariances(returns, lo[n_prev:split], hi[n_prev:split], halflife=halflife,
+                                        n_workers=self.covgen_workers)
+
+            settled = engine.covariances(lo[split:n_settle], hi[split:n_settle], offset=split, state=engine_state)
+            settled_state = engine.state
+            recent = engine.covariances(lo[n_settle:], hi[n_settle:], offset=n_settle, state=settled_state)
+
+            new_values = self._finish_covariances(np.concatenate([head, settled, recent]), enough[n_prev:])
+            new_model = sampleRiskModel(self.dates[n_prev:], assets, new_values)
+        else:
+            # every date only depends on its own window, so there is no engine state to carry
+            new_model, settled_state = self._compact_risk_model(self.dates, returns, lo, hi, enough, halflife, n_prev,
+                                                                len(self.dates)), None
+
+        risk_model = new_model if prev_model is None else prev_model.append(new_model)
+        return risk_model, {
+            'assets': list(assets),
+            'dates': index_marker(self.dates, n_settle),
+            'intraday rows': index_marker(intraday_index, hi[n_settle - 1] if n_settle > 0 else 0),
+            'engine': settled_state,
+            'model': risk_model.head(n_settle)
+        }
 
-        # annualize
-        annualizer = SECONDS_IN_A_YEAR / self.price_data_freq
+    # load factor values, optionally only the named ones
+    @timed()
+    def load_factors(self, factor_names=None):
+        mom_factors = self.mom_factors
+        moment_factors = self.moment_factors
+        if factor_names is not None:
+            mom_factors = {name: spec for name, spec in mom_factors.items() if name in factor_names}
+            moment_factors = {name: spec for name, spec in moment_factors.items() if name in factor_names}
 
-        # TODO: add support for EWMA
-        cov_matrix = sliced_ti.pct_change().cov() * annualizer
-        return cov_matrix
+        # mom, volume-weighted mom and log volume-weighted mom
+        self.factors.update(self.compute_ewma_mom_factors(mom_factors))
 
-    # load factor values
-    def load_factors(self):
-        # mom
-        self.factors['mom 1w'] = self.compute_ewma_mom_factor(com=5, mom_type='ewma')
-        self.factors['mom 1m'] = self.compute_ewma_mom_factor(com=20, mom_type='ewma')
-        self.factors['mom 3m'] = self.compute_ewma_mom_factor(com=60, mom_type='ewma')
-
-        # volume-weighted mom
-        self.factors['vmom 1w'] = self.compute_ewma_mom_factor(com=5, mom_type='ewma + volume')
-        self.factors['vmom 1m'] = self.compute_ewma_mom_factor(com=20, mom_type='ewma + volume')
-        self.factors['vmom 3m'] = self.compute_ewma_mom_factor(com=60, mom_type='ewma + volume')
-
-        # log volume-weighted mom
-        self.factors['lvmom 1w'] = self.compute_ewma_mom_factor(com=5, mom_type='ewma + log volume')
-        self.factors['lvmom 1m'] = self.compute_ewma_mom_factor(com=20, mom_type='ewma + log volume')
-        self.factors['lvmom 3m'] = self.compute_ewma_mom_factor(com=60, mom_type='ewma + log volume')
-
-        # centered skew
-        self.factors['skew 1w'] = self.compute_skew_factor(window=5, skew_type='centered')
-        self.factors['skew 1m'] = self.compute_skew_factor(window=20, skew_type='centered')
-        self.factors['skew 3m'] = self.compute_skew_factor(window=60, skew_type='centered')
-
-        # adjusted skew
-        self.factors['adj skew 1w'] = self.compute_skew_factor(window=5, skew_type='adjusted')
-        self.factors['adj skew 1m'] = self.compute_skew_factor(window=20, skew_type='adjusted')
-        self.factors['adj skew 3m'] = self.compute_skew_factor(window=60, skew_type='adjusted')
+        # centered skew, adjusted skew and inverse vol
+        self.factors.update(self.compute_moment_factors(moment_factors))
 
         if not set(self.factor_weights.keys()).issubset(set(self.factors.keys())):
             raise ValueError('Undefined factor(s) found!')
@@ -234,149 +549,317 @@ class traderBot():
 
     # price mom
     def compute_ewma_mom_factor(self, com, mom_type):
+        return self.compute_ewma_mom_factors({mom_type: (com, mom_type)})[mom_type]
+
+    # mom factors for {name: (com, mom_type)} from a single ewma sweep over every input and horizon
+    def compute_ewma_mom_factors(self, factor_specs):
+        stacked = self._stack_ewma_inputs(factor_specs)
+        if stacked is None:
+            return {}
+        ewma_keys, inputs, index, blocks, values, coms = stacked
+        ewma_values, _ = ewma_means(values, coms, coms)
+        return self._ewma_signals(factor_specs, ewma_keys, inputs, index, blocks, ewma_values)
+
+    # mom factors continued from a checkpointed ewma state; only rows after its settled part are swept
+    def _extend_ewma_mom_factors(self, factor_specs, state):
+        stacked = self._stack_ewma_inputs(factor_specs)
+        if stacked is None:
+            return {}, None
+        ewma_keys, inputs, index, blocks, values, coms = stacked
+        columns = [list(block.columns) for block in blocks]
+
+        n_prev, prev_values, ewma_state = 0, np.empty((0, values.shape[1])), None
+        if state is not None and state['keys'] == ewma_keys and state['columns'] == columns:
+            n = resume_position(index, state['rows'])
+            if n is not None:
+                n_prev, prev_values, ewma_state = n, state['values'], state['ewma']
+        n_settle = max(n_prev, len(index) - CHECKPOINT_SETTLE_DATES)
+
+        settled, settled_state = ewma_means(values[n_prev:n_settle], coms, coms, state=ewma_state)
+        recent, _ = ewma_means(values[n_settle:], coms, coms, state=settled_state)
+        ewma_values = np.vstack([prev_values, settled, recent])
+        return self._ewma_signals(factor_specs, ewma_keys, inputs, index, blocks, ewma_values), {
+            'keys': ewma_keys,
+            'columns': columns,
+            'rows': index_marker(index, n_settle),
+            'ewma': settled_state,
+            'values': ewma_values[:n_settle]
+        }
+
+    # every (input, com) block the specs need, stacked side by side on a common index; rows only ever
+    # differ at the ends of the daily range, where they do not change the ewma of the other rows
+    def _stack_ewma_inputs(self, factor_specs):
+        ewma_keys = []
+        for com, mom_type in factor_specs.values():
+            if mom_type not in MOM_TYPE_INPUTS:
+                raise ValueError('mom_type not valid!')
+            for input_name in MOM_TYPE_INPUTS[mom_type]:
+                if input_name is not None and (input_name, com) not in ewma_keys:
+                    ewma_keys.append((input_name, com))
+        if len(ewma_keys) == 0:
+            return None
+
+        inputs = self._get_mom_inputs({input_name for input_name, com in ewma_keys})
+
+        index = None
+        for frame in inputs.values():
+            index = frame.index if index is None else index.union(frame.index)
+        blocks = [inputs[input_name].reindex(index) for input_name, com in ewma_keys]
+        coms = np.concatenate([np.full(block.shape[1], float(com)) for block, (input_name, com)
+                               in zip(blocks, ewma_keys)])
+        return ewma_keys, inputs, index, blocks, np.hstack([block.values for block in blocks]), coms
+
+    def _ewma_signals(self, factor_specs, ewma_keys, inputs, index, blocks, values):
+        ewma = {}
+        start = 0
+        for block, key in zip(blocks, ewma_keys):
+            ewma[key] = pd.DataFrame(values[:, start:start + block.shape[1]], index=index,
+                                     columns=block.columns).reindex(inputs[key[0]].index)
+            start += block.shape[1]
+
+        signals = {}
+        for factor_name, (com, mom_type) in factor_specs.items():
+            numerator, denominator = MOM_TYPE_INPUTS[mom_type]
+            signal = ewma[(numerator, com)]
+            if denominator is not None:
+                signal = signal / ewma[(denominator, com)]
+            signals[factor_name] = signal
+        return signals
+
+    def _get_mom_inputs(self, input_names):
         daily_returns = self.get_daily_asset_returns()
-        if mom_type == 'ewma':
-            signal = daily_returns.ewm(com=com, min_periods=com, adjust=True, ignore_na=False).mean()
-        elif mom_type == 'ewma + volume':
-            daily_volume = self.get_daily_volume()
-            weighted_volume_return = \
-                (daily_returns * daily_volume).ewm(com=com, min_periods=com, adjust=True, ignore_na=False).mean()
-            weighted_volume = \
-                daily_volume.ewm(com=com, min_periods=com, adjust=True, ignore_na=False).mean()
-            signal = weighted_volume_return / weighted_volume
-        elif mom_type == 'ewma + log volume':
+        inputs = {'returns': daily_returns}
+        if input_names - {'returns'}:
             daily_volume = self.get_daily_volume()
             log_daily_volume = np.log(1 + daily_volume)
-            weighted_volume_return = \
-                (daily_returns * log_daily_volume).ewm(com=com, min_periods=com, adjust=True, ignore_na=False).mean()
-            weighted_volume = \
-                log_daily_volume.ewm(com=com, min_periods=com, adjust=True, ignore_na=False).mean()
-            signal = weighted_volume_return / weighted_volume
-        else:
-            raise ValueError('mom_type not valid!')
-        return signal
+            inputs.update({
+                'volume': daily_volume,
+                'volume weighted returns': daily_returns * daily_volume,
+                'log volume': log_daily_volume,
+                'log volume weighted returns': daily_returns * log_daily_volume
+            })
+        return {input_name: inputs[input_name] for input_name in input_names}
 
     # inverse vol
     def compute_inv_vol_factor(self, window):
-        return -self.get_daily_asset_returns().rolling(window=window, min_periods=window - 5, center=False).std()
+        return self.compute_moment_factors({'inverse vol': (window, 'inverse vol')})['inverse vol']
 
     # skew
     def compute_skew_factor(self, window, skew_type):
-        signal = None
+        return self.compute_moment_factors({skew_type: (window, skew_type)})[skew_type]
+
+    # rolling-moment factors for {name: (window, factor type)}; every window is fed from one pass of
+    # power-sum accumulators over the daily returns, with min_periods = window - 5
+    def compute_moment_factors(self, factor_specs):
+        for window, factor_type in factor_specs.values():
+            if factor_type not in MOMENT_FACTOR_TYPES:
+                raise ValueError('factor type not valid!')
         daily_returns = self.get_daily_asset_returns()
-        if skew_type == 'centered':
-            signal = daily_returns.rolling(window=window, min_periods=window - 5).skew()
-        elif skew_type == 'adjusted':
-            m4 = (daily_returns ** 4).rolling(window=window, min_periods=window - 5).sum()
-            m3 = (daily_returns ** 3).rolling(window=window, min_periods=window - 5).sum()
-            m2 = (daily_returns ** 2).rolling(window=window, min_periods=window - 5).sum()
-            m1 = (daily_returns ** 1).rolling(window=window, min_periods=window - 5).sum()
-            signal = (m3 - m4 / m2 * m1) / m2 ** 1.5
-        return signal
+        moments = rolling_moments(daily_returns.values, {window for window, factor_type in factor_specs.values()})
+        return {
+            factor_name: pd.DataFrame(MOMENT_FACTOR_TYPES[factor_type](moments[window], window - 5),
+                                      index=daily_returns.index, columns=daily_returns.columns)
+            for factor_name, (window, factor_type) in factor_specs.items()
+        }
 
+    # rolling-moment factors continued from a checkpoint; the accumulators only need the returns of the
+    # longest window before the first new row, which the checkpoint keeps as a buffer
+    def _extend_moment_factors(self, factor_specs, state):
+        for window, factor_type in factor_specs.values():
+            if factor_type not in MOMENT_FACTOR_TYPES:
+                raise ValueError('factor type not valid!')
+        if len(factor_specs) == 0:
+            return {}, None
+        daily_returns = self.get_daily_asset_returns()
+        index = daily_returns.index
+        max_window = max(window for window, factor_type in factor_specs.values())
+
+        n_prev, buffer = 0, np.empty((0, daily_returns.shape[1]))
+        prev_values = {factor_name: buffer for factor_name in factor_specs.keys()}
+        if state is not None and state['names'] == sorted(factor_specs.keys()) and \
+                state['columns'] == list(daily_returns.columns):
+            n = resume_position(index, state['rows'])
+            if n is not None:
+                n_prev, buffer, prev_values = n, state['buffer'], state['values']
+        n_settle = max(n_prev, len(index) - CHECKPOINT_SETTLE_DATES)
+
+        moments = rolling_moments(np.vstack([buffer, daily_returns.values[n_prev:]]),
+                                  {window for window, factor_type in factor_specs.values()})
+        values = {
+            factor_name: np.vstack([prev_values[factor_name],
+                                    MOMENT_FACTOR_TYPES[factor_type](moments[window], window - 5)[len(buffer):]])
+            for factor_name, (window, factor_type) in factor_specs.items()
+        }
+        factors = {factor_name: pd.DataFrame(factor_values, index=index, columns=daily_returns.columns)
+                   for factor_name, factor_values in values.items()}
+        return factors, {
+            'names': sorted(factor_specs.keys()),
+            'columns': list(daily_returns.columns),
+            'rows': index_marker(index, n_settle),
+            'buffer': daily_returns.values[max(0, n_settle - max_window + 1):n_settle],
+            'values': {factor_name: factor_values[:n_settle] for factor_name, factor_values in values.items()}
+        }
+
+    @timed()
     def covgen(self):
         self.logger.info('Running covgen')
-        cov_matrix_panel = {}
-        for date in self.dates:
-            cov_matrix_panel[date] = self.get_risk_model_one_date(date=date)
-        self.cov = pd.Panel(cov_matrix_panel)
+        self.cov = self.compute_risk_model(self.dates)
 
     def get_asset_vols(self):
         if self.cov is None:
             self.covgen()
         cov = self.cov
-        asset_vols = pd.DataFrame({date: pd.Series(np.diag(cov[date]), index=cov[date].columns)
-                                   for date in cov.items})
-        return asset_vols.T.drop(self.home, axis=1)
+        asset_vols = pd.DataFrame(cov.variances(), index=cov.items, columns=cov.assets)
+        return asset_vols.drop(self.home, axis=1)
 
+    @timed()
     def viewgen(self):
+        self.views = self._compute_views(self.dates)
+        return
+
+    # views checkpointed for the settled dates are kept, views for the dates after them are computed
+    def _extend_views(self, state):
+        n_prev, prev_views = 0, None
+        if state is not None and set(state['views'].keys()) == set(self.factors.keys()) | {'PORT'}:
+            n = resume_position(self.dates, state['dates'])
+            if n is not None:
+                n_prev, prev_views = n, state['views']
+        n_settle = max(n_prev, self._dates_with_bars() - CHECKPOINT_SETTLE_DATES)
+
+        view_panel = self._compute_views(self.dates[n_prev:])
+        if prev_views is not None:
+            view_panel = {name: pd.concat([prev_views[name], views]) for name, views in view_panel.items()}
+        return view_panel, {
+            'dates': index_marker(self.dates, n_settle),
+            'views': {name: views.iloc[:n_settle] for name, views in view_panel.items()}
+        }
+
+    # factor and PORT views on dates; every date only depends on its own factors and risk model
+    def _compute_views(self, dates):
         view_panel = {}
 
         self.logger.info('Running factor viewgen')
+        asset_vols = self.get_asset_vols().reindex(dates)
+        factor_views = {}
         for factor_name in self.factors.keys():
-            self.logger.info('...' + factor_name)
             factor_values = self.factors[factor_name].drop(self.home, axis=1)  # drop home currency because view is
             # meaningless
 
             # grinold
-            asset_vols = self.get_asset_vols()
-            views = factor_values.divide(asset_vols, axis=1)
+            factor_views[factor_name] = factor_values.reindex(dates).divide(asset_vols, axis=1)
 
-            # risk targeting
-            vols = self.compute_portfolio_vol(views)
-            views = views.divide(vols, axis=0).fillna(0) * self.risk_target
+        # risk targeting, all factors at once
+        factor_vols = self.compute_portfolio_vols(factor_views, dates=dates)
+        for factor_name, views in factor_views.items():
+            self.logger.info('...' + factor_name)
+            views = views.divide(factor_vols[factor_name], axis=0).fillna(0) * self.risk_target
 
-            view_panel[factor_name] = views.reindex(self.dates)
+            view_panel[factor_name] = views.reindex(dates)
 
         self.logger.info('Running portfolio viewgen')
-        view = 0
-        for factor_name in self.factor_weights.keys():
-            view += view_panel[factor_name] * self.factor_weights[factor_name]
-        view = view.divide(self.factor_weights.sum())
-
-        # remove negative positions if needed
-        if self.no_naked_short:
-            view[view < 0] = 0
-
-        # vol targeting
-        vols = self.compute_portfolio_vol(view)
-        view = view.divide(vols, axis=0).multiply(self.risk_target)
-        view = view.fillna(0)
-
-        # cap leverage
-        leverage = view.sum(1)
-        leverage[leverage > self.leverage_cap] = self.leverage_cap
-
-        # force max out cash
-        if self.force_max_out_cash:
-            leverage = self.leverage_cap
-
-        leverage_cap_scalar = leverage / view.sum(1)
-        view = view.multiply(leverage_cap_scalar, axis=0).fillna(0)
-
-        view[self.home] = 1 - view.sum(1)
-
-        view_panel['PORT'] = view.reindex(self.dates)
-        self.views = pd.Panel(view_panel)
-        return
+        view_panel['PORT'] = self.compute_port_views({'PORT': self.factor_weights}, view_panel, dates)['PORT']
+        return view_panel
+
+    # PORT views of {name: factor weights} built from the factor views in view_panel (default self.views);
+    # the vol targeting of all weight vectors is one batched evaluation
+    def compute_port_views(self, factor_weights, view_panel=None, dates=None):
+        view_panel = self.views if view_panel is None else view_panel
+        dates = self.dates if dates is None else dates
+        assets = self.cov.assets
+
+        factor_names = []
+        for weights in factor_weights.values():
+            factor_names += [factor_name for factor_name in weights.keys() if factor_name not in factor_names]
+        factor_views = np.stack([view_panel[factor_name].reindex(index=dates, columns=assets).values
+                                 for factor_name in factor_names])
+        weights = np.array([[weights.get(factor_name, 0.0) for factor_name in factor_names]
+                            for weights in factor_weights.values()])
+
+        port_views = build_port_views(factor_views, weights, lambda views: self.cov.portfolio_variances(views, dates),
+                                      home=assets.get_loc(self.home), risk_target=self.risk_target,
+                                      leverage_cap=self.leverage_cap, no_naked_short=self.no_naked_short,
+                                      force_max_out_cash=self.force_max_out_cash)
+        return {name: pd.DataFrame(port_views[k], index=dates, columns=assets)
+                for k, name in enumerate(factor_weights.keys())}
 
     # compute ex ante portfolio vol using covs
-    def compute_portfolio_vol(self, views):
-        vols = pd.Series()
-        for date in self.dates:
-            cov_cols = set(self.cov[date].dropna(axis=1, how='all').columns)
-            view_cols = set(views.loc[date, :].dropna().index)
-            available_cols = list(cov_cols.intersection(view_cols))
-            vols[date] = views.loc[date, available_cols].dot(self.cov[date].loc[available_cols, available_cols]). \
-                dot(views.loc[date, available_cols])
-        vols = vols ** 0.5
-        return vols
+    def compute_portfolio_vol(self, views, dates=None):
+        return self.compute_portfolio_vols({'views': views}, dates=dates)['views']
+
+    # ex ante vols of many {name: views} portfolios on dates (default self.dates) in one batched tensor
+    # evaluation
+    def compute_portfolio_vols(self, views_dict, dates=None):
+        dates = self.dates if dates is None else dates
+        names = list(views_dict.keys())
+        view_tensor = np.stack([views_dict[name].reindex(index=dates, columns=self.cov.assets).values
+                                for name in names])
+        vols = self.cov.portfolio_vols(view_tensor, dates)
+        return pd.DataFrame(vols.T, index=dates, columns=names)
 
     # compute gross/net portfolio returns, assuming 1% tcost
     def compute_portfolio_returns(self, rebal_rule='D', unit_tcost=0.0025):
-        net_returns = pd.DataFrame()
-        gross_returns_by_pair = {}
-        for port in self.views.keys():
-            views = self.views[port].resample(rebal_rule).last()
-            intraday_ti = self.get_intraday_ti()
-            ti = intraday_ti.resample(rebal_rule).last()
-            asset_returns = ti.pct_change()
-            gross_returns_by_pair[port] = asset_returns.multiply(views.shift(self.lag))
-            gross_returns = gross_returns_by_pair[port].sum(1)
-            tcost = views.diff().abs().sum(1) / 2 * unit_tcost
-            net_returns[port] = gross_returns - tcost
-        return {
-            'net': net_returns,
-            'gross by pair': gross_returns_by_pair
-        }
+        return self.backtest_grid([rebal_rule], [unit_tcost], [self.lag])[(rebal_rule, unit_tcost, self.lag)]
+
+    # backtest every view portfolio for every (rebal rule, unit tcost, lag) in one vectorized pass per rule;
+    # factor_weights = {name: factor weights} adds PORT portfolios for alternative weight vectors.
+    # returns {(rule, tcost, lag): ret_dict}, see get_grid_return_stats for a tidy summary
+    def backtest_grid(self, rebal_rules=('D',), unit_tcosts=(0.0025,), lags=None, factor_weights=None):
+        self._ensure_pipeline()
+        lags = [self.lag] if lags is None else lags
+        views_dict = {port: self.views[port] for port in self.views.keys()}
+        if factor_weights is not None:
+            views_dict.update(self.compute_port_views(factor_weights))
+        asset_returns = {rule: self.get_resampled_ti(rule).pct_change(fill_method=None) for rule in rebal_rules}
+        return run_backtest_grid(asset_returns, views_dict, rebal_rules, unit_tcosts, lags)
+
+    # score candidate factor-weight vectors (candidate x factor over factor_names, or a dataframe with factor
+    # columns) on walk-forward splits of the rebalance periods; the factor views, risk model and period
+    # returns are computed once and shared with n_workers processes
+    def optimize_factor_weights(self, candidates, factor_names=None, rebal_rule='D', unit_tcost=0.0025,
+                                n_splits=4, expanding=True, n_workers=None):
+        self._ensure_pipeline()
+        if isinstance(candidates, pd.DataFrame):
+            factor_names = list(candidates.columns)
+            candidates = candidates.values
+        factor_names = list(self.factor_weights.keys()) if factor_names is None else list(factor_names)
+        assets = self.cov.assets
+        factor_views = np.stack([self.views[factor_name].reindex(index=self.dates, columns=assets).values
+                                 for factor_name in factor_names])
+
+        # every rebalance period trades on its last view date
+        last_rows = pd.Series(np.arange(len(self.dates)), index=self.dates).resample(rebal_rule).last().dropna()
+        asset_returns = self.get_resampled_ti(rebal_rule).pct_change(fill_method=None)
+        index = asset_returns.index.union(last_rows.index)
+        rows = index.get_indexer(last_rows.index)
+
+        self.logger.info('Searching ' + str(len(candidates)) + ' factor weightings')
+        return search_factor_weights(
+            factor_names, candidates, factor_views, self.cov, asset_returns.reindex(index=index, columns=assets).values,
+            rows, last_rows.values.astype(int), walk_forward_splits(len(rows), n_splits, expanding=expanding),
+            port_settings={
+                'home': assets.get_loc(self.home),
+                'risk_target': self.risk_target,
+                'leverage_cap': self.leverage_cap,
+                'no_naked_short': self.no_naked_short,
+                'force_max_out_cash': self.force_max_out_cash
+            },
+            lag=self.lag, tcost=unit_tcost, periods_per_year=FREQ_DICT[rebal_rule], n_workers=n_workers)
+
+    # a date (default today, taken at call time) as a timestamp in the views' timezone
+    def _view_date(self, date=None):
+        date = pd.Timestamp(datetime.date.today() if date is None else date)
+        return date.tz_localize(self.tz) if date.tz is None else date.tz_convert(self.tz)
 
     # generate portfolio trades from current holdings
-    def tradegen(self, date=datetime.date.today()):
+    @timed()
+    def tradegen(self, date=None):
+        self._ensure_pipeline()
+        date = self._view_date(date)
         if date not in self.views['PORT'].index:
             err_msg = 'PORT views not available for ' + date.strftime('%Y-%m-%d')
             self.logger.critical(err_msg)
             raise IndexError(err_msg)
-        current_view = self.views['PORT'].ix[date]
+        current_view = self.views['PORT'].loc[date]
         position_dict = self.data.get_current_positions()
 
         nav_in_home_currency = position_dict['home currency'].sum()
@@ -409,13 +892,14 @@ class traderBot():
         nav_in_home_currency = position_dict['home currency'].sum()
         self.logger.info('Current balance in BTC = ' + str(round(nav_in_home_currency, 4)))
 
-    def get_covcorrel_and_vol(self, view1, view2, cov_date=datetime.date.today()):
+    def get_covcorrel_and_vol(self, view1, view2, cov_date=None):
+        self._ensure_pipeline()
         if self.cov is None:
             self.covgen()
-        cov = self.cov[cov_date]
+        cov = self.cov[self._view_date(cov_date)]
 
-        view1_valid = set(view1.index).issubset(set(self.cov[cov_date].index))
-        view2_valid = set(view2.index).issubset(set(self.cov[cov_date].index))
+        view1_valid = set(view1.index).issubset(set(cov.index))
+        view2_valid = set(view2.index).issubset(set(cov.index))
         if not (view1_valid and view2_valid):
             err_msg = 'views contain invalid coins!'
             logger.critical(err_msg)